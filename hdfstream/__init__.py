@@ -3,30 +3,73 @@
 __all__ = ["open", "RemoteDirectory", "RemoteFile", "RemoteGroup",
            "RemoteDataset", "SoftLink", "HardLink", "disable_progress",
            "set_progress_delay", "Config", "get_config", "set_config",
-           "verify_cert", "testing", "util"]
-
-
-from importlib.metadata import version, PackageNotFoundError
-try:
-    __version__ = version("hdfstream")
-except PackageNotFoundError:
-    __version__ = "unknown"
+           "verify_cert", "set_max_workers", "set_block_cache_size",
+           "get_block_cache", "enable_metadata_cache", "clear_metadata_cache",
+           "async_open", "AsyncRemoteDirectory", "AsyncRemoteFile",
+           "AsyncRemoteGroup", "AsyncRemoteDataset", "set_max_async_requests",
+           "CopyReport", "RetryPolicy", "set_retry_policy", "get_retry_policy",
+           "RateLimiter", "set_progress_reporter", "NullProgress",
+           "add_request_hook", "remove_request_hook", "enable_request_metrics",
+           "RequestRecord", "RequestMetrics", "profile", "Profile",
+           "set_adaptive_requests", "testing", "util"]
 
 
 from hdfstream.exceptions import HDFStreamRequestError
 from hdfstream.connection import Connection, verify_cert
-from hdfstream.decoding import disable_progress, set_progress_delay
+from hdfstream.retry import RetryPolicy, set_retry_policy, get_retry_policy
+from hdfstream.rate_limit import RateLimiter
+from hdfstream.decoding import disable_progress, set_progress_delay, set_progress_reporter
+from hdfstream.progress import NullProgress
+from hdfstream.metrics import add_request_hook, remove_request_hook, enable_request_metrics, \
+    RequestRecord, RequestMetrics
+from hdfstream.profiling import profile, Profile
+from hdfstream.parallel import set_max_workers
+from hdfstream.request_planner import set_adaptive_requests
+from hdfstream.block_cache import set_block_cache_size, get_block_cache
+from hdfstream.metadata_cache import enable_metadata_cache, clear_metadata_cache
 from hdfstream.remote_directory import RemoteDirectory
 from hdfstream.remote_file import RemoteFile
 from hdfstream.remote_group import RemoteGroup
 from hdfstream.remote_dataset import RemoteDataset
 from hdfstream.remote_links import SoftLink, HardLink
+from hdfstream.copy_pipeline import CopyReport
 from hdfstream.defaults import *
 from hdfstream.config import get_config, set_config, Config
 
+# Names which are only imported when first used, to keep the time taken
+# to import the module down. Maps each name to the submodule it's in.
+_lazy_names = {
+    "async_open" : "hdfstream.aio",
+    "AsyncRemoteDirectory" : "hdfstream.aio",
+    "AsyncRemoteFile" : "hdfstream.aio",
+    "AsyncRemoteGroup" : "hdfstream.aio",
+    "AsyncRemoteDataset" : "hdfstream.aio",
+    "set_max_async_requests" : "hdfstream.aio",
+}
+
+
+def __getattr__(name):
+    if name == "__version__":
+        from importlib.metadata import version, PackageNotFoundError
+        try:
+            value = version("hdfstream")
+        except PackageNotFoundError:
+            value = "unknown"
+    elif name in _lazy_names:
+        import importlib
+        value = getattr(importlib.import_module(_lazy_names[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_names) | {"__version__"})
+
 
 def open(server, name, user=None, password=None, max_depth=max_depth_default,
-         data_size_limit=data_size_limit_default):
+         data_size_limit=data_size_limit_default, **options):
     """
     Connect to the server and return a RemoteDirectory or RemoteFile
     corresponding to the specified virtual path. If a user name is specified
@@ -44,11 +87,12 @@ def open(server, name, user=None, password=None, max_depth=max_depth_default,
     :type max_depth: int, optional
     :param data_size_limit: max. dataset size (bytes) to download with metadata
     :type data_size_limit: int, optional
+    :param options: connection options, see :py:meth:`hdfstream.Config.add_alias`
 
     :return: RemoteFile or RemoteDirectory corresponding to the requested path
     :rtype: RemoteFile or RemoteDirectory
     """
-    connection = Connection.new(server, user, password)
+    connection = Connection.new(server, user, password, **options)
     data = connection.request_path(name)
 
     if data["type"] == "directory":
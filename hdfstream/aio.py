@@ -0,0 +1,412 @@
+#!/bin/env python
+
+import asyncio
+import functools
+import concurrent.futures
+
+import numpy as np
+from requests.adapters import DEFAULT_POOLSIZE
+
+import hdfstream
+import hdfstream.slice_utils as su
+import hdfstream.profiling as profiling
+from hdfstream.defaults import *
+from hdfstream.exceptions import HDFStreamRequestError
+from hdfstream.remote_directory import RemoteDirectory
+from hdfstream.remote_file import RemoteFile
+from hdfstream.remote_group import RemoteGroup
+from hdfstream.remote_dataset import RemoteDataset
+
+#
+# Asyncio interface to the module. The objects here wrap the usual
+# RemoteDirectory, RemoteFile, RemoteGroup and RemoteDataset classes.
+#
+# If the optional aiohttp module is installed, dataset reads are made with
+# an aiohttp client (see async_connection.py), so requests in progress wait
+# in the event loop and don't need a thread each. The number of requests
+# in progress at once is then limited by the pool_size connection option.
+#
+# Other operations, and dataset reads if aiohttp is not available, are a
+# stopgap: they run the blocking code in a shared, bounded pool of threads.
+# Each of these requests in progress occupies one of the threads, so the
+# size of the pool limits the number of them in progress at once. By
+# default this is the same as the default pool_size.
+#
+
+_max_async_requests = DEFAULT_POOLSIZE
+_executor = None
+def set_max_async_requests(max_requests):
+    """
+    Set the maximum number of requests made through the asyncio interface
+    which may be in progress at once in the thread pool used for metadata
+    requests, and for dataset reads if aiohttp is not installed. Further
+    requests wait until one of the running requests completes. Dataset
+    reads with aiohttp are limited by the pool_size connection option
+    instead.
+
+    :param max_requests: maximum number of concurrent requests
+    :type max_requests: int
+    """
+    global _max_async_requests, _executor
+    max_requests = int(max_requests)
+    if max_requests < 1:
+        raise ValueError("Number of concurrent requests must be at least one")
+    _max_async_requests = max_requests
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor():
+    """
+    Return the thread pool used to run blocking operations
+    """
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=_max_async_requests,
+                                                          thread_name_prefix="hdfstream")
+    return _executor
+
+
+async def _run(func, *args, **kwargs):
+    """
+    Run a blocking function in the thread pool and await the result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _async_connection(dataset):
+    """
+    Return the AsyncConnection used to read the dataset, or None if reads
+    have to run in the thread pool because aiohttp is not installed or the
+    dataset does not use a Connection
+    """
+    try:
+        import aiohttp
+    except ImportError:
+        return None
+    if not hasattr(dataset.connection, "async_connection"):
+        return None
+    return dataset.connection.async_connection()
+
+
+async def _gather(coroutines):
+    """
+    Run coroutines concurrently and return a list of the results. If one
+    fails, the others are cancelled before the exception is re-raised.
+    """
+    tasks = [asyncio.ensure_future(c) for c in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _wrap(obj):
+    """
+    Wrap a remote object in the corresponding asyncio class
+    """
+    if isinstance(obj, RemoteDirectory):
+        return AsyncRemoteDirectory(obj)
+    elif isinstance(obj, RemoteFile):
+        return AsyncRemoteFile(obj)
+    elif isinstance(obj, RemoteGroup):
+        return AsyncRemoteGroup(obj)
+    elif isinstance(obj, RemoteDataset):
+        return AsyncRemoteDataset(obj)
+    else:
+        return obj
+
+
+async def async_open(server, name, user=None, password=None, max_depth=max_depth_default,
+                     data_size_limit=data_size_limit_default, **options):
+    """
+    Asyncio version of :py:func:`hdfstream.open`. Connects to the server and
+    returns an AsyncRemoteDirectory or AsyncRemoteFile corresponding to the
+    specified virtual path.
+
+    :param server: URL of the server to connect to
+    :type server: str
+    :param name: path to the virtual file or directory on the server
+    :type name: str
+    :param user: name of the user account for login, defaults to None
+    :type user: str, optional
+    :param password: password for login, defaults to None
+    :type password: str, optional
+    :param max_depth: maximum recursion depth for group metadata requests
+    :type max_depth: int, optional
+    :param data_size_limit: max. dataset size (bytes) to download with metadata
+    :type data_size_limit: int, optional
+    :param options: connection options, see :py:meth:`hdfstream.Config.add_alias`
+
+    :rtype: AsyncRemoteFile or AsyncRemoteDirectory
+    """
+    obj = await _run(hdfstream.open, server, name, user=user, password=password,
+                     max_depth=max_depth, data_size_limit=data_size_limit, **options)
+    return _wrap(obj)
+
+
+class _AsyncMapping:
+    """
+    Methods common to asyncio wrappers for mapping types
+    """
+    def __init__(self, obj):
+        self.obj = obj
+
+    async def aget(self, key):
+        """
+        Return the object at the specified path, wrapped in the
+        corresponding asyncio class.
+
+        :param key: path to the object
+        :type key: str
+        """
+        return _wrap(await _run(self.obj.__getitem__, key))
+
+    async def akeys(self):
+        """
+        Return a list of the names of the members of this object
+
+        :rtype: list of str
+        """
+        return await _run(lambda: list(self.obj.keys()))
+
+    async def acontains(self, key):
+        """
+        Return True if the specified path exists
+
+        :param key: path to the object
+        :type key: str
+        :rtype: bool
+        """
+        return await _run(self.obj.__contains__, key)
+
+    async def __aiter__(self):
+        for name in await self.akeys():
+            yield name
+
+    def __repr__(self):
+        return f'<Async {repr(self.obj)[1:]}'
+
+
+class AsyncRemoteDirectory(_AsyncMapping):
+    """
+    Asyncio wrapper for a :py:class:`hdfstream.RemoteDirectory`. Use
+    ``await directory.aget(path)`` to open files and subdirectories and
+    ``async for`` to iterate over the directory listing.
+
+    :param obj: the directory to wrap
+    :type obj: hdfstream.RemoteDirectory
+    """
+    async def files(self):
+        """
+        Return a {name : AsyncRemoteFile} dict of files in this directory
+
+        :rtype: dict
+        """
+        files = await _run(lambda: self.obj.files)
+        return {name : AsyncRemoteFile(f) for name, f in files.items()}
+
+    async def directories(self):
+        """
+        Return a {name : AsyncRemoteDirectory} dict of sub-directories in this directory
+
+        :rtype: dict
+        """
+        directories = await _run(lambda: self.obj.directories)
+        return {name : AsyncRemoteDirectory(d) for name, d in directories.items()}
+
+
+class AsyncRemoteFile(_AsyncMapping):
+    """
+    Asyncio wrapper for a :py:class:`hdfstream.RemoteFile`. Use
+    ``await remote_file.aget(path)`` to open HDF5 groups and datasets.
+
+    :param obj: the file to wrap
+    :type obj: hdfstream.RemoteFile
+    """
+    async def root(self):
+        """
+        Return the HDF5 root group of this file
+
+        :rtype: AsyncRemoteGroup
+        """
+        return AsyncRemoteGroup(await _run(lambda: self.obj.root))
+
+    async def is_hdf5(self):
+        """
+        Return True if this is a HDF5 file, False otherwise
+
+        :rtype: bool
+        """
+        return await _run(self.obj.is_hdf5)
+
+    async def prefetch(self, paths, max_workers=8):
+        """
+        Asyncio version of :py:meth:`hdfstream.RemoteFile.prefetch`
+        """
+        await _run(self.obj.prefetch, paths, max_workers)
+
+
+class AsyncRemoteGroup(_AsyncMapping):
+    """
+    Asyncio wrapper for a :py:class:`hdfstream.RemoteGroup`. Use
+    ``await group.aget(path)`` to open HDF5 groups and datasets.
+
+    :param obj: the group to wrap
+    :type obj: hdfstream.RemoteGroup
+    """
+    @property
+    def name(self):
+        return self.obj.name
+
+    async def attrs(self):
+        """
+        Return a dict containing this group's HDF5 attributes
+
+        :rtype: dict
+        """
+        return await _run(lambda: self.obj.attrs)
+
+    async def prefetch(self, paths, max_workers=8):
+        """
+        Asyncio version of :py:meth:`hdfstream.RemoteGroup.prefetch`
+        """
+        await _run(self.obj.prefetch, paths, max_workers)
+
+
+class AsyncRemoteDataset:
+    """
+    Asyncio wrapper for a :py:class:`hdfstream.RemoteDataset`. Use
+    ``await dataset.read(key)`` to read a slice of the dataset.
+
+    :param obj: the dataset to wrap
+    :type obj: hdfstream.RemoteDataset
+    """
+    def __init__(self, obj):
+        self.obj = obj
+
+    @property
+    def name(self):
+        return self.obj.name
+
+    @property
+    def attrs(self):
+        return self.obj.attrs
+
+    @property
+    def dtype(self):
+        return self.obj.dtype
+
+    @property
+    def shape(self):
+        return self.obj.shape
+
+    @property
+    def ndim(self):
+        return self.obj.ndim
+
+    def __len__(self):
+        return len(self.obj)
+
+    def __repr__(self):
+        return f'<Async {repr(self.obj)[1:]}'
+
+    async def read(self, key=Ellipsis):
+        """
+        Read a slice of the dataset. The key is interpreted in the same way
+        as the index when slicing a RemoteDataset.
+
+        :param key: numpy style index, defaults to the whole dataset
+        :type key: slice, tuple, list, array, integer or Ellipsis
+
+        :rtype: np.ndarray
+        """
+        obj = self.obj
+        connection = _async_connection(obj)
+        if connection is None or obj.data is not None or obj.dtype.hasobject:
+            return await _run(obj.__getitem__, key)
+
+        with profiling.stage("parse"):
+            nd_slice = su.parse_key(obj.shape, key, obj.max_gap)
+        starts, counts, rest = obj._key_ranges(nd_slice)
+        if obj._use_block_cache(starts, counts):
+            return await _run(obj.__getitem__, key)
+
+        data = np.ndarray(nd_slice.result_shape(), dtype=obj.dtype)
+        await self._request_slices_into(connection, obj._plan_requests(nd_slice, data))
+        return obj._finish_read(nd_slice, data)
+
+    async def read_direct(self, array, source_sel=None, dest_sel=None):
+        """
+        Asyncio version of :py:meth:`hdfstream.RemoteDataset.read_direct`
+        """
+        obj = self.obj
+        connection = _async_connection(obj)
+        if connection is None or array.dtype != obj.dtype:
+            return await _run(obj.read_direct, array, source_sel, dest_sel)
+
+        nd_slice, dest_view = obj._direct_selection(array, source_sel, dest_sel)
+        if obj._use_block_cache(nd_slice.start[:1], nd_slice.count[:1]):
+            return await _run(obj.read_direct, array, source_sel, dest_sel)
+        await self._request_slices_into(connection, obj._plan_requests(nd_slice, dest_view))
+
+    async def request_slices(self, slices, dest=None):
+        """
+        Asyncio version of :py:meth:`hdfstream.RemoteDataset.request_slices`
+        """
+        obj = self.obj
+        connection = _async_connection(obj)
+        if connection is None or obj.dtype.hasobject:
+            return await _run(obj.request_slices, slices, dest)
+
+        slice_descriptor, result_shape = obj._parse_slices(slices)
+        starts, counts = slice_descriptor[0]
+        if obj._use_block_cache(starts, counts):
+            return await _run(obj.request_slices, slices, dest)
+
+        if dest is None:
+            data = np.ndarray(result_shape, dtype=obj.dtype)
+            await self._request_slice(connection, slice_descriptor, data)
+            return data
+        else:
+            await self._request_slice(connection, slice_descriptor, dest)
+
+    async def _request_slices_into(self, connection, requests):
+        """
+        Download a list of (slice_descriptor, destination) pairs, with all
+        of the requests in progress at once
+        """
+        await _gather([self._request_slice(connection, *request) for request in requests])
+
+    async def _request_slice(self, connection, slice_descriptor, destination):
+        """
+        Asyncio version of :py:meth:`hdfstream.RemoteDataset._request_slice`,
+        which always writes to the destination buffer. Requests rejected
+        as too large are split in two in the same way.
+        """
+        obj = self.obj
+        planner = connection.planner
+        try:
+            await connection.request_slice_into(obj.file_path, obj.name, slice_descriptor, destination)
+            return
+        except HDFStreamRequestError as e:
+            pieces = su.split_descriptor(slice_descriptor)
+            if pieces is None or not planner.is_limit_error(e):
+                raise
+            error = e
+        nr_slices, nr_rows = su.descriptor_count(slice_descriptor)
+        rows = destination.reshape(nr_rows, -1)
+        try:
+            offset = 0
+            for n, descriptor in pieces:
+                await self._request_slice(connection, descriptor, rows[offset:offset+n,...])
+                offset += n
+        except HDFStreamRequestError:
+            raise error
+        nbytes = nr_rows * int(np.prod([c for s, c in slice_descriptor[1:]])) * obj.dtype.itemsize
+        planner.request_too_large(nr_slices, nbytes)
@@ -0,0 +1,229 @@
+#!/bin/env python
+
+import asyncio
+import contextlib
+
+import aiohttp
+import msgpack
+import requests
+
+import hdfstream.connection as connection_module
+from hdfstream.connection import convert_array, encode_array, has_index_array, _messages, _binary_rejected_statuses
+from hdfstream.exceptions import HDFStreamRequestError
+from hdfstream.decoding import async_decode_response
+from hdfstream.retry import get_retry_policy, error_status
+import hdfstream.metrics as metrics
+import hdfstream.profiling as profiling
+
+#
+# Asyncio http client used by the asyncio interface (see aio.py). An
+# AsyncConnection makes slice requests with aiohttp on behalf of a
+# Connection, so that requests in progress are waiting in the event loop
+# rather than each occupying a thread. It uses the same server, credentials,
+# retry policy, rate limiter and request planner as the Connection.
+# Requires the optional aiohttp dependency (pip install hdfstream[async]).
+#
+
+
+async def raise_for_status(response):
+    """
+    Check the status of an aiohttp response and raise HDFStreamRequestError
+    if necessary, including any error message sent by the server
+    """
+    if response.status >= 400:
+        status_code = response.status
+        retry_after = response.headers.get("Retry-After")
+        if status_code in _messages:
+            raise HDFStreamRequestError(_messages[status_code], status_code, retry_after)
+        # Decode any error message from the server, if this is a msgpack response
+        message = None
+        if response.headers.get('Content-Type') == "application/x-msgpack":
+            message = msgpack.unpackb(await response.read())["error"]
+        if message is None:
+            message = f"{status_code} {response.reason} for url: {response.url}"
+        raise HDFStreamRequestError(message, status_code, retry_after)
+
+
+@contextlib.contextmanager
+def _translate_errors():
+    """
+    Re-raise aiohttp exceptions as the equivalent exceptions from the
+    requests module, so that they're retried in the same way
+    """
+    try:
+        yield
+    except aiohttp.ClientPayloadError as e:
+        raise requests.exceptions.ChunkedEncodingError(str(e)) from e
+    except asyncio.TimeoutError as e:
+        raise requests.Timeout(str(e)) from e
+    except aiohttp.ClientConnectionError as e:
+        raise requests.ConnectionError(str(e)) from e
+
+
+async def _close_at_shutdown(session):
+    """
+    Async generator which closes an aiohttp session when it's finalized.
+    asyncio.run() finalizes any unfinished async generators before closing
+    the event loop, so connections are closed when the loop exits.
+    """
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+class AsyncConnection:
+    """
+    Makes requests to the server using aiohttp on behalf of a Connection.
+    Use :py:meth:`hdfstream.connection.Connection.async_connection` to get
+    the AsyncConnection for a Connection.
+
+    An aiohttp session is created for each event loop which uses this
+    object. The session keeps up to pool_size connections to the server,
+    the same as the Connection's pool, and further requests wait for a
+    free connection.
+
+    :param connection: the connection to make requests for
+    :type connection: hdfstream.connection.Connection
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.server = connection.server
+        self.planner = connection.planner
+        self.pool_size = connection.adapter.pool_size
+        auth = connection.session.auth
+        self.auth = None if auth is None else aiohttp.BasicAuth(auth.username, auth.password)
+        self._session = None
+        self._closer = None
+        self._loop = None
+
+    def __repr__(self):
+        return f'<Async connection to {self.server}, pool_size={self.pool_size}>'
+
+    async def _get_session(self):
+        """
+        Return the aiohttp session for the running event loop
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            # No overall time limit, as with requests, since responses may be large
+            timeout = aiohttp.ClientTimeout(total=None)
+            self._session = aiohttp.ClientSession(connector=connector, auth=self.auth, timeout=timeout)
+            self._closer = _close_at_shutdown(self._session)
+            await self._closer.asend(None)
+            self._loop = loop
+        return self._session
+
+    async def aclose(self):
+        """
+        Close the aiohttp session for the running event loop, if there is one.
+        Sessions are also closed automatically when asyncio.run() returns.
+        """
+        if self._session is not None and self._loop is asyncio.get_running_loop():
+            session, closer = self._session, self._closer
+            self._session = self._closer = self._loop = None
+            await session.close()
+            await closer.aclose()
+
+    def _limit_rate(self):
+        """
+        Return an async context manager which waits until the rate limiter
+        (if any) allows a request
+        """
+        rate_limiter = self.connection.rate_limiter
+        if rate_limiter is None:
+            return contextlib.nullcontext()
+        return rate_limiter.async_request()
+
+    async def _retry(self, func, *args):
+        """
+        Await func(*args), retrying according to the Connection's retry
+        policy if it raises an exception. Retries are counted in the
+        Connection's retry statistics.
+        """
+        connection = self.connection
+        policy = connection.retry_policy if connection.retry_policy is not None else get_retry_policy()
+        attempt = 0
+        while True:
+            try:
+                async with self._limit_rate():
+                    result = await func(*args)
+                if not connection.validated:
+                    connection._set_validated()
+                return result
+            except Exception as e:
+                if not connection.validated and getattr(e, "status_code", None) == 401:
+                    connection._set_invalid()
+                delay = policy.delay(attempt, e)
+                if delay is None:
+                    raise
+                with connection._retry_lock:
+                    connection.retry_counts[policy.retry_reason(e)] += 1
+                    connection.retry_wait += delay
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def post_and_unpack(self, url, params=None, desc=None, destination=None, encoder=convert_array):
+        """
+        Asyncio version of :py:meth:`hdfstream.connection.Connection.post_and_unpack`
+        """
+        if params is None:
+            params = {}
+        with profiling.stage("encode") as stage:
+            payload = msgpack.packb(params, default=encoder)
+            stage.add_bytes(len(payload))
+        return await self._retry(self._post_and_unpack, url, payload, desc, destination, params)
+
+    async def _post_and_unpack(self, url, payload, desc, destination, params):
+        session = await self._get_session()
+        headers = {"Content-Type": "application/x-msgpack"}
+        kind = "slice" if "slice" in params else "object"
+        nr_slices = metrics.slice_count(params.get("slice"))
+        observer = self.planner.observe if kind == "slice" else None
+        ssl = True if connection_module._verify_cert else False
+        with metrics.record_request("POST", kind, url, params.get("object"), nr_slices, len(payload),
+                                    observer) as record:
+            with _translate_errors():
+                async with session.post(url, data=payload, headers=headers, ssl=ssl) as response:
+                    record.response_started(response)
+                    await raise_for_status(response)
+                    data = await async_decode_response(response, desc, destination=destination)
+                    record.response_finished(response, response.content.total_bytes)
+        return data
+
+    async def request_slice_into(self, path, name, slice_descriptor, destination):
+        """
+        Request a dataset slice and read it into the supplied buffer.
+        Arrays of starts and counts are sent as binary data if the server
+        supports it, otherwise they're sent as lists. Will only work for
+        fixed length data types.
+        """
+        path = path.lstrip("/")
+        params = {
+            "object" : name,
+            "slice"  : slice_descriptor,
+        }
+        url = f"{self.server}/msgpack/{path}"
+        desc = f"Slice: {name}"
+
+        # Use lists if the server doesn't support binary arrays or there are no arrays to send
+        connection = self.connection
+        if connection.binary_slices is False or not has_index_array(slice_descriptor):
+            await self.post_and_unpack(url, params, desc, destination)
+            return
+
+        # Otherwise try sending binary arrays
+        try:
+            await self.post_and_unpack(url, params, desc, destination, encoder=encode_array)
+        except HDFStreamRequestError as e:
+            if connection.binary_slices:
+                raise # Server is known to accept binary arrays, so this is some other error
+            status, retry_after = error_status(e)
+            if status not in _binary_rejected_statuses:
+                raise # Not a response to the encoding of the request
+            # Try again with lists. If that works, the server doesn't support binary arrays.
+            await self.post_and_unpack(url, params, desc, destination)
+            connection.binary_slices = False
+            return
+        connection.binary_slices = True
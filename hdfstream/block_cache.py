@@ -0,0 +1,153 @@
+#!/bin/env python
+
+import threading
+import collections
+
+
+class BlockCache:
+    """
+    Least recently used cache of dataset blocks. Each block contains a range
+    of consecutive elements in the first dimension of a dataset, including
+    all elements in any other dimensions. Blocks are identified by a key
+    of the form (server, file_path, name, last_modified, block_index).
+
+    The cache is disabled if max_bytes is zero.
+
+    :param max_bytes: maximum total size of the cached blocks in bytes
+    :type max_bytes: int
+    :param block_size: approximate size of each block in bytes
+    :type block_size: int
+
+    :ivar hits: number of blocks which were found in the cache
+    :vartype hits: int
+    :ivar misses: number of blocks which had to be requested from the server
+    :vartype misses: int
+    :ivar hit_bytes: number of bytes found in the cache
+    :vartype hit_bytes: int
+    :ivar miss_bytes: number of bytes which had to be requested from the server
+    :vartype miss_bytes: int
+    :ivar evictions: number of blocks which were discarded to stay within max_bytes
+    :vartype evictions: int
+    """
+    def __init__(self, max_bytes=0, block_size=1024*1024):
+        self.max_bytes = int(max_bytes)
+        self.block_size = int(block_size)
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Set the hit, miss and eviction counters to zero
+        """
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Return a dict with the cache counters and the current size in bytes
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "hit_bytes" : self.hit_bytes,
+                "miss_bytes" : self.miss_bytes,
+                "evictions" : self.evictions,
+                "nr_blocks" : len(self._blocks),
+                "nbytes" : self.nbytes,
+                "max_bytes" : self.max_bytes,
+            }
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def rows_per_block(self, row_size):
+        """
+        Return the number of elements in the first dimension to store in
+        each block, given the size in bytes of one element in the first
+        dimension.
+        """
+        return max(1, self.block_size // max(1, row_size))
+
+    def get(self, key):
+        """
+        Return the block with the specified key, or None if it's not cached
+        """
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            self.hit_bytes += block.nbytes
+            return block
+
+    def put(self, key, block):
+        """
+        Add a block which was requested from the server and discard least
+        recently used blocks until the cache fits in max_bytes
+        """
+        with self._lock:
+            self.misses += 1
+            self.miss_bytes += block.nbytes
+            if block.nbytes > self.max_bytes:
+                return
+            old_block = self._blocks.pop(key, None)
+            if old_block is not None:
+                self.nbytes -= old_block.nbytes
+            self._blocks[key] = block
+            self.nbytes += block.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._blocks.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Discard all cached blocks
+        """
+        with self._lock:
+            self._blocks.clear()
+            self.nbytes = 0
+
+
+_block_cache = BlockCache()
+def set_block_cache_size(max_bytes, block_size=None):
+    """
+    Set the maximum size in bytes of the client side cache of dataset
+    contents. Set to zero (the default) to disable caching. Any blocks
+    which are already cached are discarded.
+
+    :param max_bytes: maximum total size of cached blocks in bytes
+    :type max_bytes: int
+    :param block_size: approximate size of each cached block in bytes, defaults to 1MB
+    :type block_size: int, optional
+    """
+    global _block_cache
+    max_bytes = int(max_bytes)
+    if max_bytes < 0:
+        raise ValueError("Cache size must not be negative")
+    if block_size is None:
+        block_size = _block_cache.block_size
+    block_size = int(block_size)
+    if block_size < 1:
+        raise ValueError("Cache block size must be at least one byte")
+    _block_cache = BlockCache(max_bytes, block_size)
+
+
+def get_block_cache():
+    """
+    Return the BlockCache used to store dataset contents. Its stats()
+    method returns the number of cache hits and misses.
+
+    :rtype: hdfstream.block_cache.BlockCache
+    """
+    return _block_cache
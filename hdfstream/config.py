@@ -1,7 +1,8 @@
 #!/bin/env python
 
-import yaml
-import platformdirs
+import os
+import functools
+
 
 #
 # Contents of the default configuration file
@@ -16,6 +17,54 @@ default_config = {
     },
 }
 
+# Optional per-alias connection settings: allowed types and default values
+_option_types = {
+    # Client side rate limits
+    "rate_limit" : ((int, float), None),
+    "burst" : ((int, float), None),
+    "max_in_flight" : ((int,), None),
+    "shared_rate_limit" : ((bool,), False),
+    # Connection pool and socket settings
+    "pool_size" : ((int,), None),
+    "pool_block" : ((bool,), False),
+    "tcp_nodelay" : ((bool,), True),
+    "keep_alive" : ((int,), None),
+    "socket_rcvbuf" : ((int,), None),
+    "socket_sndbuf" : ((int,), None),
+    # Check the server URL and credentials with the first real request
+    "lazy_validation" : ((bool,), False),
+}
+
+# Numerical options must be positive. These ones have a larger minimum value.
+_option_minimums = {
+    "burst" : 1,
+}
+
+
+def validate_options(**options):
+    """
+    Validate optional alias settings and return a dict of those which are
+    set to something other than their default
+    """
+    result = {}
+    for key, val in options.items():
+        if key not in _option_types:
+            raise KeyError(f"Unknown alias option: {key}")
+        types, default = _option_types[key]
+        if val is default:
+            continue
+        if not isinstance(val, types) or (isinstance(val, bool) and bool not in types):
+            raise TypeError(f"Alias option {key} has the wrong type")
+        if not isinstance(val, bool):
+            minimum = _option_minimums.get(key)
+            if minimum is not None and val < minimum:
+                raise ValueError(f"Alias option {key} must be at least {minimum}")
+            if val <= 0:
+                raise ValueError(f"Alias option {key} must be positive")
+        result[key] = val
+    return result
+
+
 class Config:
     """
     Class to store module configuration info
@@ -24,13 +73,25 @@ class Config:
         """
         Create a new, empty configuration object
         """
-        self._config_path = platformdirs.user_config_path(appname="hdfstream", ensure_exists=True)
-        self._config_path = self._config_path / "config.yml"
+        self._config_path = _user_config_path()
         self._alias = {}
 
-    def add_alias(self, name, url, user=None, use_keyring=False):
+    def add_alias(self, name, url, user=None, use_keyring=False, **options):
         """
-        Add a new alias for the specified URL
+        Add a new alias for the specified URL. Any additional keyword
+        arguments set connection options for the alias:
+
+          * rate_limit: maximum average number of requests per second
+          * burst: maximum number of requests to make at once after a pause
+          * max_in_flight: maximum number of requests in progress in each process
+          * shared_rate_limit: apply the rate limit to all of the user's processes on this host
+          * pool_size: maximum number of http connections to keep open
+          * pool_block: wait for a free connection rather than opening extra connections
+          * tcp_nodelay: disable Nagle's algorithm (default True)
+          * keep_alive: send TCP keep-alive probes after this many idle seconds
+          * socket_rcvbuf: socket receive buffer size in bytes
+          * socket_sndbuf: socket send buffer size in bytes
+          * lazy_validation: skip the root directory request made on connecting
 
         :param name: name of the alias to create
         :type name: str
@@ -46,6 +107,7 @@ class Config:
             "user" : user,
             "use_keyring" : use_keyring,
         }
+        self._alias[name].update(validate_options(**options))
 
     def write(self, filename=None, mode="x"):
         """
@@ -60,6 +122,7 @@ class Config:
         """
         if filename is None:
             filename = self._config_path
+        import yaml
         config = {"aliases" : self._alias}
         with open(filename, mode) as config_file:
             yaml.dump(config, config_file)
@@ -75,6 +138,7 @@ class Config:
         """
         if filename is None:
             filename = self._config_path
+        import yaml
         with open(filename, "r") as config_file:
             config = yaml.safe_load(config_file)
 
@@ -100,6 +164,7 @@ class Config:
                 "user" : user,
                 "use_keyring" : use_keyring,
             }
+            self._alias[key].update(validate_options(**{name : val[name] for name in _option_types if name in val}))
 
     def resolve_alias(self, name, user):
         """
@@ -129,6 +194,40 @@ class Config:
 
         return name, user, use_keyring
 
+    def alias_options(self, name):
+        """
+        Return a dict of any connection options (e.g. rate limits) set for
+        the specified alias. Returns an empty dict if name is not an alias.
+
+        :param name: name of the alias to look up
+        :type name: str
+
+        :rtype: dict
+        """
+        alias = self._alias.get(name, {})
+        return {key : val for key, val in alias.items() if key in _option_types}
+
+
+@functools.lru_cache(maxsize=None)
+def _user_config_path():
+    """
+    Return the location of the user's default config file
+    """
+    import platformdirs
+    return platformdirs.user_config_path(appname="hdfstream", ensure_exists=True) / "config.yml"
+
+
+def _file_version(filename):
+    """
+    Return a tuple which changes when the file is modified, or None if the
+    file can't be accessed
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
 
 def _default_config():
     """
@@ -149,22 +248,41 @@ def _read_user_config():
 
 
 _config = None
+_config_version = None  # modification time etc. of the file _config was read from
+_config_explicit = False  # True if _config was set with set_config()
+_config_generation = 0  # incremented whenever _config changes
 def get_config():
     """
     Return the active configuration object. Read the user's config file if
-    possible, otherwise write a new default config file.
+    possible, otherwise write a new default config file. The file is only
+    read again if it has been modified since it was last read.
 
     :rtype: hdfstream.Config
     """
-    global _config
+    global _config, _config_version, _config_generation
+    if _config_explicit:
+        return _config
+    version = _file_version(_user_config_path())
+    if _config is not None and version is not None and version == _config_version:
+        return _config
     try:
-        _config = _read_user_config()
+        config = _read_user_config()
     except OSError:
-        _config = _default_config()
-        _config.write()
+        config = _default_config()
+        config.write()
+        version = _file_version(_user_config_path())
+    _config, _config_version = config, version
+    _config_generation += 1
     return _config
 
 
+def config_generation():
+    """
+    Return a number which changes whenever the active configuration changes
+    """
+    return _config_generation
+
+
 def set_config(config):
     """
     Set the active configuration object
@@ -172,5 +290,7 @@ def set_config(config):
     :param config: the Config object to use
     :type config: hdfstream.Config
     """
-    global _config
+    global _config, _config_explicit, _config_generation
     _config = config
+    _config_explicit = True
+    _config_generation += 1
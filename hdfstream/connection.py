@@ -1,12 +1,14 @@
 #!/bin/env python
 
 import os
+import time
+import threading
 import functools
+import collections
 import codecs
 import warnings
 import contextlib
 import getpass
-import keyring
 
 import requests
 import msgpack
@@ -16,7 +18,14 @@ from requests.auth import HTTPBasicAuth
 
 from hdfstream.exceptions import HDFStreamRequestError
 from hdfstream.decoding import decode_response
-from hdfstream.config import get_config
+from hdfstream.config import get_config, validate_options, config_generation
+from hdfstream.retry import get_retry_policy, error_status
+from hdfstream.rate_limit import make_rate_limiter
+from hdfstream.http_pool import make_adapter
+from hdfstream.request_planner import RequestPlanner
+import hdfstream.metadata_cache as metadata_cache
+import hdfstream.metrics as metrics
+import hdfstream.profiling as profiling
 
 
 # Use fixed error messages for certain http errors
@@ -59,8 +68,10 @@ def raise_for_status(response):
     there is one.
     """
     if not response.ok:
-        if response.status_code in _messages:
-            raise HDFStreamRequestError(_messages[response.status_code])
+        status_code = response.status_code
+        retry_after = response.headers.get("Retry-After")
+        if status_code in _messages:
+            raise HDFStreamRequestError(_messages[status_code], status_code, retry_after)
         # Decode any error message from the server, if this is a msgpack response
         message = None
         if response.headers.get('Content-Type') == "application/x-msgpack":
@@ -68,7 +79,7 @@ def raise_for_status(response):
             message = msgpack.unpack(response.raw)["error"]
         if message is not None:
             # We have an error message from the server
-            raise HDFStreamRequestError(message)
+            raise HDFStreamRequestError(message, status_code, retry_after)
         else:
             # If we don't have a message from the server, let the requests
             # module generate an exception
@@ -86,17 +97,62 @@ def convert_array(obj):
         return obj
 
 
+# Maximum size of a msgpack bin object
+max_bin_size = 2**32 - 1
+
+def encode_array(obj):
+    """
+    If obj is a 1D numpy array of integers, encode it as little endian int64
+    values in the same format the server uses for fixed size ndarrays. The
+    data are stored as a list of msgpack bin objects to allow for >4GB.
+    """
+    if isinstance(obj, np.ndarray) and obj.ndim == 1 and np.issubdtype(obj.dtype, np.integer):
+        arr = np.ascontiguousarray(obj, dtype="<i8")
+        data = memoryview(arr).cast("B")
+        return {
+            "nd" : True,
+            "type" : arr.dtype.str,
+            "kind" : "",
+            "shape" : [len(arr)],
+            "nbytes" : arr.nbytes,
+            "data" : [data[i:i+max_bin_size] for i in range(0, len(data), max_bin_size)] or [b""],
+        }
+    else:
+        return obj
+
+
+def has_index_array(slice_descriptor):
+    """
+    Return True if a slice descriptor contains arrays of starts and counts
+    """
+    return any(isinstance(item, np.ndarray) for dim in slice_descriptor for item in dim)
+
+# Http status codes which may mean that the server can't decode binary
+# arrays in a slice request. Other errors are not retried with lists.
+_binary_rejected_statuses = (400, 415)
+
+
+# Connection options which are used to configure the rate limiter. Apart
+# from lazy_validation, any other options are connection pool settings.
+_rate_limit_options = ("rate_limit", "burst", "max_in_flight", "shared_rate_limit")
+
+
 class Connection:
     """
     Class to store http session information and make requests
     """
     _cache = {}
 
-    def __init__(self, server, user=None, password=None, use_keyring=False):
+    def __init__(self, server, user=None, password=None, use_keyring=False, retry_policy=None,
+                 rate_limiter=None, adapter=None, lazy_validation=False):
 
         # Remove any trailing slashes from the server name
         self.server = server.rstrip("/")
 
+        # User name, if any. Cached metadata is only shared between
+        # connections for the same user.
+        self.user = user
+
         # If a username is specified with no password, get the password
         store_password = False
         if user is not None and password is None:
@@ -104,69 +160,260 @@ class Connection:
                 # If we're using the keyring and the password is not
                 # in the keyring, we'll need to store it after we've
                 # determined that it works.
+                import keyring
                 password = keyring.get_password(server, user)
                 store_password = (password is None)
             if password is None:
                 # If we don't have a password, ask for it
                 password = getpass.getpass()
 
+        # Whether the server accepts binary arrays in slice requests: None
+        # if we don't know yet, in which case we try it and fall back to
+        # lists if the request fails.
+        self.binary_slices = None
+
+        # Decides how to split dataset reads into requests, using the
+        # performance of slice requests on this connection
+        self.planner = RequestPlanner()
+
+        # Policy for retrying failed requests (uses the module default if
+        # None) and counts of retries by http status or exception type
+        self.retry_policy = retry_policy
+        self.retry_counts = collections.Counter()
+        self.retry_wait = 0.0
+        self._retry_lock = threading.Lock()
+
+        # Optional client side limit on request rate and concurrency
+        self.rate_limiter = rate_limiter
+
+        # Client for the asyncio interface, created when first needed
+        self._async_connection = None
+
         # Set up a session with the username and password
         self.session = requests.Session()
+        self.adapter = adapter if adapter is not None else make_adapter()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
         if user is not None:
             self.session.auth = HTTPBasicAuth(user, password)
 
-        # Test by fetching a root directory listing
-        with _maybe_suppress_cert_warnings():
-            response = self.session.get(self.server+"/msgpack/", verify=_verify_cert)
-        raise_for_status(response)
-
-        # Store the password if necessary
-        if store_password:
-            keyring.set_password(self.server, user, password)
+        # The password is stored in the keyring, if necessary, once a
+        # request has succeeded.
+        self.validated = False
+        self._unsaved_password = (user, password) if store_password else None
+
+        # Test the connection by fetching a root directory listing. With lazy
+        # validation, the server URL and credentials are checked by the first
+        # real request instead, which saves a round trip.
+        if not lazy_validation:
+            def check_root():
+                with metrics.record_request("GET", "connect", self.server+"/msgpack/") as record:
+                    with _maybe_suppress_cert_warnings():
+                        response = self.session.get(self.server+"/msgpack/", verify=_verify_cert)
+                    record.response_started(response)
+                    raise_for_status(response)
+            self._retry(check_root)
+
+    def _set_validated(self):
+        """
+        Called after the first successful request. Stores the password in
+        the keyring if necessary.
+        """
+        with self._retry_lock:
+            if self.validated:
+                return
+            self.validated = True
+            unsaved_password, self._unsaved_password = self._unsaved_password, None
+        if unsaved_password is not None:
+            import keyring
+            keyring.set_password(self.server, *unsaved_password)
+
+    def _set_invalid(self):
+        """
+        Called if the credentials are rejected before any request has
+        succeeded. Removes this connection from the cache so that the next
+        call to Connection.new() asks for the password again.
+        """
+        for key, connection in list(Connection._cache.items()):
+            if connection is self:
+                Connection._cache.pop(key, None)
 
     @staticmethod
-    def new(server, user, password=None):
+    def new(server, user, password=None, **options):
+        """
+        Return a connection to the specified server or alias, reusing an
+        existing connection if possible. Any keyword arguments set
+        connection options (see :py:meth:`hdfstream.Config.add_alias`)
+        and override any options configured for the alias.
+        """
+        # Check if we've already opened a connection with these parameters,
+        # in which case we don't need to look at the configuration.
+        # Connection ID includes process ID to avoid issues when session
+        # objects are reused between processes (e.g. with multiprocessing).
+        # Connections are only shared if all of their options are the same.
+        options_id = tuple(sorted(options.items()))
+        lookup_id = ("lookup", config_generation(), server, user, os.getpid(), options_id)
+        connection = Connection._cache.get(lookup_id)
+        if connection is not None:
+            return connection
 
         # Check if server name is an alias
-        server, user, use_keyring = get_config().resolve_alias(server, user)
+        config = get_config()
+        validate_options(**options)
+        alias_options = config.alias_options(server)
+        alias_options.update(options)
+        server, user, use_keyring = config.resolve_alias(server, user)
 
         # Remove any trailing slashes from the server name
         server = server.rstrip("/")
 
-        # Connection ID includes process ID to avoid issues when session
-        # objects are reused between processes (e.g. with multiprocessing).
-        connection_id = (server, user, os.getpid())
+        # Key on the combined alias and explicit options, so that aliases for
+        # the same server with different settings get separate connections
+        connection_id = (server, user, os.getpid(), tuple(sorted(alias_options.items())))
 
         # Open a new connection if necessary
         if connection_id not in Connection._cache:
-            Connection._cache[connection_id] = Connection(server, user, password, use_keyring)
-        return Connection._cache[connection_id]
+            rate_options = {key : alias_options.pop(key) for key in _rate_limit_options if key in alias_options}
+            rate_limiter = make_rate_limiter(server, **rate_options)
+            lazy_validation = alias_options.pop("lazy_validation", False)
+            adapter = make_adapter(**alias_options)
+            Connection._cache[connection_id] = Connection(server, user, password, use_keyring,
+                                                          rate_limiter=rate_limiter, adapter=adapter,
+                                                          lazy_validation=lazy_validation)
+        connection = Connection._cache[connection_id]
+        Connection._cache[("lookup", config_generation()) + lookup_id[2:]] = connection
+        return connection
+
+    def _retry(self, func, *args, on_retry=None):
+        """
+        Call func(*args), retrying according to the retry policy if it
+        raises an exception. If on_retry is not None it's called before
+        each new attempt.
+        """
+        policy = self.retry_policy if self.retry_policy is not None else get_retry_policy()
+        attempt = 0
+        while True:
+            try:
+                with self._limit_rate():
+                    result = func(*args)
+                if not self.validated:
+                    self._set_validated()
+                return result
+            except Exception as e:
+                if not self.validated and getattr(e, "status_code", None) == 401:
+                    self._set_invalid()
+                delay = policy.delay(attempt, e)
+                if delay is None:
+                    raise
+                with self._retry_lock:
+                    self.retry_counts[policy.retry_reason(e)] += 1
+                    self.retry_wait += delay
+            time.sleep(delay)
+            if on_retry is not None:
+                on_retry()
+            attempt += 1
+
+    def _limit_rate(self):
+        """
+        Return a context manager which waits until the rate limiter (if
+        any) allows a request
+        """
+        if self.rate_limiter is None:
+            return contextlib.nullcontext()
+        return self.rate_limiter.request()
+
+    def async_connection(self):
+        """
+        Return an AsyncConnection which makes slice requests for this
+        connection with aiohttp. Used by the asyncio interface. Requires
+        the aiohttp module.
+
+        :rtype: hdfstream.async_connection.AsyncConnection
+        """
+        if self._async_connection is None:
+            from hdfstream.async_connection import AsyncConnection
+            self._async_connection = AsyncConnection(self)
+        return self._async_connection
+
+    def pool_stats(self):
+        """
+        Return a dict with the number of requests made, the number of new
+        connections opened and the number of requests which reused an
+        existing connection. If new_connections keeps increasing while
+        many requests are in progress at once, consider increasing the
+        pool_size connection option.
+
+        :rtype: dict
+        """
+        return self.adapter.pool_stats()
+
+    def retry_stats(self):
+        """
+        Return a dict with the total number of retries, the number of
+        retries for each http status code or exception type, and the total
+        time in seconds spent waiting to retry.
+
+        :rtype: dict
+        """
+        with self._retry_lock:
+            return {
+                "retries" : sum(self.retry_counts.values()),
+                "by_reason" : dict(self.retry_counts),
+                "wait" : self.retry_wait,
+            }
 
     def get_and_unpack(self, url, params=None, desc=None):
         """
         Make a GET request and unpack the response
         """
-        with _maybe_suppress_cert_warnings():
-            with self.session.get(url, params=params, stream=True, verify=_verify_cert) as response:
-                raise_for_status(response)
-                data = decode_response(response, desc)
+        return self._retry(self._get_and_unpack, url, params, desc)
+
+    def _get_and_unpack(self, url, params, desc):
+        with metrics.record_request("GET", "path", url) as record:
+            with _maybe_suppress_cert_warnings():
+                with self.session.get(url, params=params, stream=True, verify=_verify_cert) as response:
+                    record.response_started(response)
+                    raise_for_status(response)
+                    data = decode_response(response, desc)
+                    record.response_finished(response)
         return data
 
-    def post_and_unpack(self, url, params=None, desc=None):
+    def post_and_unpack(self, url, params=None, desc=None, destination=None, encoder=convert_array):
         """
         Make a POST request and unpack the response
 
         This avoids limits on get request parameter size. Parameters are
-        messagepack encoded.
+        messagepack encoded, using the encoder function for any types
+        msgpack can't handle. If destination is not None, the response
+        is decoded into the destination buffer. Failed requests are
+        retried, in which case the response is decoded into the same
+        buffer again from the start.
         """
         if params is None:
             params = {}
-        payload = msgpack.packb(params, default=convert_array)
+        with profiling.stage("encode") as stage:
+            payload = msgpack.packb(params, default=encoder)
+            stage.add_bytes(len(payload))
+        return self._retry(self._post_and_unpack, url, payload, desc, destination, params)
+
+    def _post_and_unpack(self, url, payload, desc, destination, params):
         headers = {"Content-Type": "application/x-msgpack"}
-        with _maybe_suppress_cert_warnings():
-            with self.session.post(url, data=payload, headers=headers, stream=True, verify=_verify_cert) as response:
-                raise_for_status(response)
-                data = decode_response(response, desc)
+        if "slice" in params:
+            kind = "slice"
+        elif "object" in params:
+            kind = "object"
+        else:
+            kind = "path"
+        nr_slices = metrics.slice_count(params.get("slice"))
+        observer = self.planner.observe if kind == "slice" else None
+        with metrics.record_request("POST", kind, url, params.get("object"), nr_slices, len(payload),
+                                    observer) as record:
+            with _maybe_suppress_cert_warnings():
+                with self.session.post(url, data=payload, headers=headers, stream=True, verify=_verify_cert) as response:
+                    record.response_started(response)
+                    raise_for_status(response)
+                    data = decode_response(response, desc, destination=destination)
+                    record.response_finished(response)
         return data
 
     def request_path(self, path):
@@ -174,33 +421,39 @@ class Connection:
         Request the msgpack representation of a file or directory from the server
         """
         path = path.lstrip("/")
-        url = f"{self.server}/msgpack/{path}"
-        return self.post_and_unpack(url, desc=f"Path: {path}")
+        data = metadata_cache.load_path(self.server, self.user, path)
+        if data is None:
+            url = f"{self.server}/msgpack/{path}"
+            data = self.post_and_unpack(url, desc=f"Path: {path}")
+            metadata_cache.store_path(self.server, self.user, path, data)
+        return data
 
-    def request_object(self, path, name, data_size_limit, max_depth):
+    def request_object(self, path, name, data_size_limit, max_depth, last_modified=None):
         """
         Request the msgpack representation of a HDF5 object from the server
+
+        If the file's modification time is known, the result may be
+        returned from the persistent metadata cache.
         """
         path = path.lstrip("/")
-        params = {
-            "object" : name,
-            "data_size_limit" : data_size_limit,
-            "max_depth" : max_depth
-        }
-        url = f"{self.server}/msgpack/{path}"
-        return self.post_and_unpack(url, params, desc=f"Object: {name}")
+        cache_key = (self.server, self.user, path, name, data_size_limit, max_depth, last_modified)
+        data = metadata_cache.load_object(*cache_key)
+        if data is None:
+            params = {
+                "object" : name,
+                "data_size_limit" : data_size_limit,
+                "max_depth" : max_depth
+            }
+            url = f"{self.server}/msgpack/{path}"
+            data = self.post_and_unpack(url, params, desc=f"Object: {name}")
+            metadata_cache.store_object(*cache_key, data)
+        return data
 
     def request_slice(self, path, name, slice_descriptor):
         """
         Request a dataset slice. Returns a new np.ndarray.
         """
-        path = path.lstrip("/")
-        params = {
-            "object" : name,
-            "slice"  : slice_descriptor,
-        }
-        url = f"{self.server}/msgpack/{path}"
-        return self.post_and_unpack(url, params, desc=f"Slice: {name}")
+        return self._post_slice(path, name, slice_descriptor)
 
     def request_slice_into(self, path, name, slice_descriptor, destination):
         """
@@ -208,36 +461,92 @@ class Connection:
 
         Will only work for fixed length data types.
         """
+        self._post_slice(path, name, slice_descriptor, destination)
+
+    def _post_slice(self, path, name, slice_descriptor, destination=None):
+        """
+        Make a slice request. Arrays of starts and counts are sent as binary
+        data if the server supports it, otherwise they're sent as lists.
+        """
         path = path.lstrip("/")
         params = {
             "object" : name,
             "slice"  : slice_descriptor,
         }
         url = f"{self.server}/msgpack/{path}"
-        payload = msgpack.packb(params, default=convert_array)
-        headers = {"Content-Type": "application/x-msgpack"}
-        with _maybe_suppress_cert_warnings():
-            with self.session.post(url, data=payload, headers=headers, stream=True, verify=_verify_cert) as response:
-                raise_for_status(response)
-                decode_response(response, desc=f"Slice: {name}", destination=destination)
+        desc = f"Slice: {name}"
+
+        # Use lists if the server doesn't support binary arrays or there are no arrays to send
+        if self.binary_slices is False or not has_index_array(slice_descriptor):
+            return self.post_and_unpack(url, params, desc, destination)
+
+        # Otherwise try sending binary arrays
+        try:
+            data = self.post_and_unpack(url, params, desc, destination, encoder=encode_array)
+        except (HDFStreamRequestError, requests.HTTPError) as e:
+            if self.binary_slices:
+                raise # Server is known to accept binary arrays, so this is some other error
+            status, retry_after = error_status(e)
+            if status not in _binary_rejected_statuses:
+                raise # Not a response to the encoding of the request
+            # Try again with lists. If that works, the server doesn't support binary arrays.
+            data = self.post_and_unpack(url, params, desc, destination)
+            self.binary_slices = False
+            return data
+        self.binary_slices = True
+        return data
+
+    def download_range(self, path, start, stop, fileobj):
+        """
+        Download bytes start to stop-1 of the file at the specified virtual
+        path and write them to fileobj. Returns the number of bytes written.
+        """
+        path = path.lstrip("/")
+        url = f"{self.server}/download/{path}"
+        headers = {"Range" : f"bytes={start}-{stop-1}"}
+        offset = fileobj.tell()
+        def fetch_range():
+            nbytes = 0
+            with metrics.record_request("GET", "download", url) as record:
+                with _maybe_suppress_cert_warnings():
+                    with self.session.get(url, headers=headers, stream=True, verify=_verify_cert) as response:
+                        record.response_started(response)
+                        raise_for_status(response)
+                        if response.status_code != 206:
+                            raise HDFStreamRequestError("Server does not support range requests")
+                        for data in response.iter_content(chunk_size=1024*1024):
+                            fileobj.write(data)
+                            nbytes += len(data)
+                        record.response_finished(response)
+            return nbytes
+        # On retrying, overwrite any partial data from the failed attempt
+        return self._retry(fetch_range, on_retry=lambda: fileobj.seek(offset))
 
     def open_file(self, path, mode='r'):
         """
         Open the file at the specified virtual path
         """
+        if mode not in ('r', 'rb'):
+            raise ValueError("File mode must be 'r' (text) or 'rb' (binary)")
         path = path.lstrip("/")
         url = f"{self.server}/download/{path}"
 
-        with _maybe_suppress_cert_warnings():
-            response = self.session.get(url, stream=True, verify=_verify_cert)
-        raise_for_status(response)
+        def get_file():
+            with _maybe_suppress_cert_warnings():
+                response = self.session.get(url, stream=True, verify=_verify_cert)
+            try:
+                raise_for_status(response)
+            except BaseException:
+                # Release the connection before any retry
+                response.close()
+                raise
+            return response
+        response = self._retry(get_file)
         response.raw.decode_content = ("Content-Encoding" in response.headers)
         if mode == 'rb':
             # Binary mode
             return response.raw
-        elif mode == 'r':
+        else:
             # Text mode, so we need to decode bytes to strings
             return codecs.getreader(response.encoding)(response.raw)
-        else:
-            raise ValueError("File mode must be 'r' (text) or 'rb' (binary)")
 
@@ -0,0 +1,180 @@
+#!/bin/env python
+
+import time
+import collections
+import concurrent.futures
+
+import numpy as np
+
+import hdfstream.slice_utils as su
+from hdfstream.defaults import *
+
+
+class CopyReport:
+    """
+    Summary of a copy operation, returned by
+    :py:meth:`hdfstream.RemoteGroup.copy`.
+
+    :ivar datasets: dict of {output dataset name : (bytes copied, time in seconds)}
+    :vartype datasets: dict
+    :ivar total_bytes: total number of bytes of dataset contents copied
+    :vartype total_bytes: int
+    :ivar elapsed: total time taken to copy the dataset contents in seconds
+    :vartype elapsed: float
+    """
+    def __init__(self):
+        self.datasets = {}
+        self.total_bytes = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return f'<Copy report: {len(self.datasets)} datasets, {self.total_bytes} bytes in {self.elapsed:.2f}s>'
+
+    def __str__(self):
+        lines = []
+        for name, (nbytes, seconds) in self.datasets.items():
+            lines.append(f"{name}: {nbytes} bytes in {seconds:.3f}s")
+        lines.append(f"Total: {self.total_bytes} bytes in {self.elapsed:.3f}s")
+        return "\n".join(lines)
+
+
+class _DatasetJob:
+    """
+    Information needed to copy one dataset
+    """
+    def __init__(self, source, dest, name, output, kwargs):
+        self.source = source
+        self.dest = dest
+        self.name = name
+        self.output = output # h5py.Dataset, or None if it's created when written
+        self.kwargs = kwargs
+        self.nr_blocks_left = 0
+        self.nbytes = 0
+        self.start_time = None
+
+
+class CopyPipeline:
+    """
+    Copies datasets to a local HDF5 file. Dataset contents are downloaded
+    in blocks of about block_size bytes by a pool of max_workers threads
+    while the thread which calls run() does all of the h5py calls, since
+    h5py is not thread safe. At most max_workers blocks (plus one more if
+    prefetch is True) are held in memory at once.
+
+    Datasets are added with add_dataset(), which creates the output dataset
+    and its attributes immediately where possible. The contents are copied
+    when run() is called.
+
+    :param block_size: approximate size in bytes of each block to download
+    :type block_size: int
+    :param max_workers: number of threads used to download blocks
+    :type max_workers: int
+    :param prefetch: download the next block while writing the current one
+    :type prefetch: bool
+    """
+    def __init__(self, block_size=copy_block_size_default, max_workers=1, prefetch=False):
+        if int(max_workers) < 1:
+            raise ValueError("Number of workers must be at least one")
+        self.block_size = int(block_size)
+        self.max_workers = int(max_workers)
+        self.prefetch = prefetch
+        self._tasks = []
+
+    def add_dataset(self, source, dest, name, **kwargs):
+        """
+        Add a RemoteDataset to copy to a new dataset called name in the h5py
+        file or group dest. Keyword arguments are passed to create_dataset().
+        """
+        if source.data is not None or source.ndim == 0 or source.dtype.hasobject:
+            # Data is in memory, scalar or variable length: the output is
+            # created from the whole array when it has been downloaded
+            job = _DatasetJob(source, dest, name, None, kwargs)
+            self._tasks.append((job, None, None))
+            job.nr_blocks_left = 1
+        else:
+            # Fixed size data can be copied in blocks, so create the output now
+            output = dest.create_dataset(name, shape=source.shape, dtype=source.dtype, **kwargs)
+            self._copy_attrs(source, output)
+            job = _DatasetJob(source, dest, name, output, kwargs)
+            row_size = int(np.prod(source.shape[1:], dtype=int)) * source.dtype.itemsize
+            nr_rows = max(1, self.block_size // max(1, row_size))
+            # Always have at least one block, so zero size datasets are reported
+            for i1 in range(0, max(1, source.shape[0]), nr_rows):
+                self._tasks.append((job, i1, min(i1 + nr_rows, source.shape[0])))
+                job.nr_blocks_left += 1
+
+    def _copy_attrs(self, source, output):
+        for attr_name, attr_val in source.attrs.items():
+            output.attrs[attr_name] = attr_val
+
+    def _download(self, job, i1, i2):
+        """
+        Download a block of a dataset, or the whole dataset if i1 is None
+        """
+        if job.start_time is None:
+            job.start_time = time.perf_counter()
+        source = job.source
+        if i1 is None:
+            return source[...]
+        buffer = np.ndarray((i2-i1,) + tuple(source.shape[1:]), dtype=source.dtype)
+        nd_slice = su.NormalizedSlice(source.shape, np.s_[i1:i2,...])
+        if source._use_block_cache(nd_slice.start[:1], nd_slice.count[:1]):
+            source._read_cached(nd_slice.start[:1], nd_slice.count[:1], nd_slice.to_list()[1:], buffer)
+        else:
+            source._request_slice_into(nd_slice, buffer)
+        return buffer
+
+    def _write(self, job, i1, i2, data, report):
+        """
+        Write a downloaded block to the output file
+        """
+        if i1 is None:
+            if job.source.ndim == 0:
+                job.dest[job.name] = data
+            else:
+                job.dest.create_dataset(job.name, data=data, **job.kwargs)
+            job.output = job.dest[job.name]
+            self._copy_attrs(job.source, job.output)
+        elif i2 > i1:
+            job.output.write_direct(data, dest_sel=np.s_[i1:i2,...])
+        job.nbytes += np.asarray(data).nbytes
+        job.nr_blocks_left -= 1
+        if job.nr_blocks_left == 0:
+            report.datasets[job.output.name] = (job.nbytes, time.perf_counter() - job.start_time)
+            report.total_bytes += job.nbytes
+
+    def run(self):
+        """
+        Copy the contents of all datasets added so far
+
+        :rtype: hdfstream.CopyReport
+        """
+        report = CopyReport()
+        t0 = time.perf_counter()
+        tasks, self._tasks = self._tasks, []
+
+        if self.max_workers == 1 and not self.prefetch:
+            # Download and write one block at a time in this thread
+            for task in tasks:
+                self._write(*task, self._download(*task), report)
+        else:
+            # Download blocks in a thread pool and write them in order in this thread
+            max_in_flight = self.max_workers + (1 if self.prefetch else 0)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pending = collections.deque()
+                try:
+                    for task in tasks:
+                        if len(pending) >= max_in_flight:
+                            self._write(*pending[0][0], pending[0][1].result(), report)
+                            pending.popleft()
+                        pending.append((task, executor.submit(self._download, *task)))
+                    while pending:
+                        self._write(*pending[0][0], pending[0][1].result(), report)
+                        pending.popleft()
+                except BaseException:
+                    for task, future in pending:
+                        future.cancel()
+                    raise
+
+        report.elapsed = time.perf_counter() - t0
+        return report
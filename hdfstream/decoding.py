@@ -1,12 +1,13 @@
 #!/bin/env python
 
+import io
 import requests
 import msgpack
 import msgpack_numpy as mn
 import numpy as np
-from tqdm import tqdm
 
 from hdfstream.streaming_decoder import StreamingDecoder
+from hdfstream.progress import NullProgress, DeferredProgress
 
 # Chunk size in bytes for reading http responses
 chunk_size = 4*1024*1024
@@ -41,6 +42,50 @@ def set_progress_delay(delay):
     _progress_delay = delay
 
 
+_progress_reporter = None
+def set_progress_reporter(reporter):
+    """
+    Set the function used to create a progress reporter for each request.
+    It is called with a description of the request and should return a
+    context manager with an update(n) method, which is called as each
+    chunk of n bytes is received, and a writable total attribute which
+    is set to the expected number of bytes if this is known. Passing
+    hdfstream.NullProgress disables progress reporting with no overhead,
+    and passing None restores the default.
+
+    :param reporter: function or class which returns a progress reporter
+    :type reporter: callable(desc) or None
+    """
+    global _progress_reporter
+    _progress_reporter = reporter
+
+
+def make_progress(desc):
+    """
+    Return a progress reporter for a request
+    """
+    if _progress_reporter is not None:
+        return _progress_reporter(desc)
+    if _disable_progress:
+        return NullProgress(desc)
+    return DeferredProgress(desc, delay=_progress_delay, disable=_disable_progress)
+
+
+def merge_buffers(bins):
+    """
+    Concatenate a list of buffers into a single writable bytearray. If we
+    have a single bytearray already, it is returned without copying.
+    """
+    if len(bins) == 1 and isinstance(bins[0], bytearray):
+        return bins[0]
+    buf = bytearray(sum(len(b) for b in bins))
+    offset = 0
+    for b in bins:
+        buf[offset:offset+len(b)] = b
+        offset += len(b)
+    return buf
+
+
 def decode_hook(data):
     """
     Converts dicts decoded from the msgpack stream into numpy ndarrays. Called
@@ -64,12 +109,14 @@ def decode_hook(data):
         for name in data:
             result[name.encode(encoding="ascii")] = data[name]
 
-        # The array of buffers must be merged (in case of >4GB data).
+        # The array of buffers must be merged (in case of >4GB data) into
+        # a writable buffer which is used as the array's memory.
         if b"data" in result and result[b"data"] is not None:
-            result[b"data"] = b''.join(result[b"data"])
-
-        # Decode the array and copy it to make it writable
-        data = mn.decode(result).copy()
+            result[b"data"] = merge_buffers(result[b"data"])
+            data = mn.decode(result)
+        else:
+            # Decode the array and copy it to make it writable
+            data = mn.decode(result).copy()
 
     # Then check for any vlen data: in that case we have a flattened list
     # which needs to be converted into an object array of the right shape.
@@ -99,7 +146,7 @@ def decode_response(response, desc, destination=None):
     if response.headers.get("Content-Encoding"):
         response.raw.decode_content = True
 
-    with tqdm(unit="B", unit_scale=True, delay=_progress_delay, disable=_disable_progress, desc=desc) as progress:
+    with make_progress(desc) as progress:
 
         # Get the raw data stream from the http response
         stream = StreamingDecoder(response.raw)
@@ -115,26 +162,366 @@ def decode_response(response, desc, destination=None):
             return decode_generic(stream, desc, progress)
 
 
+class _AsyncStream:
+    """
+    Reads the body of an aiohttp response. Bytes which were read ahead to
+    look at the start of the response are kept in a buffer and returned
+    first.
+    """
+    def __init__(self, content):
+        self._content = content
+        self._buf = b""
+        self._pos = 0
+
+    async def peek(self, n):
+        """
+        Return up to n bytes from the stream without consuming them
+        """
+        if len(self._buf) - self._pos < n:
+            chunks = [self._buf[self._pos:],]
+            nr_buffered = len(chunks[0])
+            while nr_buffered < n:
+                chunk = await self._content.read(n - nr_buffered)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                nr_buffered += len(chunk)
+            self._buf = b"".join(chunks)
+            self._pos = 0
+        return memoryview(self._buf)[self._pos:self._pos+n]
+
+    def skip(self, n):
+        """
+        Advance past n bytes which have been peek()'d
+        """
+        self._pos += n
+
+    async def readinto(self, b):
+        """
+        Copy up to len(b) bytes into b, returning the number copied. Each
+        call copies at most one chunk received from the server.
+        """
+        mv = memoryview(b)
+        if self._pos < len(self._buf):
+            data = memoryview(self._buf)[self._pos:self._pos+len(mv)]
+            self._pos += len(data)
+        else:
+            data = await self._content.read(len(mv))
+        mv[:len(data)] = data
+        return len(data)
+
+    async def read_all(self):
+        """
+        Return all remaining bytes in the stream
+        """
+        rest = await self._content.read()
+        data = self._buf[self._pos:] + rest
+        self._buf = b""
+        self._pos = 0
+        return data
+
+    async def read_bin_header(self):
+        """
+        Read the header of a msgpack bin object and return its size in bytes
+        """
+        header = await self.peek(5)
+        if len(header) == 0 or header[0] not in (0xc4, 0xc5, 0xc6):
+            raise RuntimeError("Next msgpack object is not a msgpack_bin!")
+        header_size = _header_table[header[0]][1]
+        if len(header) < header_size:
+            raise RuntimeError("Unexpected end of stream reading msgpack_bin header!")
+        nr_bytes = int.from_bytes(header[1:header_size], "big")
+        self.skip(header_size)
+        return nr_bytes
+
+
+async def async_decode_response(response, desc, destination=None):
+    """
+    Asyncio version of decode_response() for aiohttp responses
+
+    Fixed size ndarrays are received directly into the output buffer, as
+    in decode_ndarray(). Any other response is read into memory and then
+    decoded with decode_generic(), since these are small metadata responses.
+    """
+    array_prefix = bytes((134, 162, 110, 100, 195))
+    with make_progress(desc) as progress:
+        stream = _AsyncStream(response.content)
+        if await stream.peek(len(array_prefix)) == array_prefix:
+            # Response is a fixed length type ndarray
+            max_header_size = 1024
+            header = await stream.peek(max_header_size)
+            result, buf, nr_bins, header_size = parse_ndarray_header(header, destination)
+            progress.total = buf.nbytes
+            stream.skip(header_size)
+            offset = 0
+            for bin_nr in range(nr_bins):
+                bytes_left = await stream.read_bin_header()
+                while bytes_left > 0:
+                    max_to_read = min(bytes_left, chunk_size)
+                    n = await stream.readinto(buf[offset:offset+max_to_read])
+                    if n == 0:
+                        raise RuntimeError("Array body in response is truncated!")
+                    bytes_left -= n
+                    offset += n
+                    progress.update(n)
+            if len(await stream.peek(1)) != 0:
+                raise RuntimeError("Unexpected extra data at end of stream!")
+            return result
+        else:
+            # Response is something else
+            if destination is not None:
+                raise RuntimeError("Can only decode fixed size types directly into a buffer")
+            body = await stream.read_all()
+            return decode_generic(StreamingDecoder(io.BytesIO(body)), desc, progress)
+
+
 def decode_generic(stream, desc, progress):
     """
     Decode a msgpack encoded http response
 
-    This version can handle arbitrary msgpack data types but copies any
-    array body several times, so it's slower and more memory hungry. But
-    good for small but complicated metadata responses.
+    This version can handle arbitrary msgpack data types, so it's good for
+    small but complicated metadata responses. The response is decoded as it
+    arrives so that we never hold a copy of the full response, and the
+    bodies of any embedded ndarrays are read directly from the stream into
+    the buffers which will become the arrays' memory.
     """
+    decoder = _GenericDecoder(stream, progress)
+    result = decoder.decode()
+
+    # We should now be at the end of the stream
+    if not decoder.at_end():
+        raise RuntimeError("Unexpected extra data at end of stream!")
 
-    # Download all data as a list of chunks
-    data = []
-    while this_chunk := stream.read(chunk_size):
-        data.append(this_chunk)
-        progress.update(len(this_chunk))
+    return result
 
-    # Concatenate into one big byte array
-    data = b''.join(data)
 
-    # Call the msgpack decoder
-    return msgpack.unpackb(data, object_hook=decode_hook)
+def _make_header_table():
+    """
+    Make a table to look up the type of a msgpack object from its first
+    byte. Entries are ("map", header_size), ("array", header_size) or
+    ("leaf", fixed_size, length_size) where the total size of a leaf is
+    fixed_size plus the value of the length_size byte length field
+    which follows the first byte.
+    """
+    table = [("leaf", 1, 0)]*256 # fixints, nil, bool
+    for i in range(0x80, 0x90):
+        table[i] = ("map", 1)
+    for i in range(0x90, 0xa0):
+        table[i] = ("array", 1)
+    for i in range(0xa0, 0xc0):
+        table[i] = ("leaf", 1 + (i & 0x1f), 0) # fixstr
+    table[0xc1] = ("invalid",)
+    table[0xc4] = ("leaf", 2, 1) # bin8
+    table[0xc5] = ("leaf", 3, 2) # bin16
+    table[0xc6] = ("leaf", 5, 4) # bin32
+    table[0xc7] = ("leaf", 3, 1) # ext8
+    table[0xc8] = ("leaf", 4, 2) # ext16
+    table[0xc9] = ("leaf", 6, 4) # ext32
+    table[0xca] = ("leaf", 5, 0) # float32
+    table[0xcb] = ("leaf", 9, 0) # float64
+    for i, size in zip(range(0xcc, 0xd4), (2, 3, 5, 9)*2):
+        table[i] = ("leaf", size, 0) # (u)int8 to (u)int64
+    for i, size in zip(range(0xd4, 0xd9), (3, 4, 6, 10, 18)):
+        table[i] = ("leaf", size, 0) # fixext
+    table[0xd9] = ("leaf", 2, 1) # str8
+    table[0xda] = ("leaf", 3, 2) # str16
+    table[0xdb] = ("leaf", 5, 4) # str32
+    table[0xdc] = ("array", 3)
+    table[0xdd] = ("array", 5)
+    table[0xde] = ("map", 3)
+    table[0xdf] = ("map", 5)
+    return table
+_header_table = _make_header_table()
+
+
+class _GenericDecoder:
+    """
+    Decodes a msgpack object from a StreamingDecoder, applying decode_hook()
+    to any maps.
+
+    Data is read from the stream into a buffer of up to max_span bytes. Any
+    object which fits in the buffer is decoded by the msgpack module. Larger
+    maps and arrays are traversed here, one level at a time, until we reach
+    objects which fit. The "data" element of any large ndarray map is read
+    straight from the stream into a new bytearray, provided the "nbytes"
+    key appears before it (which the server ensures).
+    """
+    max_span = 1024*1024
+
+    def __init__(self, stream, progress):
+        self.stream = stream
+        self.progress = progress
+        self.buf = b""
+        self.pos = 0
+        self.at_eof = False
+        # Unpacker used to find the size of buffered objects. If not None,
+        # self.unpacker_base + self.unpacker.tell() == self.pos.
+        self.unpacker = None
+        self.unpacker_base = 0
+
+    def fill(self, n):
+        """
+        Try to ensure that n bytes from the current position are in the
+        buffer. Returns the number of bytes buffered, which will be less
+        than n if we reach the end of the stream.
+        """
+        nr_left = len(self.buf) - self.pos
+        if nr_left < n and not self.at_eof:
+            chunks = [self.buf[self.pos:],]
+            while nr_left < n:
+                chunk = self.stream.read(n - nr_left)
+                if not chunk:
+                    self.at_eof = True
+                    break
+                self.progress.update(len(chunk))
+                chunks.append(chunk)
+                nr_left += len(chunk)
+            self.buf = b''.join(chunks)
+            self.pos = 0
+            self.unpacker = None
+        return nr_left
+
+    def ensure(self, n):
+        """
+        Ensure that n bytes from the current position are in the buffer
+        """
+        if self.fill(n) < n:
+            raise RuntimeError("Response is truncated!")
+
+    def advance(self, n):
+        """
+        Move past n buffered bytes without using the unpacker
+        """
+        self.pos += n
+        self.unpacker = None
+
+    def next_size(self):
+        """
+        Return the size in bytes of the next object if it fits in the
+        buffer, or None if it's larger than max_span bytes.
+        """
+        fresh = False
+        while True:
+            if self.unpacker is None:
+                self.fill(self.max_span)
+                self.unpacker = msgpack.Unpacker(max_buffer_size=0)
+                self.unpacker.feed(memoryview(self.buf)[self.pos:])
+                self.unpacker_base = self.pos
+                fresh = True
+            try:
+                self.unpacker.skip()
+            except msgpack.OutOfData:
+                # Object extends past the end of the buffer. If the buffer
+                # was already full, we'll have to split it up.
+                self.unpacker = None
+                if fresh:
+                    return None
+            else:
+                return self.unpacker_base + self.unpacker.tell() - self.pos
+
+    def decode(self):
+        """
+        Decode the next msgpack object in the stream
+        """
+        size = self.next_size()
+        if size is not None:
+            # Object is in the buffer, so let msgpack decode it
+            obj = msgpack.unpackb(memoryview(self.buf)[self.pos:self.pos+size], object_hook=decode_hook)
+            self.pos += size
+            return obj
+
+        # Otherwise we need to decode the object in parts
+        self.ensure(1)
+        entry = _header_table[self.buf[self.pos]]
+        kind = entry[0]
+        if kind == "leaf":
+            # Large string or binary object: need to read all of it
+            _, size, length_size = entry
+            self.ensure(1+length_size)
+            size += int.from_bytes(self.buf[self.pos+1:self.pos+1+length_size], "big")
+            self.ensure(size)
+            obj = msgpack.unpackb(memoryview(self.buf)[self.pos:self.pos+size])
+            self.advance(size)
+            return obj
+        elif kind == "array":
+            n = self.container_size(entry[1])
+            return [self.decode() for _ in range(n)]
+        elif kind == "map":
+            n = self.container_size(entry[1])
+            data = {}
+            for _ in range(n):
+                key = self.decode()
+                if key == "data" and data.get("nd") is True and "nbytes" in data:
+                    data[key] = self.decode_nd_data(int(data["nbytes"]))
+                else:
+                    data[key] = self.decode()
+            return decode_hook(data)
+        else:
+            raise RuntimeError("Invalid msgpack type in response")
+
+    def container_size(self, header_size):
+        """
+        Return the number of elements in the map or array at the current
+        position and advance past its header
+        """
+        self.ensure(header_size)
+        if header_size == 1:
+            n = self.buf[self.pos] & 0x0f
+        else:
+            n = int.from_bytes(self.buf[self.pos+1:self.pos+header_size], "big")
+        self.advance(header_size)
+        return n
+
+    def decode_nd_data(self, nbytes):
+        """
+        Read an array of msgpack_bin objects into a single new buffer
+        """
+        # The array body is encoded as an array of bin objects, or nil
+        self.ensure(1)
+        entry = _header_table[self.buf[self.pos]]
+        if entry[0] != "array":
+            return self.decode()
+        nr_bins = self.container_size(entry[1])
+
+        # Read the bin objects
+        buf = bytearray(nbytes)
+        mv = memoryview(buf)
+        offset = 0
+        for bin_nr in range(nr_bins):
+            # Get number of bytes in this binary object
+            self.ensure(1)
+            if self.buf[self.pos] not in (0xc4, 0xc5, 0xc6):
+                raise RuntimeError("Next msgpack object is not a msgpack_bin!")
+            header_size = _header_table[self.buf[self.pos]][1]
+            self.ensure(header_size)
+            bytes_left = int.from_bytes(self.buf[self.pos+1:self.pos+header_size], "big")
+            self.advance(header_size)
+            if offset + bytes_left > nbytes:
+                raise RuntimeError("Array body in response is larger than expected!")
+            # Copy any bytes we have already buffered
+            n = min(bytes_left, len(self.buf) - self.pos)
+            mv[offset:offset+n] = memoryview(self.buf)[self.pos:self.pos+n]
+            self.advance(n)
+            offset += n
+            bytes_left -= n
+            # Read the rest directly from the stream into the array's buffer
+            while bytes_left > 0:
+                max_to_read = min(bytes_left, chunk_size)
+                n = self.stream.readinto(mv[offset:offset+max_to_read])
+                if n == 0:
+                    raise RuntimeError("Array body in response is truncated!")
+                bytes_left -= n
+                offset += n
+                self.progress.update(n)
+        if offset != nbytes:
+            raise RuntimeError("Array body in response has incorrect size!")
+        return [buf,]
+
+    def at_end(self):
+        """
+        Return True if there is no more data in the buffer or stream
+        """
+        return self.pos == len(self.buf) and (self.at_eof or len(self.stream.read(1)) == 0)
 
 
 def unpack_equals(unpacker, value):
@@ -143,13 +530,13 @@ def unpack_equals(unpacker, value):
         raise RuntimeError("Unexpected value encountered unpacking ndarray")
 
 
-def decode_ndarray(stream, desc, progress, destination=None):
+def parse_ndarray_header(header, destination=None):
     """
-    Decode a msgpack encoded ndarray of a fixed size type
-
-    This version handles the easy case where we have a single array of a
-    fixed size data type. We decode the array header, allocate a
-    numpy.ndarray and receive data directly into the array's buffer.
+    Interpret the header of a msgpack encoded ndarray of a fixed size type,
+    given at least the first part of the encoded data. Returns the output
+    array (a new array, or the destination buffer after checking that it's
+    suitable), a flat byte view of its memory, the number of msgpack_bin
+    objects containing the array body and the size of the header in bytes.
 
     This assumes that the "data" map key is encoded last by the server. This
     is not likely to change because we need all of the metadata to arrive
@@ -157,9 +544,8 @@ def decode_ndarray(stream, desc, progress, destination=None):
     """
 
     # Read the header: we expect a msgpack map here
-    max_header_size = 1024
     unpacker = msgpack.Unpacker()
-    unpacker.feed(stream.peek(max_header_size))
+    unpacker.feed(header)
     n = unpacker.read_map_header()
 
     # We expect the final map key to be "data". First read all
@@ -204,10 +590,24 @@ def decode_ndarray(stream, desc, progress, destination=None):
     # And check that the buffer is the right size
     if buf.nbytes != nbytes:
         raise RuntimeError("Destination buffer for slice has incorrect size")
-    progress.total = nbytes
+
+    return result, buf, nr_bins, unpacker.tell()
+
+
+def decode_ndarray(stream, desc, progress, destination=None):
+    """
+    Decode a msgpack encoded ndarray of a fixed size type
+
+    This version handles the easy case where we have a single array of a
+    fixed size data type. We decode the array header, allocate a
+    numpy.ndarray and receive data directly into the array's buffer.
+    """
+    max_header_size = 1024
+    result, buf, nr_bins, header_size = parse_ndarray_header(stream.peek(max_header_size), destination)
+    progress.total = buf.nbytes
 
     # Skip past the bytes we've interpreted
-    stream.skip(unpacker.tell())
+    stream.skip(header_size)
 
     # Read the bin objects into the array's buffer
     offset = 0
@@ -7,3 +7,10 @@ max_depth_default = 5
 # Default maximum size in bytes of dataset contents to load with the parent
 # group. Larger datasets are only loaded when sliced.
 data_size_limit_default = 1024*1024
+
+# Default size in bytes of the blocks used to copy datasets to local
+# HDF5 files. Datasets are downloaded and written one block at a time.
+copy_block_size_default = 64*1024*1024
+
+# Default size in bytes of each range request used to download whole files
+download_chunk_size_default = 64*1024*1024
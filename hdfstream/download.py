@@ -0,0 +1,146 @@
+#!/bin/env python
+
+import os
+import json
+import concurrent.futures
+
+from hdfstream.exceptions import HDFStreamRequestError
+from hdfstream.defaults import *
+
+#
+# Resumable download of complete files. The file is split into chunks of
+# a fixed size which are fetched with http range requests, possibly using
+# several threads, and written into a preallocated local file. The
+# indexes of completed chunks are recorded in a json sidecar file next to
+# the output so that an interrupted download can be resumed.
+#
+
+def _sidecar_path(local_path):
+    return f"{local_path}.hdfstream-download"
+
+
+def _load_state(sidecar, size, last_modified, chunk_size):
+    """
+    Return the set of completed chunks from a previous, interrupted
+    download of the same file with the same chunk size
+    """
+    try:
+        with open(sidecar, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if (state.get("size") != size or state.get("last_modified") != last_modified or
+        state.get("chunk_size") != chunk_size):
+        return set()
+    return set(state.get("done", []))
+
+
+def _store_state(sidecar, size, last_modified, chunk_size, done):
+    """
+    Record the completed chunks. The sidecar is replaced atomically so that
+    it's never left partially written.
+    """
+    state = {
+        "size" : size,
+        "last_modified" : last_modified,
+        "chunk_size" : chunk_size,
+        "done" : sorted(done),
+    }
+    tmp_name = f"{sidecar}.tmp"
+    with open(tmp_name, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_name, sidecar)
+
+
+def _download_chunk(connection, path, local_path, start, stop):
+    """
+    Fetch bytes start to stop-1 of the remote file into the same range of
+    the local file. The data are flushed to disk before returning, so that
+    the chunk is only recorded as complete once it has been written.
+    """
+    with open(local_path, "r+b") as f:
+        f.seek(start)
+        nbytes = connection.download_range(path, start, stop, f)
+        f.flush()
+        os.fsync(f.fileno())
+    if nbytes != stop - start:
+        raise HDFStreamRequestError(f"Expected {stop-start} bytes from range request, got {nbytes}")
+
+
+def download_file(connection, path, local_path, size, last_modified=None,
+                  chunk_size=download_chunk_size_default, workers=1, resume=True):
+    """
+    Download the file at the specified virtual path to local_path
+
+    :param connection: connection to the server
+    :type connection: hdfstream.connection.Connection
+    :param path: virtual path of the remote file
+    :type path: str
+    :param local_path: name of the local file to write
+    :type local_path: str
+    :param size: size of the remote file in bytes
+    :type size: int
+    :param last_modified: modification time of the remote file
+    :type last_modified: int or None
+    :param chunk_size: size in bytes of each range request
+    :type chunk_size: int
+    :param workers: number of chunks to download at once
+    :type workers: int
+    :param resume: whether to continue a previous, interrupted download
+    :type resume: bool
+    """
+    workers = int(workers)
+    if workers < 1:
+        raise ValueError("Number of workers must be at least one")
+    size = int(size)
+    chunk_size = int(chunk_size)
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least one byte")
+    local_path = os.fspath(local_path)
+    sidecar = _sidecar_path(local_path)
+
+    # Check for a previous download we can continue
+    done = set()
+    if resume and os.path.exists(local_path) and os.path.getsize(local_path) == size:
+        done = _load_state(sidecar, size, last_modified, chunk_size)
+
+    # Allocate the output file, if we're starting from scratch
+    if len(done) == 0:
+        with open(local_path, "wb") as f:
+            f.truncate(size)
+    _store_state(sidecar, size, last_modified, chunk_size, done)
+
+    # Make a list of chunks still to download
+    nr_chunks = (size + chunk_size - 1) // chunk_size
+    todo = [i for i in range(nr_chunks) if i not in done]
+
+    def fetch(i):
+        _download_chunk(connection, path, local_path, i*chunk_size, min((i+1)*chunk_size, size))
+        return i
+
+    # Download the chunks, recording each one in the sidecar as it completes
+    if workers == 1:
+        for i in todo:
+            done.add(fetch(i))
+            _store_state(sidecar, size, last_modified, chunk_size, done)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, i) for i in todo]
+            error = None
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    done.add(future.result())
+                except Exception as e:
+                    # Stop starting new chunks, but record any which complete
+                    if error is None:
+                        error = e
+                        for f in futures:
+                            f.cancel()
+                    continue
+                _store_state(sidecar, size, last_modified, chunk_size, done)
+            if error is not None:
+                raise error
+
+    # Every chunk has been written in full (see _download_chunk), so the
+    # download is complete
+    os.remove(sidecar)
@@ -1,4 +1,12 @@
 #!/bin/env python
 
 class HDFStreamRequestError(Exception):
-    pass
+    """
+    Exception raised when a request to the server fails. If the failure was
+    reported by the server, status_code contains the http status code and
+    retry_after contains any Retry-After header sent with the response.
+    """
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
@@ -0,0 +1,100 @@
+#!/bin/env python
+
+import socket
+
+import requests.adapters
+import urllib3.connection
+
+
+def socket_options(tcp_nodelay=True, keep_alive=None, socket_rcvbuf=None, socket_sndbuf=None):
+    """
+    Return a list of (level, option, value) tuples to set on new sockets
+
+    :param tcp_nodelay: disable Nagle's algorithm
+    :type tcp_nodelay: bool
+    :param keep_alive: if not None, enable TCP keep-alive probes after this many idle seconds
+    :type keep_alive: int or None
+    :param socket_rcvbuf: size of the socket receive buffer in bytes
+    :type socket_rcvbuf: int or None
+    :param socket_sndbuf: size of the socket send buffer in bytes
+    :type socket_sndbuf: int or None
+
+    :rtype: list of tuples
+    """
+    options = [opt for opt in urllib3.connection.HTTPConnection.default_socket_options
+               if opt[:2] != (socket.IPPROTO_TCP, socket.TCP_NODELAY)]
+    if tcp_nodelay:
+        options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+    if keep_alive is not None:
+        options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        # Idle time and interval options are not available on all platforms
+        for name in ("TCP_KEEPIDLE", "TCP_KEEPINTVL"):
+            if hasattr(socket, name):
+                options.append((socket.IPPROTO_TCP, getattr(socket, name), int(keep_alive)))
+    if socket_rcvbuf is not None:
+        options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, int(socket_rcvbuf)))
+    if socket_sndbuf is not None:
+        options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, int(socket_sndbuf)))
+    return options
+
+
+class PoolAdapter(requests.adapters.HTTPAdapter):
+    """
+    HTTPAdapter with a configurable connection pool size and socket options.
+
+    Connections to the server are kept in a pool and reused for later
+    requests. If more than pool_size requests are in progress at once then
+    either extra connections are opened and discarded after use, or, if
+    pool_block is True, requests wait for a connection to become free.
+
+    :param pool_size: maximum number of connections to keep open
+    :type pool_size: int
+    :param pool_block: wait for a free connection instead of opening extra connections
+    :type pool_block: bool
+    :param socket_options: options to set on new sockets, see socket_options()
+    :type socket_options: list of tuples or None
+    """
+    def __init__(self, pool_size=requests.adapters.DEFAULT_POOLSIZE, pool_block=False,
+                 socket_options=None):
+        if int(pool_size) < 1:
+            raise ValueError("Connection pool size must be at least one")
+        self.socket_options = socket_options
+        self.pool_size = int(pool_size)
+        super().__init__(pool_maxsize=int(pool_size), pool_block=pool_block)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.socket_options is not None:
+            pool_kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+
+    def pool_stats(self):
+        """
+        Return the number of requests sent, the number of new connections
+        opened (each of which needs a TCP and TLS handshake) and the number
+        of requests which reused an existing connection.
+
+        :rtype: dict
+        """
+        nr_requests = 0
+        nr_connections = 0
+        for key in self.poolmanager.pools.keys():
+            pool = self.poolmanager.pools.get(key)
+            if pool is not None:
+                nr_requests += pool.num_requests
+                nr_connections += pool.num_connections
+        return {
+            "requests" : nr_requests,
+            "new_connections" : nr_connections,
+            "reused_connections" : max(0, nr_requests - nr_connections),
+        }
+
+
+def make_adapter(pool_size=None, pool_block=False, tcp_nodelay=True, keep_alive=None,
+                 socket_rcvbuf=None, socket_sndbuf=None):
+    """
+    Create a PoolAdapter from configuration options
+    """
+    if pool_size is None:
+        pool_size = requests.adapters.DEFAULT_POOLSIZE
+    options = socket_options(tcp_nodelay, keep_alive, socket_rcvbuf, socket_sndbuf)
+    return PoolAdapter(pool_size, pool_block, options)
@@ -0,0 +1,174 @@
+#!/bin/env python
+
+import os
+import time
+import hashlib
+import tempfile
+import pathlib
+
+import msgpack
+import numpy as np
+
+from hdfstream.decoding import decode_hook
+
+#
+# Persistent cache of file, directory and HDF5 object metadata. Entries
+# are stored as msgpack files in the user's cache directory, one file
+# per request. Entries are keyed on the server and the user name, so
+# results fetched with one account are never returned to another. HDF5
+# object metadata is keyed on the modification time of the file so it
+# never needs to be revalidated. File and directory listings are used for
+# at most max_age seconds.
+#
+
+_cache_dir = None
+_max_age = 3600.0
+def enable_metadata_cache(enable=True, cache_dir=None, max_age=3600.0):
+    """
+    Enable or disable the persistent cache of file and HDF5 object
+    metadata. This is disabled by default. When enabled, responses to
+    metadata requests are stored on disk and reused by later python
+    processes.
+
+    HDF5 group and dataset metadata is stored along with the modification
+    time of the file, so it is always up to date. Directory listings and
+    file information (including the modification time) are reused for up
+    to max_age seconds.
+
+    :param enable: whether to use the cache
+    :type enable: bool
+    :param cache_dir: directory to store the cache, defaults to the user's cache directory
+    :type cache_dir: str or None
+    :param max_age: time in seconds before file and directory information is requested again
+    :type max_age: float
+    """
+    global _cache_dir, _max_age
+    if enable:
+        if cache_dir is None:
+            import platformdirs
+            cache_dir = platformdirs.user_cache_path(appname="hdfstream") / "metadata"
+        cache_dir = pathlib.Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _cache_dir = cache_dir
+    else:
+        _cache_dir = None
+    _max_age = float(max_age)
+
+
+def clear_metadata_cache():
+    """
+    Delete all entries in the persistent metadata cache
+    """
+    if _cache_dir is not None:
+        for filename in _cache_dir.glob("*.msgpack"):
+            filename.unlink(missing_ok=True)
+
+
+def _encode(obj):
+    """
+    Encode numpy arrays in the same format used by the server, so that
+    cached entries can be decoded in the same way as http responses.
+    """
+    if isinstance(obj, np.generic):
+        obj = np.asarray(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return {"vlen" : True, "shape" : list(obj.shape), "data" : obj.ravel().tolist()}
+        elif obj.dtype.names is not None:
+            kind, dtype = b"V", obj.dtype.descr
+        else:
+            kind, dtype = "", obj.dtype.str
+        return {"nd" : True, "type" : dtype, "kind" : kind, "shape" : list(obj.shape),
+                "nbytes" : obj.nbytes, "data" : [np.ascontiguousarray(obj).tobytes()]}
+    raise TypeError(f"Unable to encode object of type {type(obj)}")
+
+
+def _filename(key):
+    """
+    Return the name of the file used to store the entry with the specified key
+    """
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    return _cache_dir / f"{digest}.msgpack"
+
+
+def _load(key, max_age=None):
+    """
+    Return the cached data for the specified key, or None if there is no
+    cache entry or it is older than max_age seconds.
+    """
+    if _cache_dir is None:
+        return None
+    try:
+        with open(_filename(key), "rb") as f:
+            entry = msgpack.unpackb(f.read(), object_hook=decode_hook)
+    except (OSError, ValueError, msgpack.UnpackException):
+        return None
+    if not isinstance(entry, dict) or entry.get("key") != repr(key):
+        return None
+    try:
+        if max_age is not None and time.time() - entry["time"] > max_age:
+            return None
+        return entry["data"]
+    except (KeyError, TypeError):
+        # Malformed entry, so treat it as a miss
+        return None
+
+
+def _store(key, data):
+    """
+    Store data in the cache. The file is written under a temporary name
+    and then renamed so that other processes never read partial entries.
+    Failing to write the cache is not an error, since the data has already
+    been received from the server.
+    """
+    if _cache_dir is None:
+        return
+    entry = {"key" : repr(key), "time" : time.time(), "data" : data}
+    payload = msgpack.packb(entry, default=_encode)
+    try:
+        fd, tmp_name = tempfile.mkstemp(dir=_cache_dir, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_name, _filename(key))
+    except BaseException as e:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        if not isinstance(e, OSError):
+            raise
+
+
+def load_path(server, user, path):
+    """
+    Return cached file or directory information, or None if not available
+    """
+    return _load(("path", server, user, path), max_age=_max_age)
+
+
+def store_path(server, user, path, data):
+    """
+    Store file or directory information in the cache
+    """
+    _store(("path", server, user, path), data)
+
+
+def load_object(server, user, path, name, data_size_limit, max_depth, last_modified):
+    """
+    Return cached HDF5 object metadata, or None if not available
+    """
+    if last_modified is None:
+        return None
+    return _load(("object", server, user, path, name, data_size_limit, max_depth, last_modified))
+
+
+def store_object(server, user, path, name, data_size_limit, max_depth, last_modified, data):
+    """
+    Store HDF5 object metadata in the cache
+    """
+    if last_modified is None:
+        return
+    _store(("object", server, user, path, name, data_size_limit, max_depth, last_modified), data)
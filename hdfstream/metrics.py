@@ -0,0 +1,234 @@
+#!/bin/env python
+
+import sys
+import time
+import atexit
+import threading
+import contextlib
+import collections
+
+#
+# Request tracing. Functions registered with add_request_hook() are called
+# with a RequestRecord after every http request made by a Connection,
+# including failed requests and each attempt of a retried request.
+#
+
+_hooks = []
+def add_request_hook(func):
+    """
+    Register a function to be called after every http request. The
+    function is called with a :py:class:`hdfstream.RequestRecord` which
+    describes the request. It may be called from several threads at once.
+
+    :param func: the function to call
+    :type func: callable(record)
+    """
+    global _hooks
+    _hooks = _hooks + [func]
+
+
+def remove_request_hook(func):
+    """
+    Remove a function registered with add_request_hook()
+
+    :param func: the function to remove
+    :type func: callable(record)
+    """
+    global _hooks
+    _hooks = [hook for hook in _hooks if hook != func]
+
+
+def slice_count(slice_descriptor):
+    """
+    Return the number of ranges in the first dimension of a slice descriptor
+    """
+    if slice_descriptor is None or len(slice_descriptor) == 0:
+        return 0
+    starts = slice_descriptor[0][0]
+    return len(starts) if hasattr(starts, "__len__") else 1
+
+
+class RequestRecord:
+    """
+    Information about a single http request
+
+    :ivar method: http method (GET or POST)
+    :ivar kind: type of request: "path", "object", "slice", "download" or "connect"
+    :ivar url: URL of the request
+    :ivar name: name of the HDF5 object, if any
+    :ivar nr_slices: number of ranges in the first dimension of a slice request
+    :ivar request_bytes: size of the request body in bytes
+    :ivar response_bytes: size of the response body in bytes, if known
+    :ivar status: http status code, or None if no response was received
+    :ivar ttfb: time in seconds until the response headers were received
+    :ivar decode_time: time in seconds to receive and decode the response body
+    :ivar elapsed: total time taken in seconds
+    :ivar error: name of the exception raised, or None if the request succeeded
+    """
+    def __init__(self, method, kind, url, name=None, nr_slices=0, request_bytes=0):
+        self.method = method
+        self.kind = kind
+        self.url = url
+        self.name = name
+        self.nr_slices = nr_slices
+        self.request_bytes = request_bytes
+        self.response_bytes = None
+        self.status = None
+        self.ttfb = None
+        self.decode_time = None
+        self.elapsed = None
+        self.error = None
+        self._start = time.perf_counter()
+        self._headers_time = None
+
+    def __repr__(self):
+        return (f'<Request record: {self.method} {self.kind} {self.url} status={self.status} '
+                f'elapsed={self.elapsed}>')
+
+    def response_started(self, response):
+        """
+        Called when the response headers have been received
+        """
+        self._headers_time = time.perf_counter()
+        self.ttfb = self._headers_time - self._start
+        # requests responses have status_code, aiohttp responses have status
+        self.status = getattr(response, "status_code", None)
+        if self.status is None:
+            self.status = response.status
+
+    def response_finished(self, response, nbytes=None):
+        """
+        Called when the response body has been read. The caller may pass
+        the number of bytes received if the response can't report it.
+        """
+        now = time.perf_counter()
+        if self._headers_time is not None:
+            self.decode_time = now - self._headers_time
+        if nbytes is not None:
+            self.response_bytes = int(nbytes)
+            return
+        try:
+            self.response_bytes = int(response.raw.tell())
+        except (AttributeError, TypeError, ValueError):
+            length = response.headers.get("Content-Length")
+            self.response_bytes = int(length) if length is not None else None
+
+
+class _NullRecord:
+    """
+    Used in place of a RequestRecord when there are no hooks
+    """
+    def response_started(self, response):
+        pass
+
+    def response_finished(self, response, nbytes=None):
+        pass
+
+_null_record = _NullRecord()
+
+
+@contextlib.contextmanager
+def record_request(method, kind, url, name=None, nr_slices=0, request_bytes=0, observer=None):
+    """
+    Context manager which times a request and passes the resulting record
+    to any registered hooks, and to observer if it's not None. Yields the
+    record, so that the caller can call its response_started() and
+    response_finished() methods.
+    """
+    hooks = _hooks
+    if observer is not None:
+        hooks = hooks + [observer]
+    if not hooks:
+        yield _null_record
+        return
+    record = RequestRecord(method, kind, url, name, nr_slices, request_bytes)
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.elapsed = time.perf_counter() - record._start
+        for hook in hooks:
+            hook(record)
+
+
+class RequestMetrics:
+    """
+    Request hook which accumulates statistics for each type of request.
+    Register an instance with :py:func:`hdfstream.add_request_hook` or
+    use :py:func:`hdfstream.enable_request_metrics`.
+    """
+    _fields = ("requests", "errors", "request_bytes", "response_bytes",
+               "ttfb", "decode_time", "elapsed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Discard all accumulated statistics
+        """
+        with self._lock:
+            self.totals = collections.defaultdict(lambda: dict.fromkeys(self._fields, 0))
+
+    def __call__(self, record):
+        with self._lock:
+            totals = self.totals[record.kind]
+            totals["requests"] += 1
+            totals["errors"] += (record.error is not None or
+                                 (record.status is not None and record.status >= 400))
+            totals["request_bytes"] += record.request_bytes
+            totals["response_bytes"] += record.response_bytes or 0
+            totals["ttfb"] += record.ttfb or 0.0
+            totals["decode_time"] += record.decode_time or 0.0
+            totals["elapsed"] += record.elapsed or 0.0
+
+    def summary(self):
+        """
+        Return a table of statistics for each type of request
+
+        :rtype: str
+        """
+        header = (f'{"Request":<10} {"Count":>8} {"Errors":>7} {"Sent":>12} {"Received":>14} '
+                  f'{"Mean TTFB":>10} {"Mean decode":>12} {"Total time":>11}')
+        lines = [header, "-"*len(header)]
+        with self._lock:
+            for kind, t in sorted(self.totals.items()):
+                n = t["requests"]
+                lines.append(f'{kind:<10} {n:>8} {t["errors"]:>7} {t["request_bytes"]:>12} '
+                             f'{t["response_bytes"]:>14} {t["ttfb"]/n:>9.4f}s '
+                             f'{t["decode_time"]/n:>11.4f}s {t["elapsed"]:>10.3f}s')
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.summary()
+
+
+_metrics = None
+def enable_request_metrics(report_at_exit=False):
+    """
+    Start accumulating statistics on all http requests. Returns a
+    :py:class:`hdfstream.RequestMetrics` object with a summary() method
+    which returns a table of the results. If report_at_exit is True, the
+    table is written to stderr when python exits.
+
+    :param report_at_exit: whether to print a summary at exit
+    :type report_at_exit: bool
+
+    :rtype: hdfstream.RequestMetrics
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = RequestMetrics()
+        add_request_hook(_metrics)
+    if report_at_exit:
+        atexit.unregister(_report_metrics)
+        atexit.register(_report_metrics)
+    return _metrics
+
+
+def _report_metrics():
+    if _metrics is not None:
+        print(_metrics.summary(), file=sys.stderr)
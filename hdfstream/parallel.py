@@ -0,0 +1,57 @@
+#!/bin/env python
+
+import concurrent.futures
+
+_max_workers = 1
+def set_max_workers(max_workers):
+    """
+    Set the maximum number of http requests which may be in progress at
+    once when a read has to be split into several requests. The default of
+    one sends the requests one after another.
+
+    :param max_workers: maximum number of concurrent requests
+    :type max_workers: int
+    """
+    global _max_workers
+    max_workers = int(max_workers)
+    if max_workers < 1:
+        raise ValueError("Number of workers must be at least one")
+    _max_workers = max_workers
+
+
+def get_max_workers():
+    """
+    Return the maximum number of concurrent requests
+
+    :rtype: int
+    """
+    return _max_workers
+
+
+def run_requests(func, args_list, max_workers=None):
+    """
+    Call func(*args) for each args tuple in args_list and return a list of
+    the results. Calls are made from a pool of threads if max_workers > 1.
+
+    Any exception raised by func is re-raised here once all calls which
+    have already started have finished.
+    """
+    if max_workers is None:
+        max_workers = _max_workers
+    args_list = list(args_list)
+
+    # Run requests in this thread if there's nothing to gain from a pool
+    max_workers = min(max_workers, len(args_list))
+    if max_workers <= 1:
+        return [func(*args) for args in args_list]
+
+    # Otherwise submit all requests to a thread pool. On error, cancel any
+    # requests which have not started yet.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func, *args) for args in args_list]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
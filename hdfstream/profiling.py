@@ -0,0 +1,219 @@
+#!/bin/env python
+
+import time
+import random
+import threading
+import contextlib
+
+import hdfstream.metrics as metrics
+
+#
+# Attribute time spent reading data to the stages of a request:
+#
+#   parse   - interpreting the index used to slice a dataset
+#   encode  - msgpack encoding the request
+#   wait    - waiting for the server to send the response headers
+#   decode  - receiving and decoding the response body
+#   reorder - rearranging the result when indexing with an array
+#
+# The wait and decode times come from the request records described in
+# metrics.py. The other stages are timed with stage(), which does nothing
+# if no profile is active.
+#
+
+stages = ("parse", "encode", "wait", "decode", "reorder")
+
+_active = []
+
+
+class Profile:
+    """
+    Accumulates time and byte counts for each stage of reading data.
+    Use :py:func:`hdfstream.profile` to create one.
+
+    If sample_rate is less than one, only that fraction of operations is
+    timed and the totals are scaled up to estimate the full cost.
+
+    :param sample_rate: fraction of operations to time
+    :type sample_rate: float
+
+    :ivar wall_time: time in seconds that the profile was active
+    :vartype wall_time: float
+    """
+    def __init__(self, sample_rate=1.0):
+        if not (0.0 < sample_rate <= 1.0):
+            raise ValueError("sample_rate must be in the range (0, 1]")
+        self.sample_rate = float(sample_rate)
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+        self._start = None
+        self._totals = {name : [0, 0.0, 0] for name in stages}
+
+    def sample(self):
+        """
+        Return True if the next operation should be timed
+        """
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def add(self, stage, elapsed, nbytes=0):
+        """
+        Add a timed operation to the totals for a stage
+        """
+        with self._lock:
+            totals = self._totals[stage]
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] += nbytes
+
+    def __call__(self, record):
+        # Called with a RequestRecord after each http request
+        if record.ttfb is None or not self.sample():
+            return
+        self.add("wait", record.ttfb)
+        if record.decode_time is not None:
+            self.add("decode", record.decode_time, record.response_bytes or 0)
+
+    def start(self):
+        """
+        Start collecting timings
+        """
+        global _active
+        self._start = time.perf_counter()
+        _active = _active + [self]
+        metrics.add_request_hook(self)
+
+    def stop(self):
+        """
+        Stop collecting timings
+        """
+        global _active
+        metrics.remove_request_hook(self)
+        _active = [p for p in _active if p is not self]
+        if self._start is not None:
+            self.wall_time += time.perf_counter() - self._start
+            self._start = None
+
+    def as_dict(self):
+        """
+        Return the results as a dict of the form
+        {stage : {"calls" : ..., "time" : ..., "bytes" : ...}}. Values
+        are estimates scaled by the sampling rate. Also includes the
+        total wall clock time as "wall_time".
+
+        :rtype: dict
+        """
+        scale = 1.0 / self.sample_rate
+        result = {}
+        with self._lock:
+            for name, (calls, elapsed, nbytes) in self._totals.items():
+                result[name] = {
+                    "calls" : int(round(calls*scale)),
+                    "time" : elapsed*scale,
+                    "bytes" : int(round(nbytes*scale)),
+                }
+        result["wall_time"] = self.wall_time
+        return result
+
+    def summary(self):
+        """
+        Return a table of the time spent in each stage
+
+        :rtype: str
+        """
+        result = self.as_dict()
+        wall_time = result.pop("wall_time")
+        header = f'{"Stage":<8} {"Calls":>8} {"Time":>11} {"% wall":>7} {"Bytes":>14} {"MB/s":>9}'
+        lines = [header, "-"*len(header)]
+        for name, t in result.items():
+            percent = 100.0*t["time"]/wall_time if wall_time > 0 else 0.0
+            rate = t["bytes"]/t["time"]/2**20 if t["time"] > 0 else 0.0
+            lines.append(f'{name:<8} {t["calls"]:>8} {t["time"]:>10.4f}s {percent:>6.1f}% '
+                         f'{t["bytes"]:>14} {rate:>9.1f}')
+        lines.append(f'Wall time: {wall_time:.4f}s')
+        if self.sample_rate < 1.0:
+            lines.append(f'Estimated from a sample of {100*self.sample_rate:.3g}% of operations')
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.summary()
+
+
+@contextlib.contextmanager
+def profile(sample_rate=1.0):
+    """
+    Context manager which measures the time spent in each stage of
+    reading data within the block. Yields a :py:class:`hdfstream.Profile`
+    which can be used to report the results::
+
+      with hdfstream.profile() as prof:
+          data = dataset[...]
+      print(prof)
+
+    Reads in all threads are included. Setting sample_rate less than one
+    reduces the overhead by only timing a random subset of operations.
+
+    :param sample_rate: fraction of operations to time
+    :type sample_rate: float
+
+    :rtype: hdfstream.Profile
+    """
+    prof = Profile(sample_rate)
+    prof.start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+
+
+class _Stage:
+    """
+    Times a block of code and adds it to one or more profiles
+    """
+    def __init__(self, name, profiles):
+        self.name = name
+        self.profiles = profiles
+        self.nbytes = 0
+
+    def add_bytes(self, n):
+        self.nbytes += n
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        elapsed = time.perf_counter() - self._start
+        for prof in self.profiles:
+            prof.add(self.name, elapsed, self.nbytes)
+        return False
+
+
+class _NullStage:
+    """
+    Used in place of a _Stage when no profile is active
+    """
+    def add_bytes(self, n):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+_null_stage = _NullStage()
+
+
+def stage(name):
+    """
+    Return a context manager which times the enclosed code as part of
+    the named stage in any active profiles. Its add_bytes() method can
+    be used to record the amount of data processed.
+    """
+    profiles = _active
+    if not profiles:
+        return _null_stage
+    profiles = [prof for prof in profiles if prof.sample()]
+    if not profiles:
+        return _null_stage
+    return _Stage(name, profiles)
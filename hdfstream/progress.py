@@ -0,0 +1,102 @@
+#!/bin/env python
+
+import time
+
+#
+# Progress reporters used while decoding responses. A reporter is a
+# context manager with an update(n) method, which is called as each
+# chunk of n bytes arrives, and a total attribute, which may be set to
+# the expected size of the response once it's known.
+#
+
+class NullProgress:
+    """
+    Progress reporter which does nothing. Use this to remove all progress
+    reporting overhead in batch jobs::
+
+      hdfstream.set_progress_reporter(hdfstream.NullProgress)
+
+    :param desc: description of the request
+    :type desc: str
+    """
+    def __init__(self, desc=None):
+        self.total = None
+
+    def update(self, n):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+
+class DeferredProgress:
+    """
+    Progress reporter which only creates a tqdm progress bar once the
+    request has taken longer than delay seconds or the expected size of
+    the response is at least min_bytes. Most requests are small and
+    quick, so this avoids the cost of setting up a progress bar for them.
+
+    :param desc: description of the request
+    :type desc: str
+    :param delay: time in seconds before the progress bar is shown
+    :type delay: float
+    :param disable: passed to tqdm: None to only show the bar on a terminal
+    :type disable: bool or None
+    :param min_bytes: create the bar immediately for responses of at least this size
+    :type min_bytes: int
+    """
+    min_bytes_default = 16*1024*1024
+
+    def __init__(self, desc=None, delay=0.1, disable=None, min_bytes=None):
+        self.desc = desc
+        self.delay = delay
+        self.disable = disable
+        self.min_bytes = self.min_bytes_default if min_bytes is None else min_bytes
+        self.start_time = time.monotonic()
+        self.n = 0
+        self._total = None
+        self.bar = None
+
+    def _create_bar(self):
+        # Imported here because tqdm is slow to import
+        from tqdm import tqdm
+        delay = max(0.0, self.delay - (time.monotonic() - self.start_time))
+        self.bar = tqdm(unit="B", unit_scale=True, delay=delay, disable=self.disable,
+                        desc=self.desc, total=self._total, initial=self.n)
+
+    @property
+    def total(self):
+        return self._total
+
+    @total.setter
+    def total(self, total):
+        self._total = total
+        if self.bar is not None:
+            self.bar.total = total
+        elif total is not None and total >= self.min_bytes:
+            self._create_bar()
+
+    def update(self, n):
+        if self.bar is not None:
+            self.bar.update(n)
+            return
+        self.n += n
+        if time.monotonic() - self.start_time >= self.delay:
+            self._create_bar()
+
+    def close(self):
+        if self.bar is not None:
+            self.bar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+        return False
@@ -0,0 +1,231 @@
+#!/bin/env python
+
+import os
+import time
+import struct
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#
+# Client side limits on the rate of requests to a server and the number
+# of requests in progress at once. The request rate is limited with a token
+# bucket: tokens are added at a fixed rate up to a maximum of burst tokens,
+# and each request consumes one token. The bucket can optionally be stored
+# in a file which is locked while it's updated, so that all of the user's
+# processes on the same host share the same limit. If the file can't be
+# used the limit only applies within this process.
+#
+
+def shared_state_file(server):
+    """
+    Return the name of the file used to share the token bucket for the
+    specified server between processes. This is in the user's cache
+    directory so that it can't be tampered with by other users.
+    """
+    import platformdirs
+    digest = hashlib.sha1(server.encode("utf-8")).hexdigest()
+    return os.path.join(platformdirs.user_cache_dir(appname="hdfstream"), "rate-limit", digest)
+
+
+class RateLimiter:
+    """
+    Limits the rate of requests and the number of requests in progress at
+    once. Requests should be made inside a ``with limiter.request():``
+    block, which waits until the request is allowed.
+
+    :param rate: maximum average number of requests per second, or None for no limit
+    :type rate: float or None
+    :param burst: maximum number of requests which can be made at once after
+                  a period of inactivity. Defaults to max(1, rate).
+    :type burst: float or None
+    :param max_in_flight: maximum number of requests in progress at once in
+                          this process, or None for no limit
+    :type max_in_flight: int or None
+    :param shared_file: if not None, the token bucket is stored in this file
+                        so that the rate limit applies to all processes
+                        using the same file. Falls back to a limit for
+                        this process only if the file can't be opened.
+    :type shared_file: str or None
+    """
+    _state = struct.Struct("<dd")
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None, shared_file=None):
+        if rate is not None and rate <= 0:
+            raise ValueError("Request rate must be positive")
+        if burst is not None and burst < 1:
+            raise ValueError("Burst size must be at least one request")
+        if max_in_flight is not None and int(max_in_flight) < 1:
+            raise ValueError("Number of requests in flight must be at least one")
+        if shared_file is not None and fcntl is None:
+            raise RuntimeError("Sharing rate limits between processes requires the fcntl module")
+        self.rate = None if rate is None else float(rate)
+        if burst is None and rate is not None:
+            burst = max(1.0, self.rate)
+        self.burst = None if burst is None else float(burst)
+        self.max_in_flight = None if max_in_flight is None else int(max_in_flight)
+        self.shared_file = None if shared_file is None else os.fspath(shared_file)
+        if self.shared_file is not None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.shared_file)), mode=0o700, exist_ok=True)
+            except OSError:
+                pass
+
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._time = time.monotonic()
+        self._semaphore = None
+        if self.max_in_flight is not None:
+            self._semaphore = threading.BoundedSemaphore(self.max_in_flight)
+        self.nr_waits = 0
+        self.wait_time = 0.0
+
+    def __repr__(self):
+        return f'<Rate limiter: rate={self.rate}, burst={self.burst}, max_in_flight={self.max_in_flight}>'
+
+    def _take_token(self, tokens, last_time, now):
+        """
+        Add tokens for the time since last_time, then try to take one.
+        Returns the new number of tokens and the time to wait before
+        trying again, which is zero if we got a token.
+        """
+        tokens = min(self.burst, tokens + (now - last_time)*self.rate)
+        if tokens >= 1.0:
+            return tokens - 1.0, 0.0
+        return tokens, (1.0 - tokens)/self.rate
+
+    def _try_acquire_local(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, wait = self._take_token(self._tokens, self._time, now)
+            self._time = now
+        return wait
+
+    def _try_acquire_shared(self):
+        """
+        Try to take a token from the bucket in the shared file. Returns
+        the time to wait as for _take_token(), or None if the file could
+        not be used.
+        """
+        # Don't follow symlinks, and only allow the owner to access the file
+        flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+        try:
+            fd = os.open(self.shared_file, flags, 0o600)
+        except OSError:
+            return None
+        # Uses wall clock time, since monotonic clocks may differ between processes
+        with os.fdopen(fd, "r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            except OSError:
+                return None
+            try:
+                now = time.time()
+                data = f.read(self._state.size)
+                if len(data) == self._state.size:
+                    tokens, last_time = self._state.unpack(data)
+                    last_time = min(last_time, now)
+                else:
+                    tokens, last_time = self.burst, now
+                tokens, wait = self._take_token(tokens, last_time, now)
+                f.seek(0)
+                f.truncate()
+                f.write(self._state.pack(tokens, now))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return wait
+
+    def _next_wait(self):
+        """
+        Try to take a token. Returns zero if we got one, otherwise the time
+        to wait before trying again.
+        """
+        wait = None
+        if self.shared_file is not None:
+            wait = self._try_acquire_shared()
+        if wait is None:
+            wait = self._try_acquire_local()
+        if wait > 0.0:
+            with self._lock:
+                self.nr_waits += 1
+                self.wait_time += wait
+        return wait
+
+    def acquire_token(self):
+        """
+        Wait until the rate limit allows another request
+        """
+        if self.rate is None:
+            return
+        while True:
+            wait = self._next_wait()
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+    async def acquire_token_async(self):
+        """
+        Asyncio version of acquire_token(), which waits without blocking
+        the event loop
+        """
+        import asyncio
+        if self.rate is None:
+            return
+        while True:
+            wait = self._next_wait()
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
+
+    @contextlib.contextmanager
+    def request(self):
+        """
+        Context manager which waits until a request is allowed and counts
+        the request as in progress until the block exits
+        """
+        if self._semaphore is not None:
+            with self._semaphore:
+                self.acquire_token()
+                yield
+        else:
+            self.acquire_token()
+            yield
+
+    @contextlib.asynccontextmanager
+    async def async_request(self):
+        """
+        Asyncio version of request(). Requests in progress count towards
+        the same max_in_flight limit as requests made with request().
+        """
+        import asyncio
+        if self._semaphore is not None:
+            # Poll the semaphore, since a threading semaphore can't be awaited
+            delay = 0.001
+            while not self._semaphore.acquire(blocking=False):
+                await asyncio.sleep(delay)
+                delay = min(2*delay, 0.05)
+            try:
+                await self.acquire_token_async()
+                yield
+            finally:
+                self._semaphore.release()
+        else:
+            await self.acquire_token_async()
+            yield
+
+
+def make_rate_limiter(server, rate_limit=None, burst=None, max_in_flight=None, shared_rate_limit=False):
+    """
+    Create a RateLimiter for the specified server from configuration
+    options, or return None if no limits are set
+    """
+    if rate_limit is None and max_in_flight is None:
+        return None
+    shared_file = shared_state_file(server) if shared_rate_limit else None
+    return RateLimiter(rate_limit, burst, max_in_flight, shared_file)
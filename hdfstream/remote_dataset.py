@@ -2,8 +2,15 @@
 
 import numpy as np
 import collections.abc
+from requests import HTTPError
 
 import hdfstream.slice_utils as su
+from hdfstream.defaults import *
+import hdfstream.parallel as parallel
+import hdfstream.profiling as profiling
+import hdfstream.block_cache as block_cache
+from hdfstream.copy_pipeline import CopyPipeline
+from hdfstream.exceptions import HDFStreamRequestError
 
 
 class RemoteDataset:
@@ -34,6 +41,10 @@ class RemoteDataset:
     :vartype dtype: np.dtype
     :ivar shape: shape of this dataset
     :vartype shape: tuple of integers
+    :ivar split_size: slices larger than this many bytes are split into several requests, or never split if None
+    :vartype split_size: int or None
+    :ivar max_gap: when indexing with an array, ranges up to this many elements apart are read with one slice
+    :vartype max_gap: int
     """
     def __init__(self, connection, file_path, name, data, parent):
 
@@ -51,7 +62,10 @@ class RemoteDataset:
         else:
             self.data = None
         self.parent = parent
+        self.last_modified = parent.last_modified if parent is not None else None
         self.max_nr_slices = 16777216 # maximum number of slices in one request
+        self.split_size = None # split slices larger than this many bytes into several requests
+        self.max_gap = 0 # merge array index ranges separated by up to this many elements
 
         # Compute total number of elements in the dataset
         size = 1
@@ -68,34 +82,289 @@ class RemoteDataset:
         """
         Fetch a dataset slice by indexing this object.
         """
-        nd_slice = su.parse_key(self.shape, key)
+        with profiling.stage("parse"):
+            nd_slice = su.parse_key(self.shape, key, self.max_gap)
 
         if self.data is None:
             # Data is not in memory, so we'll need to request it
-            if hasattr(nd_slice, "to_generator"):
+            starts, counts, rest = self._key_ranges(nd_slice)
+            if self._use_block_cache(starts, counts):
+                # Read the data from cached blocks, requesting any which are missing
+                data = np.ndarray(nd_slice.result_shape(), dtype=self.dtype)
+                self._read_cached(starts, counts, rest, data)
+            elif hasattr(nd_slice, "to_generator"):
                 # Might need to chunk the request if we indexed the dataset with a large array
                 data = np.ndarray(nd_slice.result_shape(), dtype=self.dtype)
-                offset = 0
-                for n, params in nd_slice.to_generator(self.max_nr_slices):
-                    self.connection.request_slice_into(self.file_path, self.name, params, data[offset:offset+n,...])
-                    offset += n
+                self._request_slices_into(self._plan_requests(nd_slice, data))
+            elif self._rows_per_request(nd_slice) is not None:
+                # Large slice, so download it in parts into a single output array
+                data = np.ndarray(nd_slice.count, dtype=self.dtype)
+                self._request_slice_into(nd_slice, data)
             else:
                 # Send a single request for the data
-                data = self.connection.request_slice(self.file_path, self.name, nd_slice.to_list())
-            # Remove dimensions where the index was a scalar
-            data = data.reshape(nd_slice.result_shape())
-            # Might need to reorder the output if key included an array
-            if hasattr(nd_slice, "reorder"):
-                data = nd_slice.reorder(data)
-            # In case of scalar results, don't wrap in a numpy scalar
-            if isinstance(data, np.ndarray):
-                if len(data.shape) == 0:
-                    return data[()]
-            return data
+                data = self._request_slice(nd_slice.to_list())
+            return self._finish_read(nd_slice, data)
         else:
             # Dataset was already loaded with the metadata
             return self.data[key]
 
+    def _key_ranges(self, nd_slice):
+        """
+        Return the starts and counts of the ranges to read in the first
+        dimension for a parsed key, and a list with a [start, count] pair
+        for each subsequent dimension
+        """
+        if hasattr(nd_slice, "to_generator"):
+            return nd_slice.starts, nd_slice.counts, nd_slice.nd_slice.to_list()
+        else:
+            return nd_slice.start[:1], nd_slice.count[:1], nd_slice.to_list()[1:]
+
+    def _finish_read(self, nd_slice, data):
+        """
+        Give the data read for a parsed key the shape and order implied by
+        the key
+        """
+        # Remove dimensions where the index was a scalar
+        data = data.reshape(nd_slice.result_shape())
+        # Might need to reorder the output if key included an array
+        if hasattr(nd_slice, "reorder"):
+            with profiling.stage("reorder") as stage:
+                data = nd_slice.reorder(data)
+                stage.add_bytes(data.nbytes)
+        # In case of scalar results, don't wrap in a numpy scalar
+        if isinstance(data, np.ndarray):
+            if len(data.shape) == 0:
+                return data[()]
+        return data
+
+    def _request_limits(self, row_shape):
+        """
+        Return the maximum number of slices and the maximum number of
+        elements in the first dimension to include in one request, where
+        row_shape is the shape of the selection in the other dimensions.
+        The number of elements is limited by self.split_size and by the
+        connection's request planner, and is None if there is no limit.
+        """
+        row_bytes = None
+        if not self.dtype.hasobject:
+            row_bytes = int(np.prod(row_shape)) * self.dtype.itemsize
+        return self.connection.planner.limits(self.max_nr_slices, row_bytes, self.split_size,
+                                              parallel.get_max_workers())
+
+    def _rows_per_request(self, nd_slice):
+        """
+        Return the number of elements in the first dimension to request at a
+        time if the slice is large enough to be split into several requests
+        according to self.split_size and the request planner, or None if it
+        should not be split.
+        """
+        if nd_slice.rank == 0:
+            return None
+        max_nr_slices, nr_rows = self._request_limits(nd_slice.count[1:])
+        if nr_rows is None or nr_rows >= nd_slice.count[0]:
+            return None
+        return nr_rows
+
+    def _request_slice_into(self, nd_slice, destination):
+        """
+        Download a NormalizedSlice into the destination buffer. Large slices
+        are split along the first dimension into several requests (see
+        _rows_per_request()), each of which writes to its own part of the
+        buffer.
+        """
+        requests = self._plan_requests(nd_slice, destination)
+        if len(requests) == 1:
+            self._request_slice(*requests[0])
+        else:
+            self._request_slices_into(requests)
+
+    def _plan_requests(self, nd_slice, destination):
+        """
+        Return a list of (slice_descriptor, destination) pairs which read
+        the selection given by nd_slice into the destination buffer. Reads
+        indexed with an array are split according to the limits on the
+        number of slices and rows per request, and large slices are split
+        along the first dimension (see _rows_per_request()). Each request
+        writes to its own part of the buffer.
+        """
+        if hasattr(nd_slice, "to_generator"):
+            max_nr_slices, max_rows = self._request_limits(nd_slice.nd_slice.count)
+            pieces = nd_slice.to_generator(max_nr_slices, max_rows)
+        else:
+            nr_rows = self._rows_per_request(nd_slice)
+            if nr_rows is None or destination.size != np.prod(nd_slice.count):
+                return [(nd_slice.to_list(), destination)]
+            # View the buffer with one dimension per dimension in the dataset
+            destination = destination.reshape(nd_slice.count)
+            pieces = nd_slice.split(nr_rows)
+        requests = []
+        offset = 0
+        for n, params in pieces:
+            requests.append((params, destination[offset:offset+n,...]))
+            offset += n
+        return requests
+
+    def _request_slices_into(self, requests):
+        """
+        Download a sequence of slices into their destination buffers. Takes
+        a list of (slice_descriptor, destination) pairs. The requests may be
+        sent concurrently (see :py:func:`hdfstream.set_max_workers`) so the
+        destination buffers must not overlap.
+        """
+        parallel.run_requests(self._request_slice, requests)
+
+    def _request_slice(self, slice_descriptor, destination=None):
+        """
+        Request a slice, returning a new array or writing it into the
+        destination buffer if that's not None. If the server rejects the
+        request as too large, it's split in two along the first dimension
+        and the connection's request planner lowers its limits so that
+        later requests are split in advance. If the smaller requests fail
+        too, the original error is raised.
+        """
+        planner = self.connection.planner
+        try:
+            if destination is None:
+                return self.connection.request_slice(self.file_path, self.name, slice_descriptor)
+            self.connection.request_slice_into(self.file_path, self.name, slice_descriptor, destination)
+            return destination
+        except (HDFStreamRequestError, HTTPError) as e:
+            pieces = su.split_descriptor(slice_descriptor)
+            if pieces is None or not planner.is_limit_error(e):
+                raise
+            error = e
+        nr_slices, nr_rows = su.descriptor_count(slice_descriptor)
+        try:
+            if destination is None:
+                data = np.concatenate([self._request_slice(descriptor) for n, descriptor in pieces])
+            else:
+                rows = destination.reshape(nr_rows, -1)
+                offset = 0
+                for n, descriptor in pieces:
+                    self._request_slice(descriptor, rows[offset:offset+n,...])
+                    offset += n
+                data = destination
+        except (HDFStreamRequestError, HTTPError):
+            raise error
+        nbytes = None
+        if not self.dtype.hasobject:
+            nbytes = nr_rows * int(np.prod([c for s, c in slice_descriptor[1:]])) * self.dtype.itemsize
+        planner.request_too_large(nr_slices, nbytes)
+        return data
+
+    def _rows_per_block(self, cache):
+        """
+        Return the number of elements in the first dimension in each block
+        stored in the block cache
+        """
+        row_size = int(np.prod(self.shape[1:], dtype=int)) * self.dtype.itemsize
+        return cache.rows_per_block(row_size)
+
+    def _use_block_cache(self, starts, counts):
+        """
+        Return True if a read of the ranges given by starts and counts in the
+        first dimension should be served from the block cache. Ranges must
+        be in ascending order and must not overlap.
+        """
+        cache = block_cache.get_block_cache()
+        if (not cache.enabled or self.last_modified is None or self.ndim == 0 or
+            self.dtype.hasobject):
+            return False
+        starts = np.asarray(starts, dtype=int)
+        counts = np.asarray(counts, dtype=int)
+        starts, counts = starts[counts > 0], counts[counts > 0]
+        if len(starts) == 0:
+            return False
+
+        # Count the blocks we need. Consecutive ranges may share a block.
+        rows_per_block = self._rows_per_block(cache)
+        first_block = starts // rows_per_block
+        last_block = (starts + counts - 1) // rows_per_block
+        nr_blocks = np.sum(last_block - first_block + 1) - np.sum(first_block[1:] == last_block[:-1])
+
+        # Don't use the cache if the blocks would not all fit
+        row_size = int(np.prod(self.shape[1:], dtype=int)) * self.dtype.itemsize
+        return nr_blocks * rows_per_block * row_size <= cache.max_bytes
+
+    def _read_cached(self, starts, counts, rest, destination):
+        """
+        Read the ranges given by starts and counts in the first dimension
+        into the destination buffer using the block cache. Any blocks which
+        are not cached are requested from the server. The list rest contains
+        a [start, count] pair for each subsequent dimension. Ranges must be
+        in ascending order and must not overlap.
+        """
+        cache = block_cache.get_block_cache()
+        rows_per_block = self._rows_per_block(cache)
+        row_shape = tuple(self.shape[1:])
+        key_prefix = (self.connection.server, self.file_path, self.name, self.last_modified)
+
+        # Find the index in the first dimension of every element to read
+        starts = np.asarray(starts, dtype=int)
+        counts = np.asarray(counts, dtype=int)
+        offsets = np.cumsum(counts) - counts
+        rows = np.arange(np.sum(counts), dtype=int) + np.repeat(starts - offsets, counts)
+        block_index = rows // rows_per_block
+        local_index = rows - block_index * rows_per_block
+
+        # Split the output into runs of elements which come from the same block
+        bounds = np.concatenate(([0], np.flatnonzero(block_index[1:] != block_index[:-1]) + 1, [len(rows)]))
+        needed = [int(block_index[i]) for i in bounds[:-1]]
+
+        # Look up blocks in the cache
+        blocks = {}
+        missing = []
+        for index in needed:
+            block = cache.get(key_prefix + (index,))
+            if block is None:
+                missing.append(index)
+            else:
+                blocks[index] = block
+
+        # Request any missing blocks, merging consecutive blocks into single ranges
+        if len(missing) > 0:
+            missing = np.asarray(missing, dtype=int)
+            miss_starts, miss_counts = su.merge_slices(missing, np.ones(len(missing), dtype=int))
+            max_nr_slices, max_rows = self._request_limits(row_shape)
+            max_blocks = None
+            if max_rows is not None:
+                # Limit the number of blocks per request, splitting long runs of blocks
+                max_blocks = max(1, max_rows // rows_per_block)
+                pieces = [np.arange(0, c, max_blocks) for c in miss_counts]
+                miss_starts = np.repeat(miss_starts, [len(p) for p in pieces]) + np.concatenate(pieces)
+                miss_counts = np.minimum(np.concatenate([c - p for c, p in zip(miss_counts, pieces)]), max_blocks)
+            requests = []
+            for i1, i2, nr_blocks in su.group_slices(miss_counts, max_nr_slices, max_blocks):
+                range_starts = miss_starts[i1:i2] * rows_per_block
+                range_ends = np.minimum((miss_starts[i1:i2] + miss_counts[i1:i2]) * rows_per_block, self.shape[0])
+                descriptor = [[range_starts, range_ends - range_starts]] + [[0, int(n)] for n in row_shape]
+                buffer = np.ndarray((int(np.sum(range_ends - range_starts)),) + row_shape, dtype=self.dtype)
+                requests.append((descriptor, buffer))
+            self._request_slices_into(requests)
+
+            # Store the new blocks. Copy them so that each block owns its memory.
+            received = iter(missing)
+            for descriptor, buffer in requests:
+                for offset in range(0, buffer.shape[0], rows_per_block):
+                    block = buffer[offset:offset+rows_per_block,...]
+                    if block.shape[0] < buffer.shape[0]:
+                        block = block.copy()
+                    index = next(received)
+                    cache.put(key_prefix + (index,), block)
+                    blocks[index] = block
+
+        # Copy the requested elements into the destination
+        rest_key = tuple(slice(s, s+c) for s, c in rest)
+        output = destination.reshape((len(rows),) + tuple(c for s, c in rest))
+        for i1, i2, index in zip(bounds[:-1], bounds[1:], needed):
+            j1 = local_index[i1]
+            j2 = local_index[i2-1] + 1
+            if j2 - j1 == i2 - i1:
+                # Elements are contiguous in the block
+                output[i1:i2,...] = blocks[index][(slice(j1, j2),) + rest_key]
+            else:
+                output[i1:i2,...] = blocks[index][(local_index[i1:i2],) + rest_key]
+
     def __repr__(self):
         return f'<Remote HDF5 dataset "{self.name}" shape {self.shape}, type "{self.dtype.str}">'
 
@@ -116,16 +385,45 @@ class RemoteDataset:
         :param dest_sel: selection in the output array as a numpy slice, defaults to None
         :type dest_sel: slice or list of slices, optional
         """
+        nd_slice, dest_view = self._direct_selection(array, source_sel, dest_sel)
+
+        # Get (offset, length) pairs describing the slice to read
+        slice_descriptor = nd_slice.to_list()
+
+        # Check if we can get the data from the block cache
+        use_cache = self._use_block_cache(nd_slice.start[:1], nd_slice.count[:1])
+
+        if array.dtype == self.dtype:
+            # The data types match, so we can download directly into the destination buffer
+            if use_cache:
+                self._read_cached(nd_slice.start[:1], nd_slice.count[:1], slice_descriptor[1:], dest_view)
+            else:
+                self._request_slice_into(nd_slice, dest_view)
+        else:
+            # The data types are different, so we have to make a copy and let numpy convert the values
+            if not np.can_cast(self.dtype, array.dtype, casting='safe'):
+                raise RuntimeError("Cannot safely cast {self.dtype} to {array.dtype}")
+            if use_cache:
+                data = np.ndarray(nd_slice.result_shape(), dtype=self.dtype)
+                self._read_cached(nd_slice.start[:1], nd_slice.count[:1], slice_descriptor[1:], data)
+                dest_view[...] = data
+            else:
+                data = self._request_slice(slice_descriptor)
+                dest_view[...] = data.reshape(nd_slice.result_shape())
+
+    def _direct_selection(self, array, source_sel, dest_sel):
+        """
+        Parse the source selection for read_direct() and return it with a
+        view of the destination selection, making sure the view is not a copy
+        """
         if source_sel is None:
             source_sel = Ellipsis
         if dest_sel is None:
             dest_sel = Ellipsis
 
         # Parse the source selection into a tuple of slice objects
-        nd_slice = su.NormalizedSlice(self.shape, source_sel)
-
-        # Get (offset, length) pairs describing the slice to read
-        slice_descriptor = nd_slice.to_list()
+        with profiling.stage("parse"):
+            nd_slice = su.NormalizedSlice(self.shape, source_sel)
 
         # Get a view of the destination selection, making sure we do not make a copy
         dest_view = array[dest_sel]
@@ -133,15 +431,7 @@ class RemoteDataset:
             raise RuntimeError("Destination for read_direct() must be C contiguous")
         if not np.shares_memory(dest_view, array):
             raise RuntimeError("Unable to read directly into specified selection")
-
-        if array.dtype == self.dtype:
-            # The data types match, so we can download directly into the destination buffer
-            self.connection.request_slice_into(self.file_path, self.name, slice_descriptor, dest_view)
-        else:
-            # The data types are different, so we have to make a copy and let numpy convert the values
-            if not np.can_cast(self.dtype, array.dtype, casting='safe'):
-                raise RuntimeError("Cannot safely cast {self.dtype} to {array.dtype}")
-            dest_view[...] = self.connection.request_slice(self.file_path, self.name, slice_descriptor)
+        return nd_slice, dest_view
 
     def __len__(self):
         if len(self.shape) >= 1:
@@ -177,36 +467,63 @@ class RemoteDataset:
         :type dest: np.ndarray, optional
         :rtype: np.ndarray or None
         """
-        # Parse the list of slices
-        nd_slices = []
-        for s in slices:
-            nd_slices.append(su.NormalizedSlice(self.shape, s))
+        slice_descriptor, result_shape = self._parse_slices(slices)
 
-        # Make a descriptor to fetch the combined slices in one request
-        multislice = su.MultiSlice(nd_slices)
-        slice_descriptor = multislice.to_list()
-        result_shape = multislice.result_shape()
+        # Check if we can get the data from the block cache
+        starts, counts = slice_descriptor[0]
+        if self._use_block_cache(starts, counts):
+            if dest is None:
+                data = np.ndarray(result_shape, dtype=self.dtype)
+                self._read_cached(starts, counts, slice_descriptor[1:], data)
+                return data
+            elif dest.flags['C_CONTIGUOUS']:
+                self._read_cached(starts, counts, slice_descriptor[1:], dest)
+                return
 
         if dest is None:
             # Make the request and return a new array
-            data = self.connection.request_slice(self.file_path, self.name, slice_descriptor)
+            data = self._request_slice(slice_descriptor)
             # Remove dimensions where the index was a scalar
             return data.reshape(result_shape)
         else:
             # Download the data into the supplied destination array's buffer
-            self.connection.request_slice_into(self.file_path, self.name, slice_descriptor, dest)
+            self._request_slice(slice_descriptor, dest)
 
-    def _copy_self(self, dest, name, shallow=False, expand_soft=False, recursive=True):
+    def _parse_slices(self, slices):
+        """
+        Return a descriptor which reads the slices passed to request_slices()
+        in one request, and the shape of the result
+        """
+        with profiling.stage("parse"):
+            nd_slices = []
+            for s in slices:
+                nd_slices.append(su.NormalizedSlice(self.shape, s))
+
+            # Make a descriptor to fetch the combined slices in one request
+            multislice = su.MultiSlice(nd_slices)
+            return multislice.to_list(), multislice.result_shape()
+
+    def _copy_self(self, dest, name, shallow=False, expand_soft=False, recursive=True,
+                   block_size=copy_block_size_default, prefetch=False, pipeline=None, **kwargs):
         """
         Copy this dataset to a new HDF5 dataset in the specified h5py file or
         group. The parameters shallow, expand_soft and recursive are not used
         here but are present so that this method has the same signature as
         RemoteGroup._copy_self().
-        """
-        # Copy the dataset data. TODO: download large datasets in chunks
-        dest[name] = self[...]
 
-        # Copy any attributes on the dataset
-        dataset = dest[name]
-        for attr_name, attr_val in self.attrs.items():
-            dataset.attrs[attr_name] = attr_val
+        Fixed size data are copied in blocks of about block_size bytes along
+        the first dimension, so the whole dataset is never held in memory.
+        If prefetch is True the next block is downloaded while the current
+        block is written. Any other keyword arguments are passed to h5py's
+        create_dataset() (e.g. chunks, compression).
+
+        If a CopyPipeline is supplied, the dataset is added to it and its
+        contents are copied when the pipeline is run. Otherwise the copy
+        happens immediately.
+        """
+        if pipeline is None:
+            pipeline = CopyPipeline(block_size=block_size, prefetch=prefetch)
+            pipeline.add_dataset(self, dest, name, **kwargs)
+            pipeline.run()
+        else:
+            pipeline.add_dataset(self, dest, name, **kwargs)
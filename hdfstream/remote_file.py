@@ -2,6 +2,7 @@
 
 import collections.abc
 from hdfstream.remote_group import RemoteGroup
+from hdfstream.download import download_file
 from hdfstream.defaults import *
 from hdfstream.exceptions import *
 
@@ -74,7 +75,8 @@ class RemoteFile(collections.abc.Mapping):
                 raise HDFStreamRequestError("Cannot open non-HDF5 file as HDF5!")
             self._root = RemoteGroup(self.connection, self.file_path, name="/",
                                      max_depth=self.max_depth,
-                                     data_size_limit=self.data_size_limit)
+                                     data_size_limit=self.data_size_limit,
+                                     last_modified=self.last_modified)
         return self._root
 
     def open(self, mode='r'):
@@ -89,6 +91,29 @@ class RemoteFile(collections.abc.Mapping):
         """
         return self.connection.open_file(self.file_path, mode=mode)
 
+    def download(self, local_path, workers=1, chunk_size=download_chunk_size_default, resume=True):
+        """
+        Download the complete file to local_path. The file is fetched in
+        chunks using http range requests, with up to workers chunks
+        downloaded at once. Completed chunks are recorded in a file
+        called local_path+".hdfstream-download" so that an interrupted
+        download can be resumed by calling this method again. The size of
+        the local file is checked against the size reported by the server.
+
+        :param local_path: name of the local file to write
+        :type local_path: str
+        :param workers: number of chunks to download at once
+        :type workers: int
+        :param chunk_size: size in bytes of each range request
+        :type chunk_size: int
+        :param resume: whether to continue a previous, interrupted download
+        :type resume: bool
+        """
+        self._load()
+        download_file(self.connection, self.file_path, local_path, self.size,
+                      last_modified=self.last_modified, chunk_size=chunk_size,
+                      workers=workers, resume=resume)
+
     def __getitem__(self, key):
         return self.root.__getitem__(key)
 
@@ -103,6 +128,19 @@ class RemoteFile(collections.abc.Mapping):
         """
         return self.root.get(key, getlink)
 
+    def prefetch(self, paths, max_workers=8):
+        """
+        Load the metadata for a list of HDF5 objects in this file using
+        as few round trips to the server as possible. See
+        :py:meth:`hdfstream.RemoteGroup.prefetch`.
+
+        :param paths: paths of the objects to load
+        :type paths: list of str
+        :param max_workers: maximum number of concurrent requests
+        :type max_workers: int, optional
+        """
+        self.root.prefetch(paths, max_workers)
+
     def __len__(self):
         return self.root.__len__()
 
@@ -184,10 +222,14 @@ class RemoteFile(collections.abc.Mapping):
         """
         pass
 
-    def copy(self, source, dest, name=None, shallow=False, expand_soft=False):
+    def copy(self, source, dest, name=None, shallow=False, expand_soft=False, **kwargs):
         """
         Copy a RemoteGroup or RemoteDataset object to a writable h5py.File or
-        h5py.Group.
+        h5py.Group. Any additional keyword arguments are passed to
+        :py:meth:`hdfstream.RemoteGroup.copy`.
+
+        Returns a CopyReport with the size of each dataset copied and the
+        time taken.
 
         :param source: the object or path to copy
         :type source: RemoteGroup, RemoteDataset or str
@@ -200,7 +242,7 @@ class RemoteFile(collections.abc.Mapping):
         :param expand_soft: follow soft links and copy linked objects
         :type expand_soft: bool
         """
-        self.root.copy(source, dest, name, shallow, expand_soft)
+        return self.root.copy(source, dest, name, shallow, expand_soft, **kwargs)
 
     @property
     def filename(self):
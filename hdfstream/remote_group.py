@@ -5,7 +5,8 @@ import collections.abc
 from hdfstream.remote_dataset import RemoteDataset
 from hdfstream.defaults import *
 from hdfstream.remote_links import HardLink, SoftLink
-import h5py
+from hdfstream.copy_pipeline import CopyPipeline
+import hdfstream.parallel as parallel
 
 
 def _unpack_object(connection, file_path, name, data, max_depth, data_size_limit, parent):
@@ -67,9 +68,12 @@ class RemoteGroup(collections.abc.Mapping):
     :type data: dict, optional
     :param parent: parent HDF5 group, defaults to None
     :type parent: hdfstream.RemoteGroup, optional
+    :param last_modified: modification time of the file, defaults to the parent's
+    :type last_modified: int, optional
     """
     def __init__(self, connection, file_path, name, max_depth=max_depth_default,
-                 data_size_limit=data_size_limit_default, data=None, parent=None):
+                 data_size_limit=data_size_limit_default, data=None, parent=None,
+                 last_modified=None):
 
         self.connection = connection
         self.file_path = file_path
@@ -78,6 +82,9 @@ class RemoteGroup(collections.abc.Mapping):
         self.data_size_limit = data_size_limit
         self.unpacked = False
         self._parent = parent
+        if last_modified is None and parent is not None:
+            last_modified = parent.last_modified
+        self.last_modified = last_modified
 
         # Keep a link to the root group
         if name == "/":
@@ -95,7 +102,8 @@ class RemoteGroup(collections.abc.Mapping):
         Request the msgpack representation of this group from the server
         """
         if not self.unpacked:
-            data = self.connection.request_object(self.file_path, self.name, self.data_size_limit, self.max_depth)
+            data = self.connection.request_object(self.file_path, self.name, self.data_size_limit, self.max_depth,
+                                                  self.last_modified)
             self._unpack(data)
 
     def _unpack(self, data):
@@ -112,9 +120,7 @@ class RemoteGroup(collections.abc.Mapping):
 
         # Create a lazy dict to request member groups or datasets on access if we didn't already download them
         def load_member(member_name):
-            member_path = (self.name + member_name) if (self.name=="/") else (self.name + "/" + member_name)
-            member_data = self.connection.request_object(self.file_path, member_path, self.data_size_limit, self.max_depth)
-            return _unpack_object(self.connection, self.file_path, member_path, member_data, self.max_depth, self.data_size_limit, self)
+            return self._unpack_member(member_name, self._request_member(member_name))
         self._member_dict = _LazyDict(load_member)
 
         # Unpack any sub-objects which we have already downloaded
@@ -133,6 +139,23 @@ class RemoteGroup(collections.abc.Mapping):
 
         self.unpacked = True
 
+    def _member_path(self, member_name):
+        return (self.name + member_name) if (self.name=="/") else (self.name + "/" + member_name)
+
+    def _request_member(self, member_name):
+        """
+        Request the msgpack representation of a member of this group
+        """
+        return self.connection.request_object(self.file_path, self._member_path(member_name),
+                                              self.data_size_limit, self.max_depth, self.last_modified)
+
+    def _unpack_member(self, member_name, member_data):
+        """
+        Construct the object for a member of this group from its msgpack representation
+        """
+        return _unpack_object(self.connection, self.file_path, self._member_path(member_name),
+                              member_data, self.max_depth, self.data_size_limit, self)
+
     @property
     def attrs(self):
         """
@@ -236,6 +259,89 @@ class RemoteGroup(collections.abc.Mapping):
     def __getitem__(self, key):
         return self.get(key)
 
+    def _next_unloaded(self, key):
+        """
+        Follow a path through objects which have already been loaded.
+        Returns (group, None) if we reach a group which has not been
+        loaded, (group, member_name) if we reach a member which has not
+        been loaded, or None if every object on the path is loaded.
+        """
+        key = Path(key)
+        group = self._root if key.is_absolute() else self
+        parts = list(key.parts[1:] if key.is_absolute() else key.parts)
+        while True:
+            if not group.unpacked:
+                return (group, None)
+            if len(parts) == 0:
+                return None
+            member_name = parts.pop(0)
+            if member_name == ".":
+                continue
+            elif member_name == "..":
+                group = group.parent
+                continue
+            if member_name not in group._member_dict:
+                raise KeyError(f"Object {member_name} not found")
+            # Look up the member without triggering lazy loading
+            member_object = dict.__getitem__(group._member_dict, member_name)
+            if member_object is None:
+                return (group, member_name)
+            if isinstance(member_object, SoftLink):
+                # Continue from the link target
+                target = Path(member_object.path)
+                if target.is_absolute():
+                    group = group._root
+                    parts = list(target.parts[1:]) + parts
+                else:
+                    parts = list(target.parts) + parts
+            elif len(parts) > 0:
+                if not isinstance(member_object, RemoteGroup):
+                    raise KeyError(f"Path component {member_name} is not a group")
+                group = member_object
+
+    def prefetch(self, paths, max_workers=8):
+        """
+        Load the metadata for a list of HDF5 objects, so that accessing
+        them later does not need any more requests. Paths may be absolute
+        or relative to this group. Example usage::
+
+          snap.prefetch(["PartType0/Coordinates", "PartType0/Masses",
+                         "PartType1/Velocities"])
+
+        Objects are requested one level of the HDF5 tree at a time. All
+        objects needed at each level are requested concurrently, with up
+        to max_workers requests in progress at once. Objects which are
+        already loaded are not requested again.
+
+        :param paths: paths of the objects to load
+        :type paths: list of str
+        :param max_workers: maximum number of concurrent requests
+        :type max_workers: int, optional
+        """
+        paths = [Path(path) for path in paths]
+        def request(group, member_name):
+            if member_name is None:
+                return self.connection.request_object(group.file_path, group.name, group.data_size_limit,
+                                                      group.max_depth, group.last_modified)
+            return group._request_member(member_name)
+        while True:
+            # Find the objects which need to be loaded next, without duplicates
+            needed = {}
+            for path in paths:
+                item = self._next_unloaded(path)
+                if item is not None:
+                    needed[(id(item[0]), item[1])] = item
+            if len(needed) == 0:
+                break
+            # Request them concurrently, then store the results from this thread
+            needed = list(needed.values())
+            results = parallel.run_requests(request, needed, max_workers)
+            for (group, member_name), data in zip(needed, results):
+                if member_name is None:
+                    group._unpack(data)
+                else:
+                    group._member_dict[member_name] = group._unpack_member(member_name, data)
+
     def __len__(self):
         return len(self._members)
 
@@ -347,10 +453,11 @@ class RemoteGroup(collections.abc.Mapping):
         pass
 
     def _copy_self(self, dest, name, shallow=False, expand_soft=False,
-                   recursive=True):
+                   recursive=True, **kwargs):
         """
         Copy this group to a local HDF5 file opened with h5py in writable
-        mode. This is used to implement the .copy() method.
+        mode. This is used to implement the .copy() method. Any keyword
+        arguments are passed to RemoteDataset._copy_self().
         """
         # Create the new group
         output_group = dest.create_group(name)
@@ -368,19 +475,34 @@ class RemoteGroup(collections.abc.Mapping):
             if isinstance(link, SoftLink) and expand_soft==False:
                 # This is a soft link and we're not following links. Make the
                 # same link in the output.
+                import h5py
                 output_group[member_name] = h5py.SoftLink(link.path)
             else:
                 # This is a group or a dataset, so copy it. If shallow=True then
                 # we should create the group and any attributes but not copy members.
                 self[member_name]._copy_self(output_group, member_name,
                                              shallow=shallow, expand_soft=expand_soft,
-                                             recursive=(not shallow))
+                                             recursive=(not shallow), **kwargs)
 
-    def copy(self, source, dest, name=None, shallow=False, expand_soft=False):
+    def copy(self, source, dest, name=None, shallow=False, expand_soft=False,
+             block_size=copy_block_size_default, prefetch=False, max_workers=1, **kwargs):
         """
         Copy a RemoteGroup or RemoteDataset object to a writable h5py.File or
         h5py.Group.
 
+        Datasets are downloaded and written in blocks of about block_size
+        bytes, so large datasets can be copied without reading them into
+        memory. Any additional keyword arguments (e.g. chunks, compression,
+        compression_opts) are passed to h5py's create_dataset() when
+        creating the output datasets.
+
+        If max_workers > 1, blocks from any of the datasets being copied are
+        downloaded concurrently by up to max_workers threads. All writes to
+        the output file are made from the calling thread.
+
+        Returns a CopyReport with the size of each dataset copied and the
+        time taken.
+
         :param source: the object or path to copy
         :type source: RemoteGroup, RemoteDataset or str
         :param dest: a local HDF5 file or group to copy the object to
@@ -391,6 +513,14 @@ class RemoteGroup(collections.abc.Mapping):
         :type shallow: bool
         :param expand_soft: follow soft links and copy linked objects
         :type expand_soft: bool
+        :param block_size: size in bytes of the blocks used to copy datasets
+        :type block_size: int, optional
+        :param prefetch: download the next block while writing the current one
+        :type prefetch: bool, optional
+        :param max_workers: number of threads used to download dataset contents
+        :type max_workers: int, optional
+
+        :rtype: hdfstream.CopyReport
         """
         # Locate the source object if we were given a path
         if isinstance(source, str):
@@ -400,5 +530,8 @@ class RemoteGroup(collections.abc.Mapping):
         if name is None:
             name = source.name.split("/")[-1]
 
-        # Copy the object
-        source._copy_self(dest, name, shallow=shallow, expand_soft=expand_soft)
+        # Create the output groups and datasets, then copy the dataset contents
+        pipeline = CopyPipeline(block_size=block_size, max_workers=max_workers, prefetch=prefetch)
+        source._copy_self(dest, name, shallow=shallow, expand_soft=expand_soft,
+                          pipeline=pipeline, **kwargs)
+        return pipeline.run()
@@ -0,0 +1,148 @@
+#!/bin/env python
+
+import re
+import threading
+
+from hdfstream.retry import error_status
+from hdfstream.exceptions import HDFStreamRequestError
+
+_adaptive = True
+def set_adaptive_requests(enable):
+    """
+    Enable or disable adaptive sizing of dataset slice requests. When
+    enabled and several requests may run concurrently (see
+    :py:func:`hdfstream.set_max_workers`), large reads are split into
+    requests sized according to the latency and throughput observed on
+    the connection. Limits learned from requests rejected by the server
+    are always applied.
+
+    :param enable: whether to size requests adaptively
+    :type enable: bool
+    """
+    global _adaptive
+    _adaptive = bool(enable)
+
+
+class RequestPlanner:
+    """
+    Decides how to split dataset slice reads into requests. There is one
+    planner per connection. It keeps track of:
+
+    * the latency and throughput of recent slice requests, which are used
+      to choose a request size large enough that the time spent waiting
+      for each response is a small fraction of the total, and
+    * any limits on the number of slices per request or the size of the
+      response which have been learned from requests the server rejected.
+
+    :ivar max_nr_slices: learned maximum number of slices per request, or None
+    :vartype max_nr_slices: int
+    :ivar max_response_bytes: learned maximum response size in bytes, or None
+    :vartype max_response_bytes: int
+    :ivar latency: average time in seconds until the response headers arrive
+    :vartype latency: float
+    :ivar throughput: average rate in bytes/second at which responses arrive
+    :vartype throughput: float
+    """
+    # Fraction of the time for each request we're prepared to spend waiting for a response
+    overhead = 0.1
+    # Range of request sizes to choose from when sizing requests adaptively
+    min_request_bytes = 1024*1024
+    max_request_bytes = 256*1024*1024
+    # Responses smaller than this are not used to estimate throughput
+    min_sample_bytes = 64*1024
+    # Weight given to each new observation in the running averages
+    smoothing = 0.2
+    # Http status which means that a request was too large
+    limit_status = 413
+    # A 400 response is only taken to mean the request was too large if the
+    # server's error message matches this
+    limit_message = re.compile(r"too (large|long|big|many)|(size|length|slice) limit", re.IGNORECASE)
+
+    def __init__(self):
+        self.max_nr_slices = None
+        self.max_response_bytes = None
+        self.latency = None
+        self.throughput = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f'<Request planner: latency={self.latency} throughput={self.throughput} '
+                f'max_nr_slices={self.max_nr_slices} max_response_bytes={self.max_response_bytes}>')
+
+    def _average(self, old, new):
+        return new if old is None else old + self.smoothing*(new - old)
+
+    def observe(self, record):
+        """
+        Update the latency and throughput estimates using the
+        :py:class:`hdfstream.RequestRecord` for a completed request
+        """
+        if record.error is not None or record.ttfb is None or record.elapsed is None:
+            return
+        with self._lock:
+            self.latency = self._average(self.latency, record.ttfb)
+            nbytes = record.response_bytes
+            transfer_time = record.elapsed - record.ttfb
+            if nbytes is not None and nbytes >= self.min_sample_bytes and transfer_time > 0:
+                self.throughput = self._average(self.throughput, nbytes / transfer_time)
+
+    def target_bytes(self, max_workers):
+        """
+        Return the response size in bytes to aim for when splitting a read
+        into several requests, or None if reads should not be split. Reads
+        are only split to improve performance if the requests can run
+        concurrently and we have measurements for this connection.
+        """
+        if not _adaptive or max_workers <= 1 or self.latency is None or self.throughput is None:
+            return None
+        target = self.throughput * self.latency * (1.0 - self.overhead) / self.overhead
+        return int(min(self.max_request_bytes, max(self.min_request_bytes, target)))
+
+    def limits(self, max_nr_slices, row_bytes, split_size=None, max_workers=1):
+        """
+        Return the maximum number of slices and the maximum number of
+        elements in the first dimension to include in one request, given
+        the limit on the number of slices set for the dataset, the size in
+        bytes of each element in the first dimension and the dataset's
+        split size. The maximum number of elements is None if there is no
+        limit.
+        """
+        if self.max_nr_slices is not None:
+            max_nr_slices = min(max_nr_slices, self.max_nr_slices)
+        if row_bytes is None:
+            return max_nr_slices, None
+        limits = [split_size, self.max_response_bytes, self.target_bytes(max_workers)]
+        limits = [int(limit) for limit in limits if limit is not None]
+        if len(limits) == 0:
+            return max_nr_slices, None
+        return max_nr_slices, max(1, min(limits) // max(1, row_bytes))
+
+    def is_limit_error(self, error):
+        """
+        Return True if error means that the request was too large: either
+        the server returned status 413 or it returned status 400 with a
+        message about the size of the request
+        """
+        status, retry_after = error_status(error)
+        if status == self.limit_status:
+            return True
+        if status == 400 and isinstance(error, HDFStreamRequestError):
+            return self.limit_message.search(str(error)) is not None
+        return False
+
+    def request_too_large(self, nr_slices, nbytes):
+        """
+        Called when a request for nr_slices slices returning nbytes bytes
+        was rejected but succeeded when split in two. Lowers the limit on
+        the number of slices, or on the response size if there was only
+        one slice.
+        """
+        with self._lock:
+            if nr_slices > 1:
+                limit = (nr_slices + 1) // 2
+                if self.max_nr_slices is None or limit < self.max_nr_slices:
+                    self.max_nr_slices = limit
+            elif nbytes is not None and nbytes > 1:
+                limit = (nbytes + 1) // 2
+                if self.max_response_bytes is None or limit < self.max_response_bytes:
+                    self.max_response_bytes = limit
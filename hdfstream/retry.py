@@ -0,0 +1,143 @@
+#!/bin/env python
+
+import time
+import random
+import email.utils
+
+import requests
+import urllib3.exceptions
+
+from hdfstream.exceptions import HDFStreamRequestError
+
+
+def parse_retry_after(value):
+    """
+    Convert the value of a Retry-After header to a time in seconds. The
+    header may contain a number of seconds or a http date. Returns None if
+    the value can't be interpreted.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def error_status(error):
+    """
+    Return the http status code and Retry-After header value associated
+    with an exception raised by a request, if there are any
+    """
+    if isinstance(error, HDFStreamRequestError):
+        return error.status_code, error.retry_after
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code, error.response.headers.get("Retry-After")
+    return None, None
+
+
+class RetryPolicy:
+    """
+    Determines which failed requests are retried and how long to wait
+    before each attempt. Requests are retried if the server returns one of
+    the http status codes in retry_statuses or if the connection fails.
+
+    The delay before retry n (starting from zero) is backoff*2**n seconds,
+    up to max_backoff, with a random variation of up to jitter times the
+    delay. If the server sends a Retry-After header we wait at least that
+    long, or give up if it's longer than max_backoff.
+
+    :param max_attempts: maximum number of times to try each request
+    :type max_attempts: int
+    :param backoff: delay in seconds before the first retry
+    :type backoff: float
+    :param max_backoff: maximum delay in seconds between attempts
+    :type max_backoff: float
+    :param jitter: fractional random variation in the delay
+    :type jitter: float
+    :param retry_statuses: http status codes which should be retried
+    :type retry_statuses: tuple of int
+    """
+    retry_exceptions = (requests.ConnectionError, requests.Timeout,
+                        requests.exceptions.ChunkedEncodingError,
+                        urllib3.exceptions.HTTPError)
+
+    def __init__(self, max_attempts=5, backoff=0.5, max_backoff=60.0, jitter=0.5,
+                 retry_statuses=(429, 500, 502, 503, 504)):
+        if int(max_attempts) < 1:
+            raise ValueError("Number of attempts must be at least one")
+        if not (0.0 <= jitter <= 1.0):
+            raise ValueError("Jitter must be in the range 0 to 1")
+        self.max_attempts = int(max_attempts)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.jitter = float(jitter)
+        self.retry_statuses = tuple(retry_statuses)
+
+    def __repr__(self):
+        return (f'<Retry policy: max_attempts={self.max_attempts}, backoff={self.backoff}, '
+                f'max_backoff={self.max_backoff}, jitter={self.jitter}>')
+
+    def retry_reason(self, error):
+        """
+        Return the http status code or exception name to record if the
+        error should be retried, or None if it should not be retried
+        """
+        status_code, retry_after = error_status(error)
+        if status_code is not None:
+            return status_code if status_code in self.retry_statuses else None
+        if isinstance(error, self.retry_exceptions):
+            return type(error).__name__
+        return None
+
+    def delay(self, attempt, error):
+        """
+        Return the time in seconds to wait before retrying a request which
+        raised error on the specified attempt (counting from zero), or None
+        if the request should not be retried.
+
+        :param attempt: number of attempts which have failed, minus one
+        :type attempt: int
+        :param error: the exception raised by the failed attempt
+        :type error: Exception
+
+        :rtype: float or None
+        """
+        if attempt + 1 >= self.max_attempts or self.retry_reason(error) is None:
+            return None
+        delay = min(self.max_backoff, self.backoff*2**attempt)
+        delay *= 1.0 + self.jitter*(2.0*random.random() - 1.0)
+        retry_after = parse_retry_after(error_status(error)[1])
+        if retry_after is not None:
+            if retry_after > self.max_backoff:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+# Policy used by connections which don't have their own
+_retry_policy = RetryPolicy()
+def set_retry_policy(policy):
+    """
+    Set the default policy for retrying failed requests. Passing None
+    disables retries.
+
+    :param policy: the policy to use
+    :type policy: hdfstream.RetryPolicy or None
+    """
+    global _retry_policy
+    _retry_policy = policy if policy is not None else RetryPolicy(max_attempts=1)
+
+
+def get_retry_policy():
+    """
+    Return the default policy for retrying failed requests
+
+    :rtype: hdfstream.RetryPolicy
+    """
+    return _retry_policy
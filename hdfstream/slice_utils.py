@@ -15,20 +15,19 @@ def convert_list_to_array(index, size):
     # Handle the zero length case first
     if len(index) == 0:
         return np.zeros(0, dtype=int)
-    # Then check if we have integers or booleans
+    # Find the set of element types in one pass over the list. The type of
+    # the first element determines how the list is interpreted. Since bool
+    # is a subclass of int, booleans after an integer are treated as 0 or 1.
+    types = set(map(type, index))
     if isinstance(index[0], bool):
         # Check that all elements are booleans
-        for ind in index:
-            if not isinstance(ind, bool):
-                raise IndexError("Indexes in a list must all be the same type")
-        # Return the array
+        if len(types) > 1:
+            raise IndexError("Indexes in a list must all be the same type")
         return np.asarray(index, dtype=bool)
     elif is_integer(index[0]):
         # Check that all elements are integers
-        for ind in index:
-            if not is_integer(ind):
-                raise IndexError("Indexes in a list must all be the same type")
-        # Return the array
+        if not all(issubclass(t, (int, np.integer)) for t in types):
+            raise IndexError("Indexes in a list must all be the same type")
         return np.asarray(index, dtype=int)
     else:
         raise IndexError("Lists of indexes must contain booleans or integers")
@@ -45,21 +44,68 @@ def ensure_integer_index_array(index, size):
     elif np.issubdtype(index.dtype, np.bool_):
         if index.shape[0] != size:
             raise IndexError("Boolean index array is the wrong size!")
-        return np.arange(size, dtype=int)[index] # convert bools to integers
+        return np.flatnonzero(index) # convert bools to integers
     else:
         raise IndexError("Index arrays must be of integer or boolean type")
 
 
-def merge_slices(starts, counts):
+def sort_unique(index):
+    """
+    Return the sorted, unique values in the 1D integer array index and the
+    inverse index which reconstructs the input from the unique values. The
+    inverse is None if the input is already sorted and unique. This avoids
+    sorting if the input is already sorted.
+
+    :param index: 1D array of integers
+    :type  index: np.ndarray
+
+    :return: (unique values, inverse index or None)
+    :rtype: (numpy.ndarray, numpy.ndarray or None)
+    """
+    if len(index) < 2:
+        return index, None
+    diff = index[1:] > index[:-1]
+    if np.all(diff):
+        # Already strictly increasing
+        return index, None
+    if np.all(index[1:] >= index[:-1]):
+        # Sorted with duplicates, so we only need to remove repeated values
+        order = None
+        sorted_index = index
+    else:
+        # Need to sort
+        order = np.argsort(index)
+        sorted_index = index[order]
+        diff = sorted_index[1:] > sorted_index[:-1]
+    # Flag the first occurrence of each value in the sorted array
+    is_first = np.empty(len(index), dtype=bool)
+    is_first[0] = True
+    is_first[1:] = diff
+    unique_index = sorted_index[is_first]
+    # Find the position in the unique array of each sorted element
+    position = np.cumsum(is_first) - 1
+    if order is None:
+        return unique_index, position
+    inverse_index = np.empty_like(position)
+    inverse_index[order] = position
+    return unique_index, inverse_index
+
+
+def merge_slices(starts, counts, max_gap=0):
     """
     Given a set of slices where slice i starts at index starts[i] and contains
     counts[i] elements, merge any adjacent slices and return new starts and
-    counts arrays.
+    counts arrays. Slices must be sorted and must not overlap.
+
+    If max_gap > 0, slices separated by up to max_gap elements are also
+    merged. The merged slices then include the elements in the gaps.
 
     :param starts: 1D array with starting offset of each slice
     :type  starts: np.ndarray
     :param counts: 1D array with length of each slice
     :type  counts: np.ndarray
+    :param max_gap: maximum number of elements between slices to be merged
+    :type  max_gap: int
 
     :return: new (starts, counts) tuple with the merged slices
     :rtype: (numpy.ndarray, numpy.ndarray)
@@ -78,15 +124,15 @@ def merge_slices(starts, counts):
     if len(ends) != nr_slices:
         raise ValueError("starts and counts arrays must be the same size!")
 
-    # Determine starts to keep: every starting offset which is NOT
-    # equal to the end of the previous slice. Always keep the first.
+    # Determine starts to keep: every starting offset which is more than
+    # max_gap after the end of the previous slice. Always keep the first.
     keep_start = np.ones(nr_slices, dtype=bool)
-    keep_start[1:] = (starts[1:] != ends[:-1])
+    keep_start[1:] = (starts[1:] - ends[:-1] > max_gap)
 
-    # Determine ends to keep: every end offset which is NOT equal
-    # to the start of the next slice. Always keep the last one.
+    # Determine ends to keep: every end offset which is more than max_gap
+    # before the start of the next slice. Always keep the last one.
     keep_end = np.ones(nr_slices, dtype=bool)
-    keep_end[:-1] = (ends[:-1] != starts[1:])
+    keep_end[:-1] = keep_start[1:]
 
     # Discard unwanted elements
     assert len(starts) == len(ends)
@@ -203,6 +249,19 @@ class NormalizedSlice:
         """
         return [[int(s), int(c)] for s, c in zip(self.start, self.count)]
 
+    def split(self, max_count):
+        """
+        Generator which splits this slice along the first dimension into
+        pieces of at most max_count elements. Yields the number of elements
+        in the first dimension and the slice descriptor for each piece.
+        """
+        start = int(self.start[0])
+        count = int(self.count[0])
+        rest = self.to_list()[1:]
+        for offset in range(0, count, max_count):
+            n = min(max_count, count - offset)
+            yield (n, [[start+offset, n],] + rest)
+
 
 class MultiSlice:
     """
@@ -267,12 +326,15 @@ class MultiSlice:
 
 class ArrayIndexedSlice:
 
-    def __init__(self, shape, key):
+    def __init__(self, shape, key, max_gap=0):
         """
         This class handles the case of indexing an array with a list or
         array in the first dimension. We convert the array or list into a
         list of slices to request from the server.
 
+        Slices separated by up to max_gap elements are merged into a single
+        slice, in which case the unwanted elements are discarded by reorder().
+
         We don't allow an array as the index in any other dimension.
         """
 
@@ -295,24 +357,34 @@ class ArrayIndexedSlice:
         # If we now have a boolean mask array, convert to integer indexes
         index = ensure_integer_index_array(index, shape[0])
 
-        # Negative indexes count from the end of the array
-        is_negative = (index < 0)
-        index[is_negative] += shape[0]
+        # Negative indexes count from the end of the array. Make a new
+        # array in this case so that we don't modify the caller's index.
+        if len(index) > 0 and np.amin(index) < 0:
+            index = np.where(index < 0, index + shape[0], index)
 
         # Ensure index elements are sorted and unique, and store the inverse so
         # we can restore the requested ordering in the output array later.
-        self.inverse_index = None
-        if len(index) > 1:
-            if np.any(index[1:] <= index[:-1]):
-                index, self.inverse_index = np.unique(index, return_inverse=True)
+        index, self.inverse_index = sort_unique(index)
 
-        # Bounds check
-        if len(index) > 0 and (np.amin(index) < 0 or np.amax(index) >= shape[0]):
+        # Bounds check: index is sorted at this point
+        if len(index) > 0 and (index[0] < 0 or index[-1] >= shape[0]):
             raise IndexError("Value in index array is out of range")
 
         # Convert to arrays of starts and counts in the first dimension:
         # Treat each index as a one element range then merge adjacent ranges.
-        self.starts, self.counts = merge_slices(index, np.ones(len(index), dtype=int))
+        self.starts, self.counts = merge_slices(index, np.ones(len(index), dtype=int), max_gap)
+
+        # If we merged ranges with gaps between them, find the position of
+        # each requested element in the downloaded data and combine this with
+        # the inverse index so that reorder() only needs one gather.
+        if np.sum(self.counts) > len(index):
+            range_nr = np.searchsorted(self.starts, index, side="right") - 1
+            offsets = np.cumsum(self.counts) - self.counts
+            position = index - self.starts[range_nr] + offsets[range_nr]
+            if self.inverse_index is None:
+                self.inverse_index = position
+            else:
+                self.inverse_index = position[self.inverse_index]
 
         # Interpret indexes in any remaining dimensions as simple slices
         self.nd_slice = NormalizedSlice(shape[1:], key[1:])
@@ -331,20 +403,18 @@ class ArrayIndexedSlice:
 
         return items
 
-    def to_generator(self, max_nr_slices):
+    def to_generator(self, max_nr_slices, max_count=None):
         """
         Generator function which yields parameters for multiple requests.
         This is to split requests which would exceed the server's maximum
-        index array size.
+        index array size. If max_count is not None, requests are also
+        split so that each one returns at most max_count elements in the
+        first dimension, unless a single slice is larger than that.
         """
-        n = len(self.starts)
-        for offset in range(0, n, max_nr_slices):
-            i1 = offset
-            i2 = min(offset + max_nr_slices, n)
-            items = [[self.starts[i1:i2], self.counts[i1:i2]]]
-            for s, c in zip(self.nd_slice.start, self.nd_slice.count):
-                items.append([int(s),int(c)])
-            yield (sum(self.counts[i1:i2]), items)
+        rest = [[int(s),int(c)] for s, c in zip(self.nd_slice.start, self.nd_slice.count)]
+        for i1, i2, count in group_slices(self.counts, max_nr_slices, max_count):
+            items = [[self.starts[i1:i2], self.counts[i1:i2]]] + rest
+            yield (count, items)
 
     def result_shape(self):
         """
@@ -356,17 +426,77 @@ class ArrayIndexedSlice:
 
     def reorder(self, arr):
         """
-        If the index array was not sorted and unique, we may have to reorder
-        the result.
+        If the index array was not sorted and unique, or we downloaded
+        elements which were not requested, we have to reorder the result.
         """
         if self.inverse_index is None:
             return arr
         else:
             return arr[self.inverse_index,...]
 
-def parse_key(shape, key):
+def group_slices(counts, max_nr_slices, max_count=None):
+    """
+    Generator which splits a sequence of slices with the specified counts
+    into groups of consecutive slices to send in one request. Each group
+    has at most max_nr_slices slices and, if max_count is not None, at most
+    max_count elements unless a single slice is larger than that. Yields
+    (i1, i2, count) for each group, where the group consists of slices i1
+    to i2-1 and contains count elements.
+    """
+    n = len(counts)
+    ends = np.cumsum(counts)
+    i1 = 0
+    while i1 < n:
+        i2 = min(i1 + max_nr_slices, n)
+        first = ends[i1-1] if i1 > 0 else 0
+        if max_count is not None:
+            # Find the last slice which keeps the total count within max_count
+            i2 = min(i2, max(i1+1, int(np.searchsorted(ends, first+max_count, side="right"))))
+        yield (i1, i2, int(ends[i2-1] - first))
+        i1 = i2
+
+
+def descriptor_count(slice_descriptor):
+    """
+    Return the number of slices in the first dimension of a slice
+    descriptor and the total number of elements they contain
+    """
+    starts, counts = slice_descriptor[0]
+    if np.ndim(starts) == 0:
+        return 1, int(counts)
+    counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), np.shape(starts))
+    return len(counts), int(np.sum(counts))
+
+
+def split_descriptor(slice_descriptor):
+    """
+    Split a slice descriptor into two requests along the first dimension.
+    Slices are divided between the two halves if there is more than one,
+    otherwise the single slice is split. Returns a list of (count,
+    slice_descriptor) pairs where count is the number of elements in the
+    first dimension, or None if the descriptor can't be split.
+    """
+    if len(slice_descriptor) == 0:
+        return None
+    (starts, counts), rest = slice_descriptor[0], slice_descriptor[1:]
+    nr_slices, total = descriptor_count(slice_descriptor)
+    if nr_slices > 1:
+        counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), np.shape(starts))
+        half = (nr_slices + 1) // 2
+        pieces = [(starts[:half], counts[:half]), (starts[half:], counts[half:])]
+        return [(int(np.sum(c)), [[s, c]] + rest) for s, c in pieces]
+    if total < 2:
+        return None
+    start = int(np.ravel(starts)[0])
+    half = (total + 1) // 2
+    return [(half, [[start, half]] + rest), (total-half, [[start+half, total-half]] + rest)]
+
+
+def parse_key(shape, key, max_gap=0):
     """
-    Interpret key as a NormalizedSlice or ArrayIndexedSlice
+    Interpret key as a NormalizedSlice or ArrayIndexedSlice. Array indexes
+    are converted to slices where slices separated by up to max_gap elements
+    are merged.
     """
     # Wrap the key in a tuple if it isn't already
     if not isinstance(key, tuple):
@@ -374,7 +504,7 @@ def parse_key(shape, key):
 
     if len(key) > 0 and isinstance(key[0], (np.ndarray, list)):
         # Index is a tuple with a list or array as the first element
-        return ArrayIndexedSlice(shape, key)
+        return ArrayIndexedSlice(shape, key, max_gap)
     else:
         # Index is something else
         return NormalizedSlice(shape, key)
@@ -1,23 +1,38 @@
 #!/bin/env python
 
-import numpy as np
-
-# Big endian int types used to interpret msgpack data
-be_uint8  = np.dtype(">u1")
-be_uint16 = np.dtype(">u2")
-be_uint32 = np.dtype(">u4")
-
 
 class StreamingDecoder:
     """
     Class for decoding msgpack encoded ndarrays from a stream
+
+    Bytes which have been peek()'d are kept in a buffer along with the
+    offset of the next unread byte. Reading or skipping bytes just advances
+    the offset, so consumed bytes are never copied again. The unread part
+    of the buffer is only copied when more bytes need to be appended, which
+    only happens in peek().
     """
     def __init__(self, stream):
         """
         Initialize the stream reader
         """
         self._stream = stream
-        self.buf = bytearray() # initially zero length
+        self._buf = bytearray() # initially zero length
+        self._pos = 0 # offset of the next unread byte in self._buf
+
+    def _nr_buffered(self):
+        """
+        Return the number of unread bytes in the buffer
+        """
+        return len(self._buf) - self._pos
+
+    def _consume(self, n):
+        """
+        Advance past n buffered bytes, releasing the buffer if it's empty
+        """
+        self._pos += n
+        if self._pos == len(self._buf):
+            self._buf = bytearray()
+            self._pos = 0
 
     def peek(self, n):
         """
@@ -28,15 +43,22 @@ class StreamingDecoder:
         Returns zero bytes if we are at the end.
         """
 
-        # Ensure we have n bytes buffered (if we don't hit end of stream)
-        while len(self.buf) < n:
-            chunk = self._stream.read(n - len(self.buf))
-            if not chunk:
-                break
-            self.buf.extend(chunk)
+        # Ensure we have n bytes buffered (if we don't hit end of stream).
+        # We make a new buffer rather than resizing the old one because
+        # views of the old buffer returned by previous calls may still
+        # exist. Only the unread bytes are copied.
+        if self._nr_buffered() < n:
+            buf = bytearray(memoryview(self._buf)[self._pos:])
+            while len(buf) < n:
+                chunk = self._stream.read(n - len(buf))
+                if not chunk:
+                    break
+                buf.extend(chunk)
+            self._buf = buf
+            self._pos = 0
 
         # Return a view of up to n bytes from the buffer
-        return memoryview(self.buf)[:n]
+        return memoryview(self._buf)[self._pos:self._pos+n]
 
     def skip(self, n):
         """
@@ -44,11 +66,11 @@ class StreamingDecoder:
 
         This only works if at least n bytes have been peek()'d.
         """
-        if n > len(self.buf):
+        if n > self._nr_buffered():
             raise RuntimeError("Attempting to skip more bytes than were peek()'d")
 
         # Discard n bytes from the start of the buffer
-        self.buf = self.buf[n:]
+        self._consume(n)
 
     def readinto(self, b):
         """
@@ -63,11 +85,10 @@ class StreamingDecoder:
         mv = memoryview(b)
 
         # Copy as much as we can/need from the buffer
-        nr_from_buf = min(len(self.buf), len(mv))
-        mv[:nr_from_buf] = self.buf[:nr_from_buf]
-
-        # Delete copied bytes from the buffer
-        self.buf = self.buf[nr_from_buf:]
+        nr_from_buf = min(self._nr_buffered(), len(mv))
+        if nr_from_buf > 0:
+            mv[:nr_from_buf] = memoryview(self._buf)[self._pos:self._pos+nr_from_buf]
+            self._consume(nr_from_buf)
 
         # If we still need more bytes, read directly into the output buffer
         if nr_from_buf < len(mv):
@@ -77,21 +98,25 @@ class StreamingDecoder:
 
     def read(self, size=-1):
         """Read `size` bytes, consuming buffered data first."""
+        nr_buffered = self._nr_buffered()
+        if nr_buffered == 0:
+            # Nothing buffered, so we can return the stream's bytes as they are
+            return self._stream.read() if size == -1 else self._stream.read(size)
         if size == -1:
             # Read all: return buffer + rest of stream
-            data = bytes(self.buf)
-            self.buf = bytearray()
-            return data + self._stream.read()
+            from_buffer = bytes(memoryview(self._buf)[self._pos:])
+            self._consume(nr_buffered)
+            return b''.join((from_buffer, self._stream.read()))
         else:
             # Read from buffer first
-            from_buffer = self.buf[:size]
-            self.buf = self.buf[size:]
-            remaining = size - len(from_buffer)
+            nr_from_buf = min(nr_buffered, size)
+            from_buffer = bytes(memoryview(self._buf)[self._pos:self._pos+nr_from_buf])
+            self._consume(nr_from_buf)
+            remaining = size - nr_from_buf
             if remaining > 0:
-                from_stream = self._stream.read(remaining)
-                return bytes(from_buffer) + from_stream
+                return b''.join((from_buffer, self._stream.read(remaining)))
             else:
-                return bytes(from_buffer)
+                return from_buffer
 
     def read_bin_header(self):
         """
@@ -100,21 +125,24 @@ class StreamingDecoder:
         """
         # Ensure we have enough bytes buffered ahead. A msgpack_bin header
         # is 2, 3 or 5 bytes long.
-        self.peek(5)
+        header = self.peek(5)
+        if len(header) == 0:
+            raise RuntimeError("Unexpected end of stream reading msgpack_bin header!")
 
         # Determine the size of the bin object
-        if self.buf[0] == 0xc4:
+        if header[0] == 0xc4:
             # One byte length
-            nr_bytes = int(np.void(self.buf[1:2]).view(be_uint8)[0])
-            self.skip(2)
-        elif self.buf[0] == 0xc5:
+            header_size = 2
+        elif header[0] == 0xc5:
             # Two byte length
-            nr_bytes = int(np.void(self.buf[1:3]).view(be_uint16)[0])
-            self.skip(3)
-        elif self.buf[0] == 0xc6:
+            header_size = 3
+        elif header[0] == 0xc6:
             # Four byte length
-            nr_bytes = int(np.void(self.buf[1:5]).view(be_uint32)[0])
-            self.skip(5)
+            header_size = 5
         else:
             raise RuntimeError("Next msgpack object is not a msgpack_bin!")
+        if len(header) < header_size:
+            raise RuntimeError("Unexpected end of stream reading msgpack_bin header!")
+        nr_bytes = int.from_bytes(header[1:header_size], "big")
+        self.skip(header_size)
         return nr_bytes
@@ -3,6 +3,7 @@
 import pytest
 import keyring
 import hdfstream
+from fake_http import install_fake_session
 from hdfstream.testing import pytest_recording_configure, vcr_config, KeyringNotAvailableError
 
 def pytest_addoption(parser):
@@ -12,6 +13,34 @@ def pytest_addoption(parser):
     parser.addoption(
         "--server", default="https://localhost:8444/hdfstream", help="Server URL for the test"
     )
+    parser.addoption(
+        "--run-benchmarks", action="store_true", default=False, help="Run tests marked as benchmarks"
+    )
+    parser.addoption(
+        "--benchmark-bytes", type=int, default=2*1024**3, help="Size of synthetic streams used in benchmarks"
+    )
+    parser.addoption(
+        "--benchmark-particles", type=int, default=2**22, help="Number of particles in files served by the local server"
+    )
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: slow performance test, only run with --run-benchmarks")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="need --run-benchmarks option to run")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+@pytest.fixture(scope='session')
+def benchmark_bytes(request):
+    return request.config.getoption("--benchmark-bytes")
+
+@pytest.fixture(scope='session')
+def benchmark_particles(request):
+    return request.config.getoption("--benchmark-particles")
 
 @pytest.fixture(scope='module')
 def server_url(request):
@@ -32,6 +61,11 @@ def swift_snap_file(server_url):
     filename="Tests/SWIFT/IOExamples/ssio_ci_04_2025/EagleSingle.hdf5"
     return lambda: open_file(server_url, filename)
 
+@pytest.fixture
+def fake_session(monkeypatch):
+    # Replace requests.Session with a fake, returning its class (see fake_http.py)
+    return install_fake_session(monkeypatch)
+
 def raise_keyring_error(*args, **kwargs):
     raise KeyringNotAvailableError("Tests should not be using the keyring!")
 
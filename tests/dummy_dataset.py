@@ -10,6 +10,7 @@
 import numpy as np
 
 from hdfstream.remote_dataset import RemoteDataset
+from hdfstream.request_planner import RequestPlanner
 
 
 class DummyConnection:
@@ -18,6 +19,8 @@ class DummyConnection:
     Test data is just stored in a numpy array.
     """
     def __init__(self, file_path, name, data):
+        self.server = "https://dummy"
+        self.planner = RequestPlanner()
         self.file_path = file_path
         self.name = name
         self.data = data
@@ -73,7 +76,7 @@ class DummyConnection:
             for i, (s,c) in enumerate(slice_descriptor[1:]):
                 assert c >= 0
                 assert s >= 0
-                assert s + c <= self.data.shape[i]
+                assert s + c <= self.data.shape[i+1]
                 key.append(slice(s, s+c, 1))
             data.append(self.data[tuple(key)])
         return np.concatenate(data, axis=0)
@@ -99,7 +102,8 @@ class DummyRemoteDataset(RemoteDataset):
     Tests should be repeated with both settings to ensure that results do
     not depend on the lazy loading parameters.
     """
-    def __init__(self, file_path, name, data, cache=False, max_nr_slices=16777216):
+    def __init__(self, file_path, name, data, cache=False, max_nr_slices=16777216,
+                 split_size=None, last_modified=None, max_gap=0):
         self.data  = data if cache else None
         self.dtype = data.dtype
         self.shape = data.shape
@@ -109,3 +113,7 @@ class DummyRemoteDataset(RemoteDataset):
         self.connection = DummyConnection(file_path, name, data)
         self.arr = data
         self.max_nr_slices = max_nr_slices
+        self.split_size = split_size
+        self.last_modified = last_modified
+        self.max_gap = max_gap
+        self.attrs = {}
@@ -0,0 +1,113 @@
+#!/bin/env python
+#
+# Fake requests sessions and responses for testing the connection code
+# without a server. Use the fake_session fixture (see conftest.py), which
+# replaces requests.Session with a new subclass of FakeSession for each
+# test, so that queued responses are not shared between tests.
+#
+
+import io
+
+import requests
+import urllib3.exceptions
+
+
+class TruncatedStream(io.BytesIO):
+    """
+    Stream which fails after the first nbytes have been read
+    """
+    def __init__(self, data, nbytes):
+        super().__init__(data)
+        self.nbytes = nbytes
+
+    def _check(self):
+        if self.tell() >= self.nbytes:
+            raise urllib3.exceptions.ProtocolError("Connection broken")
+
+    def read(self, size=-1):
+        self._check()
+        return super().read(min(size, self.nbytes-self.tell()) if size >= 0 else self.nbytes-self.tell())
+
+    def readinto(self, b):
+        self._check()
+        return super().readinto(memoryview(b)[:self.nbytes-self.tell()])
+
+
+class FakeResponse:
+    """
+    Response with the specified http status and body. If truncate is not
+    None, reading the body fails after that many bytes.
+    """
+    def __init__(self, status_code=200, body=b"", headers=None, truncate=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers if headers is not None else {}
+        self.encoding = "utf-8"
+        self.closed = False
+        if truncate is None:
+            self.raw = io.BytesIO(body)
+        else:
+            self.raw = TruncatedStream(body, truncate)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def close(self):
+        self.closed = True
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"HTTP error {self.status_code}", response=self)
+
+    def iter_content(self, chunk_size):
+        while True:
+            data = self.raw.read(chunk_size)
+            if len(data) == 0:
+                break
+            yield data
+
+
+class FakeSession(requests.Session):
+    """
+    Replacement for requests.Session. If handler is set, each request is
+    passed to handler(session, method, url, **kwargs), which returns the
+    response. Otherwise responses are taken in order from the responses
+    list, or an empty 200 response is returned if the list is empty.
+
+    :ivar requests: list of (method, url) for the requests made with this session
+    :vartype requests: list
+    """
+    responses = []
+    handler = None
+
+    def __init__(self):
+        super().__init__()
+        self.requests = []
+
+    def _respond(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        if self.handler is not None:
+            return type(self).handler(self, method, url, **kwargs)
+        if len(self.responses) > 0:
+            return self.responses.pop(0)
+        return FakeResponse(200)
+
+    def get(self, url, **kwargs):
+        return self._respond("GET", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self._respond("POST", url, data=data, **kwargs)
+
+
+def install_fake_session(monkeypatch):
+    """
+    Make the connection code use a new FakeSession subclass, which is
+    returned so that tests can set its responses or handler
+    """
+    import hdfstream.connection
+    session_class = type("FakeSession", (FakeSession,), {"responses" : [], "handler" : None})
+    monkeypatch.setattr(hdfstream.connection.requests, "Session", session_class)
+    return session_class
@@ -0,0 +1,355 @@
+#!/bin/env python
+#
+# Minimal stand-in for the hdfstream server, used to benchmark the client
+# over a real http connection. Serves the HDF5 files in a local directory
+# using the same /msgpack/ and /download/ requests as the real service.
+#
+# Run as a script to start a server on a local port:
+#
+#   python local_server.py /path/to/files --port 8000
+#
+# Or use the LocalServer class to run it in a subprocess, so that the
+# server does not compete with the client for the GIL.
+#
+
+import os
+import re
+import sys
+import argparse
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import h5py
+import msgpack
+import numpy as np
+
+from hdfstream.decoding import decode_hook
+
+# Maximum size of a msgpack bin object
+max_bin_size = 2**32 - 1
+
+
+def encode(obj):
+    """
+    Encode numpy arrays and scalars in the same way as the server: fixed
+    size types become a map with the raw array data as a list of bins.
+    """
+    if isinstance(obj, np.generic):
+        obj = np.asarray(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return obj.tolist()
+        arr = np.ascontiguousarray(obj)
+        data = memoryview(arr.reshape(-1)).cast("B")
+        return {
+            "nd" : True,
+            "type" : arr.dtype.str,
+            "kind" : "",
+            "shape" : list(arr.shape),
+            "nbytes" : arr.nbytes,
+            "data" : [data[i:i+max_bin_size] for i in range(0, len(data), max_bin_size)] or [b""],
+        }
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Unable to encode object of type {type(obj)}")
+
+
+def read_slice(dataset, slice_descriptor):
+    """
+    Read the slice described by slice_descriptor from a h5py dataset. The
+    first dimension may have arrays of starts and counts, in which case
+    the ranges are concatenated.
+    """
+    if len(slice_descriptor) == 0:
+        return dataset[()]
+    rest = tuple(slice(int(s), int(s)+int(c)) for s, c in slice_descriptor[1:])
+    starts, counts = slice_descriptor[0]
+    if np.ndim(starts) == 0:
+        return dataset[(slice(int(starts), int(starts)+int(counts)),) + rest]
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.broadcast_to(np.asarray(counts, dtype=np.int64), starts.shape)
+    if len(starts) == 0 or counts.sum() == 0:
+        return dataset[(slice(0, 0),) + rest]
+    # Read the range spanned by all of the slices then pick out the elements we need
+    lo = int(starts.min())
+    hi = int((starts+counts).max())
+    offsets = np.cumsum(counts) - counts
+    index = np.repeat(starts - lo - offsets, counts) + np.arange(counts.sum())
+    return dataset[(slice(lo, hi),) + rest][index,...]
+
+
+def describe_object(file, name, depth, max_depth, data_size_limit):
+    """
+    Return the msgpack representation of a HDF5 object. Members of groups
+    are included down to max_depth levels below the requested object.
+    """
+    parent, _, member_name = name.rstrip("/").rpartition("/")
+    link = file.get(name, getlink=True) if member_name else None
+    if isinstance(link, h5py.SoftLink):
+        return {"hdf5_object" : "soft_link", "target" : link.path}
+    obj = file[name]
+    attrs = {key : obj.attrs[key] for key in obj.attrs}
+    if isinstance(obj, h5py.Group):
+        members = {}
+        for member_name in obj:
+            if depth < max_depth:
+                member_path = name.rstrip("/") + "/" + member_name
+                members[member_name] = describe_object(file, member_path, depth+1, max_depth, data_size_limit)
+            else:
+                members[member_name] = None
+        return {"hdf5_object" : "group", "attributes" : attrs, "members" : members}
+    data = {
+        "hdf5_object" : "dataset",
+        "attributes" : attrs,
+        "type" : obj.dtype.str,
+        "kind" : "",
+        "shape" : list(obj.shape),
+    }
+    if obj.size*obj.dtype.itemsize <= data_size_limit:
+        data["data"] = obj[()]
+    return data
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately, so avoid delays due to
+    # Nagle's algorithm interacting with delayed acknowledgements
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def local_path(self, prefix):
+        """
+        Return the local path corresponding to the requested URL
+        """
+        path = self.path.split("?", 1)[0][len(prefix):].strip("/")
+        local_path = os.path.realpath(os.path.join(self.server.root, path))
+        if not (local_path + "/").startswith(self.server.root + "/"):
+            raise RequestError(404, f"Invalid path specified: {path}")
+        if not os.path.exists(local_path):
+            raise RequestError(404, f"Invalid path specified: {path}")
+        return local_path
+
+    def send_msgpack(self, status, obj):
+        body = msgpack.packb(obj, default=encode)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-msgpack")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, params):
+        try:
+            if self.path.startswith("/msgpack/"):
+                self.send_msgpack(200, self.server.msgpack_response(self.local_path("/msgpack/"), params))
+            elif self.path.startswith("/download/") and self.command == "GET":
+                self.download(self.local_path("/download/"))
+            else:
+                raise RequestError(404, "Unknown endpoint")
+        except RequestError as e:
+            self.send_msgpack(e.status, {"error" : str(e)})
+        except KeyError as e:
+            self.send_msgpack(404, {"error" : f"Object not found: {e}"})
+        except Exception as e:
+            self.send_msgpack(500, {"error" : f"{type(e).__name__}: {e}"})
+
+    def do_GET(self):
+        self.handle_request({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        params = msgpack.unpackb(body, object_hook=decode_hook) if body else {}
+        self.handle_request(params)
+
+    def download(self, local_path):
+        """
+        Send the contents of a file, or the part of it in a Range header
+        """
+        size = os.path.getsize(local_path)
+        start, stop = 0, size
+        range_header = self.headers.get("Range")
+        if range_header is not None:
+            m = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header.strip())
+            if m is None:
+                raise RequestError(416, "Invalid range")
+            start = int(m.group(1))
+            stop = min(size, int(m.group(2))+1) if m.group(2) else size
+            if start >= stop:
+                raise RequestError(416, "Invalid range")
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{stop-1}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(stop-start))
+        self.end_headers()
+        with open(local_path, "rb") as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                data = f.read(min(remaining, 1024*1024))
+                if not data:
+                    break
+                self.wfile.write(data)
+                remaining -= len(data)
+
+
+class Server(ThreadingHTTPServer):
+    """
+    Threaded http server which serves HDF5 files in the directory root
+    """
+    daemon_threads = True
+
+    def __init__(self, root, address=("127.0.0.1", 0)):
+        super().__init__(address, RequestHandler)
+        self.root = os.path.realpath(root)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def open_hdf5(self, local_path):
+        with self._lock:
+            if local_path not in self._files:
+                self._files[local_path] = h5py.File(local_path, "r")
+            return self._files[local_path]
+
+    def msgpack_response(self, local_path, params):
+        """
+        Return the response to a /msgpack/ request
+        """
+        if os.path.isdir(local_path):
+            directories = {}
+            files = {}
+            for entry in sorted(os.scandir(local_path), key=lambda e: e.name):
+                if entry.is_dir():
+                    directories[entry.name] = None
+                else:
+                    files[entry.name] = file_info(entry.path)
+            return {
+                "type" : "directory",
+                "description" : None,
+                "labels" : None,
+                "size" : sum(f["size"] for f in files.values()),
+                "directories" : directories,
+                "files" : files,
+            }
+        if "object" not in params:
+            return file_info(local_path)
+        file = self.open_hdf5(local_path)
+        with self._lock:
+            if "slice" in params:
+                return read_slice(file[params["object"]], params["slice"])
+            return describe_object(file, params["object"], 0, params.get("max_depth", 0),
+                                   params.get("data_size_limit", 0))
+
+
+def file_info(local_path):
+    stat = os.stat(local_path)
+    is_hdf5 = local_path.endswith((".hdf5", ".h5"))
+    return {
+        "type" : "application/x-hdf5" if is_hdf5 else "application/octet-stream",
+        "size" : stat.st_size,
+        "last_modified" : stat.st_mtime_ns // 1000000,
+    }
+
+
+class LocalServer:
+    """
+    Context manager which runs a server for the files in root in a
+    subprocess. The server's URL is available as the url attribute.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.process = None
+        self.url = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), str(self.root)],
+                                        stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        if not self.url:
+            self.process.wait()
+            raise RuntimeError("Failed to start local server")
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+        return False
+
+
+#
+# Functions to generate test files. The snapshot file has a similar layout
+# to the EAGLE snapshot used by tests/data/store_snapshot_data.py.
+#
+
+def make_snapshot(filename, nr_particles, seed=0):
+    """
+    Write a snapshot-like HDF5 file with nr_particles particles
+    """
+    rng = np.random.default_rng(seed)
+    with h5py.File(filename, "w") as f:
+        header = f.create_group("Header")
+        header.attrs["BoxSize"] = 12.5
+        header.attrs["Redshift"] = 0.0
+        header.attrs["NumPart_ThisFile"] = np.asarray([0, nr_particles, 0, 0, 0, 0], dtype=np.int32)
+        ptype = f.create_group("PartType1")
+        datasets = {
+            "Coordinates" : rng.random((nr_particles, 3))*12.5,
+            "Velocity" : rng.normal(size=(nr_particles, 3)).astype(np.float32),
+            "ParticleIDs" : np.arange(nr_particles, dtype=np.int64),
+            "Mass" : np.ones(nr_particles, dtype=np.float32),
+        }
+        for name, data in datasets.items():
+            dset = ptype.create_dataset(name, data=data)
+            dset.attrs["CGSConversionFactor"] = 1.0
+            dset.attrs["h-scale-exponent"] = 0.0
+            dset.attrs["aexp-scale-exponent"] = 1.0
+
+
+def make_tree(filename, fanout=4, depth=3, nr_datasets=8):
+    """
+    Write a HDF5 file with a tree of nested groups, each containing
+    nr_datasets small datasets with attributes
+    """
+    def fill(group, level):
+        group.attrs["level"] = level
+        for i in range(nr_datasets):
+            dset = group.create_dataset(f"data{i}", data=np.arange(16, dtype=np.int32)+i)
+            dset.attrs["units"] = np.bytes_("cm")
+            dset.attrs["scale"] = float(i)
+        if level < depth:
+            for i in range(fanout):
+                fill(group.create_group(f"group{i}"), level+1)
+    with h5py.File(filename, "w") as f:
+        fill(f, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve local HDF5 files using the hdfstream protocol")
+    parser.add_argument("root", help="directory containing the files to serve")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=0, help="port to listen on, or 0 to pick a free port")
+    args = parser.parse_args()
+    server = Server(args.root, (args.host, args.port))
+    print(server.url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,154 @@
+#!/bin/env python
+
+import asyncio
+import threading
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.aio as aio
+from hdfstream.remote_group import RemoteGroup
+from dummy_dataset import DummyRemoteDataset
+from utils import assert_arrays_equal
+
+
+@pytest.fixture
+def dset():
+    data = np.arange(300, dtype=np.int64).reshape((100, 3))
+    return hdfstream.AsyncRemoteDataset(DummyRemoteDataset("/filename", "objectname", data))
+
+
+keys = [
+    np.s_[...],
+    np.s_[10:20, :],
+    np.s_[50, 1],
+    np.s_[[3, 5, 7, 90], :],
+]
+
+@pytest.mark.parametrize("key", keys)
+def test_async_read(dset, key):
+    expected = dset.obj.arr[key]
+    actual = asyncio.run(dset.read(key))
+    assert_arrays_equal(expected, actual)
+
+
+def test_async_read_many(dset):
+    # Many reads in progress at once should all return the right data
+    async def read_all():
+        return await asyncio.gather(*[dset.read(np.s_[i:i+10, :]) for i in range(90)])
+    for i, actual in enumerate(asyncio.run(read_all())):
+        assert_arrays_equal(dset.obj.arr[i:i+10, :], actual)
+
+
+def test_async_read_direct(dset):
+    arr = np.zeros((10, 3), dtype=np.int64)
+    asyncio.run(dset.read_direct(arr, np.s_[20:30, :]))
+    assert_arrays_equal(dset.obj.arr[20:30, :], arr)
+
+
+def test_async_dataset_properties(dset):
+    assert dset.shape == (100, 3)
+    assert dset.dtype == np.int64
+    assert dset.ndim == 2
+    assert len(dset) == 100
+
+
+def test_max_async_requests():
+    # Reads should run concurrently, but never more than the limit
+    nr_running = 0
+    max_running = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(4, timeout=10)
+    def func():
+        nonlocal nr_running, max_running
+        with lock:
+            nr_running += 1
+            max_running = max(max_running, nr_running)
+        barrier.wait()
+        with lock:
+            nr_running -= 1
+    async def run_all():
+        await asyncio.gather(*[aio._run(func) for _ in range(16)])
+    try:
+        hdfstream.set_max_async_requests(4)
+        asyncio.run(run_all())
+    finally:
+        hdfstream.set_max_async_requests(aio.DEFAULT_POOLSIZE)
+    assert max_running == 4
+
+
+def test_invalid_max_async_requests():
+    with pytest.raises(ValueError):
+        hdfstream.set_max_async_requests(0)
+
+
+class DummyObjectConnection:
+    """
+    Fake connection which returns group metadata from a dict
+    """
+    def __init__(self, objects):
+        self.objects = objects
+
+    def request_object(self, path, name, data_size_limit, max_depth, last_modified=None):
+        return self.objects[name]
+
+
+def make_group():
+    # Make a root group where the sub-group has to be requested
+    dataset = {
+        "hdf5_object" : "dataset",
+        "attributes" : {},
+        "type" : "<i8",
+        "kind" : "",
+        "shape" : [4],
+        "data" : np.arange(4, dtype=np.int64),
+    }
+    subgroup = {
+        "hdf5_object" : "group",
+        "attributes" : {"a" : 1},
+        "members" : {"dataset" : dataset},
+    }
+    root = {
+        "hdf5_object" : "group",
+        "attributes" : {},
+        "members" : {"group" : None},
+    }
+    connection = DummyObjectConnection({"/group" : subgroup})
+    return hdfstream.AsyncRemoteGroup(RemoteGroup(connection, "/filename", "/", data=root))
+
+
+def test_async_group():
+    async def read_group():
+        root = make_group()
+        names = [name async for name in root]
+        group = await root.aget("group")
+        dataset = await root.aget("group/dataset")
+        return names, group, await group.attrs(), dataset, await dataset.read()
+    names, group, attrs, dataset, data = asyncio.run(read_group())
+    assert names == ["group"]
+    assert isinstance(group, hdfstream.AsyncRemoteGroup)
+    assert group.name == "/group"
+    assert attrs == {"a" : 1}
+    assert isinstance(dataset, hdfstream.AsyncRemoteDataset)
+    assert_arrays_equal(data, np.arange(4, dtype=np.int64))
+
+
+def test_async_contains():
+    root = make_group()
+    assert asyncio.run(root.acontains("group/dataset"))
+    assert not asyncio.run(root.acontains("missing"))
+
+
+def test_async_open_options(monkeypatch):
+    # Connection options should be passed through to hdfstream.open
+    calls = []
+    def fake_open(server, name, **kwargs):
+        calls.append((server, name, kwargs))
+        return "opened"
+    monkeypatch.setattr(hdfstream, "open", fake_open)
+    result = asyncio.run(hdfstream.async_open("https://example.com", "file.hdf5",
+                                              pool_size=4, lazy_validation=True))
+    assert result == "opened"
+    server, name, kwargs = calls[0]
+    assert kwargs["pool_size"] == 4
+    assert kwargs["lazy_validation"] is True
@@ -0,0 +1,169 @@
+#!/bin/env python
+#
+# Tests of dataset reads through the asyncio interface with the aiohttp
+# client, using the local stand-in server and a small aiohttp server.
+#
+
+import asyncio
+import warnings
+
+import h5py
+import msgpack
+import numpy as np
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+import hdfstream
+import hdfstream.aio as aio
+from hdfstream.connection import Connection, encode_array
+from hdfstream.decoding import decode_hook
+from hdfstream.remote_dataset import RemoteDataset
+from local_server import LocalServer, make_snapshot
+from utils import assert_arrays_equal
+
+
+@pytest.fixture(scope="module")
+def local_server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("aio_server")
+    (root / "sims").mkdir()
+    make_snapshot(root / "sims" / "snapshot.hdf5", 1000)
+    with LocalServer(root) as server:
+        with h5py.File(root / "sims" / "snapshot.hdf5", "r") as local:
+            pos = local["PartType1/Coordinates"][...]
+        yield server, pos
+
+
+@pytest.fixture
+def no_threads(monkeypatch):
+    # Fail if a dataset read falls back to the thread pool
+    def fail(*args, **kwargs):
+        raise AssertionError("Read used the thread pool")
+    return lambda: monkeypatch.setattr(aio, "_run", fail)
+
+
+def open_dataset(local_server, **options):
+    server, pos = local_server
+    async def open_coordinates():
+        snap = await hdfstream.async_open(server.url, "/sims/snapshot.hdf5", data_size_limit=0, **options)
+        return await snap.aget("PartType1/Coordinates")
+    return asyncio.run(open_coordinates())
+
+
+keys = [
+    np.s_[...],
+    np.s_[100:200, 1:],
+    np.s_[500, 2],
+    np.s_[[5, 3, 900, 17, 18, 19], :],
+]
+
+@pytest.mark.parametrize("key", keys)
+def test_aiohttp_read(local_server, no_threads, key):
+    server, pos = local_server
+    dataset = open_dataset(local_server)
+    no_threads()
+    assert_arrays_equal(asyncio.run(dataset.read(key)), pos[key])
+
+
+def test_aiohttp_read_many(local_server, no_threads):
+    # Concurrent reads, each split into several requests
+    server, pos = local_server
+    dataset = open_dataset(local_server)
+    dataset.obj.split_size = 1000
+    no_threads()
+    async def read_all():
+        return await asyncio.gather(*[dataset.read(np.s_[i:i+300, :]) for i in range(0, 700, 50)])
+    for i, actual in zip(range(0, 700, 50), asyncio.run(read_all())):
+        assert_arrays_equal(actual, pos[i:i+300, :])
+
+
+def test_aiohttp_read_direct(local_server, no_threads):
+    server, pos = local_server
+    dataset = open_dataset(local_server)
+    no_threads()
+    arr = np.zeros((20, 3), dtype=pos.dtype)
+    asyncio.run(dataset.read_direct(arr, np.s_[200:210, :], np.s_[5:15, :]))
+    assert_arrays_equal(arr[5:15, :], pos[200:210, :])
+    assert np.all(arr[:5, :] == 0) and np.all(arr[15:, :] == 0)
+
+
+def test_aiohttp_request_slices(local_server, no_threads):
+    server, pos = local_server
+    dataset = open_dataset(local_server)
+    no_threads()
+    result = asyncio.run(dataset.request_slices([np.s_[0:10, :], np.s_[500:510, :]]))
+    assert_arrays_equal(result, np.concatenate([pos[0:10, :], pos[500:510, :]]))
+
+
+def test_aiohttp_pool_size(local_server):
+    dataset = open_dataset(local_server, pool_size=4)
+    assert dataset.obj.connection.async_connection().pool_size == 4
+
+
+def test_sessions_closed(local_server):
+    # Sessions should be closed when each event loop exits
+    server, pos = local_server
+    dataset = open_dataset(local_server)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning)
+        for i in range(3):
+            asyncio.run(dataset.read(np.s_[0:10, :]))
+            assert dataset.obj.connection.async_connection()._session.closed
+
+
+async def serve(handler):
+    # Run a server on a free local port which responds with handler
+    app = web.Application()
+    app.router.add_post("/msgpack/{path:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def slice_handler(max_rows, failures):
+    # Return slices of np.arange(100), rejecting requests for more than
+    # max_rows elements and failing the first few requests with status 503
+    async def handler(request):
+        if failures:
+            failures.pop()
+            return web.Response(status=503)
+        params = msgpack.unpackb(await request.read(), object_hook=decode_hook)
+        starts, counts = params["slice"][0]
+        starts, counts = np.atleast_1d(starts), np.atleast_1d(counts)
+        if np.sum(counts) > max_rows:
+            body = msgpack.packb({"error" : "Request too large"})
+            return web.Response(status=413, body=body, content_type="application/x-msgpack")
+        result = np.concatenate([np.arange(s, s+c, dtype=np.int64) for s, c in zip(starts, counts)])
+        return web.Response(body=msgpack.packb(result, default=encode_array))
+    return handler
+
+
+def run_with_server(handler, key):
+    async def read():
+        runner, url = await serve(handler)
+        try:
+            conn = Connection(url, lazy_validation=True, retry_policy=hdfstream.RetryPolicy(backoff=0.01))
+            data = {"attributes" : {}, "type" : "int64", "kind" : "", "shape" : [100]}
+            dataset = hdfstream.AsyncRemoteDataset(RemoteDataset(conn, "/file.hdf5", "/data", data, None))
+            result = await dataset.read(key)
+            await conn.async_connection().aclose()
+            return conn, result
+        finally:
+            await runner.cleanup()
+    return asyncio.run(read())
+
+
+def test_aiohttp_split_large_requests():
+    conn, result = run_with_server(slice_handler(30, []), np.s_[10:90])
+    assert_arrays_equal(result, np.arange(10, 90))
+    assert conn.planner.max_response_bytes is not None
+
+
+def test_aiohttp_retry():
+    conn, result = run_with_server(slice_handler(100, [1, 1]), np.s_[[1, 5, 7]])
+    assert_arrays_equal(result, np.asarray([1, 5, 7]))
+    assert conn.retry_stats()["by_reason"] == {503 : 2}
@@ -0,0 +1,36 @@
+#!/bin/env python
+#
+# Benchmark of the time taken to import the module. This is skipped
+# unless pytest is run with --run-benchmarks. Use pytest -s to see the
+# results.
+#
+
+import re
+import sys
+import subprocess
+import pytest
+
+# Maximum time in seconds to import hdfstream, not including numpy,
+# requests and msgpack which are always needed
+import_time_budget = 0.1
+
+
+def import_time(repeats=5):
+    """
+    Return the minimum time taken to import hdfstream in a new process
+    """
+    code = "import numpy, requests, msgpack; import hdfstream"
+    times = []
+    for i in range(repeats):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                capture_output=True, text=True, check=True)
+        match = re.search(r"\|\s*(\d+)\s*\| hdfstream$", result.stderr, re.MULTILINE)
+        times.append(int(match.group(1))*1.0e-6)
+    return min(times)
+
+
+@pytest.mark.benchmark
+def test_import_time():
+    elapsed = import_time()
+    print(f"\nimport hdfstream: {elapsed*1000:.1f}ms (budget {import_time_budget*1000:.0f}ms)")
+    assert elapsed < import_time_budget
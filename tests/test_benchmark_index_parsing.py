@@ -0,0 +1,91 @@
+#!/bin/env python
+#
+# Benchmarks for parsing large index lists and arrays. These are skipped
+# unless pytest is run with --run-benchmarks. Use pytest -s to see the
+# results.
+#
+
+import time
+import numpy as np
+import pytest
+
+import hdfstream.slice_utils as su
+
+
+def old_convert_list_to_array(index, size):
+    """
+    Reference implementation which checks the type of each list element in
+    a python loop, as convert_list_to_array() did originally
+    """
+    if len(index) == 0:
+        return np.zeros(0, dtype=int)
+    if isinstance(index[0], bool):
+        for ind in index:
+            if not isinstance(ind, bool):
+                raise IndexError("Indexes in a list must all be the same type")
+        return np.asarray(index, dtype=bool)
+    elif su.is_integer(index[0]):
+        for ind in index:
+            if not su.is_integer(ind):
+                raise IndexError("Indexes in a list must all be the same type")
+        return np.asarray(index, dtype=int)
+    else:
+        raise IndexError("Lists of indexes must contain booleans or integers")
+
+
+def old_sort_unique(index):
+    """
+    Reference implementation which always calls np.unique() if the index
+    is not strictly increasing
+    """
+    if len(index) > 1 and np.any(index[1:] <= index[:-1]):
+        return np.unique(index, return_inverse=True)
+    return index, None
+
+
+def make_index(size, order):
+    """
+    Make an index array selecting about half of the elements of a dataset
+    of 2*size elements
+    """
+    rng = np.random.default_rng(0)
+    index = np.sort(rng.integers(0, 2*size, size))
+    if order == "sorted_unique":
+        index = np.unique(index)
+    elif order == "random":
+        rng.shuffle(index)
+    return index
+
+
+def measure(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", [10**6, 10**7, 10**8])
+def test_convert_list_to_array(size):
+    index = make_index(size, "sorted").tolist()
+    new_time = measure(su.convert_list_to_array, index, 2*size)
+    old_time = measure(old_convert_list_to_array, index, 2*size)
+    print(f"\nconvert_list_to_array, {size} elements: {new_time:.3f}s (python loop: {old_time:.3f}s)")
+    assert new_time < old_time
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", [10**6, 10**7, 10**8])
+@pytest.mark.parametrize("order", ["sorted_unique", "sorted", "random"])
+def test_sort_unique(size, order):
+    index = make_index(size, order)
+    new_time = measure(su.sort_unique, index)
+    old_time = measure(old_sort_unique, index)
+    print(f"\nsort_unique, {size} elements, {order}: {new_time:.3f}s (np.unique: {old_time:.3f}s)")
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", [10**6, 10**7, 10**8])
+def test_array_indexed_slice(size):
+    index = make_index(size, "random")
+    elapsed = measure(su.ArrayIndexedSlice, (2*size, 3), (index, slice(None)))
+    print(f"\nArrayIndexedSlice, {size} elements: {elapsed:.3f}s")
@@ -0,0 +1,108 @@
+#!/bin/env python
+#
+# End to end benchmarks which read generated HDF5 files through the
+# stand-in server in local_server.py. These are skipped unless pytest is
+# run with --run-benchmarks. Use pytest -s to see the results, and
+# --benchmark-particles to set the size of the snapshot file.
+#
+
+import time
+import h5py
+import numpy as np
+import pytest
+
+import hdfstream
+from local_server import LocalServer, make_snapshot, make_tree
+
+
+@pytest.fixture(scope="module")
+def local_server(tmp_path_factory, benchmark_particles):
+    root = tmp_path_factory.mktemp("benchmark_server")
+    make_snapshot(root / "snapshot.hdf5", benchmark_particles)
+    make_tree(root / "tree.hdf5", fanout=4, depth=3, nr_datasets=8)
+    hdfstream.disable_progress(True)
+    try:
+        with LocalServer(root) as server:
+            yield server
+    finally:
+        hdfstream.disable_progress(None)
+
+
+def open_file(server, filename, **kwargs):
+    return hdfstream.open(server.url, "/", **kwargs)[filename]
+
+
+def measure(label, func, *args, **kwargs):
+    """
+    Call func and report the time taken, data rate and request rate
+    """
+    metrics = hdfstream.RequestMetrics()
+    hdfstream.add_request_hook(metrics)
+    try:
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - t0
+    finally:
+        hdfstream.remove_request_hook(metrics)
+    nr_requests = sum(t["requests"] for t in metrics.totals.values())
+    nr_bytes = sum(t["response_bytes"] for t in metrics.totals.values())
+    print(f"\n{label}: {elapsed:.3f}s, {nr_bytes/elapsed/2**20:.1f} MB/s, "
+          f"{nr_requests} requests, {nr_requests/elapsed:.1f} requests/s")
+    return result
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("fraction", [0.0001, 0.01, 1.0])
+def test_contiguous_slice(local_server, fraction):
+    dataset = open_file(local_server, "snapshot.hdf5")["PartType1/Coordinates"]
+    n = max(1, int(dataset.shape[0]*fraction))
+    data = measure(f"Contiguous slice, {n} rows", dataset.__getitem__, np.s_[0:n,:])
+    assert data.shape == (n, 3)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("density", [0.0001, 0.001, 0.01, 0.1, 0.5])
+def test_fancy_index(local_server, density):
+    dataset = open_file(local_server, "snapshot.hdf5")["PartType1/Coordinates"]
+    rng = np.random.default_rng(0)
+    index = np.sort(rng.choice(dataset.shape[0], int(dataset.shape[0]*density), replace=False))
+    data = measure(f"Array index, density {density}", dataset.__getitem__, index)
+    assert data.shape == (len(index), 3)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("nr_slices", [10, 1000, 100000])
+def test_request_slices(local_server, nr_slices):
+    dataset = open_file(local_server, "snapshot.hdf5")["PartType1/ParticleIDs"]
+    stride = dataset.shape[0] // nr_slices
+    slices = [np.s_[i*stride:i*stride+min(stride, 10)] for i in range(nr_slices)]
+    data = measure(f"request_slices(), {nr_slices} slices", dataset.request_slices, slices)
+    assert len(data) == nr_slices*min(stride, 10)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("max_depth", [0, 1, 2, 5])
+def test_metadata_tree(local_server, max_depth):
+    def load_tree():
+        names = []
+        open_file(local_server, "tree.hdf5", max_depth=max_depth)["/"].visit(names.append)
+        return names
+    names = measure(f"Load metadata tree, max_depth={max_depth}", load_tree)
+    assert len(names) == 85 + 85*8 - 1
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_copy(local_server, max_workers):
+    remote = open_file(local_server, "snapshot.hdf5")
+    with h5py.File("copy.hdf5", "w", driver="core", backing_store=False) as dest:
+        measure(f"copy(), max_workers={max_workers}", remote["/"].copy, "PartType1", dest,
+                block_size=16*1024*1024, max_workers=max_workers)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("workers", [1, 4])
+def test_download(local_server, workers, tmp_path):
+    remote = open_file(local_server, "snapshot.hdf5")
+    measure(f"download(), workers={workers}", remote.download, tmp_path / "snapshot.hdf5",
+            workers, 16*1024*1024)
@@ -0,0 +1,50 @@
+#!/bin/env python
+#
+# Benchmark of the per-request cost of progress reporting when decoding
+# many small responses. This is skipped unless pytest is run with
+# --run-benchmarks. Use pytest -s to see the results.
+#
+
+import io
+import time
+import msgpack
+import numpy as np
+import pytest
+from tqdm import tqdm
+
+import hdfstream
+import hdfstream.decoding as decoding
+from hdfstream.connection import encode_array
+from fake_http import FakeResponse
+from hdfstream.streaming_decoder import StreamingDecoder
+
+
+def decode_with_tqdm(body):
+    """
+    Reference implementation which creates a tqdm instance for every
+    response, as decode_response() did originally
+    """
+    with tqdm(unit="B", unit_scale=True, delay=0.1, disable=None, desc="test") as progress:
+        return decoding.decode_ndarray(StreamingDecoder(io.BytesIO(body)), "test", progress)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("reporter", [None, hdfstream.NullProgress])
+def test_small_request_overhead(reporter):
+    body = msgpack.packb(np.arange(1, dtype=np.int64), default=encode_array)
+    nr_requests = 10000
+    hdfstream.set_progress_reporter(reporter)
+    try:
+        t0 = time.perf_counter()
+        for i in range(nr_requests):
+            decoding.decode_response(FakeResponse(200, body), "test")
+        new_time = time.perf_counter() - t0
+    finally:
+        hdfstream.set_progress_reporter(None)
+    t0 = time.perf_counter()
+    for i in range(nr_requests):
+        decode_with_tqdm(body)
+    old_time = time.perf_counter() - t0
+    name = "default" if reporter is None else reporter.__name__
+    print(f"\n{nr_requests} small responses, {name} reporter: {new_time:.3f}s (tqdm per request: {old_time:.3f}s)")
+    assert new_time < old_time
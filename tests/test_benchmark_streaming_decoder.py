@@ -0,0 +1,127 @@
+#!/bin/env python
+#
+# Throughput benchmarks for StreamingDecoder. These are skipped unless
+# pytest is run with --run-benchmarks. The stream size can be set with
+# --benchmark-bytes (default 2GB). Use pytest -s to see the results.
+#
+
+import io
+import time
+import pytest
+
+from hdfstream.streaming_decoder import StreamingDecoder
+
+
+class SyntheticStream(io.RawIOBase):
+    """
+    Read-only stream which generates nr_bytes bytes without storing them
+    """
+    def __init__(self, nr_bytes):
+        self.bytes_left = nr_bytes
+        self.pattern = bytes(range(256))*4096
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        mv = memoryview(b).cast("B")
+        n = min(len(mv), len(self.pattern), self.bytes_left)
+        mv[:n] = self.pattern[:n]
+        self.bytes_left -= n
+        return n
+
+
+class CopyingDecoder:
+    """
+    Reference implementation which discards consumed bytes by copying the
+    rest of the buffer, as StreamingDecoder did originally
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self.buf = bytearray()
+
+    def peek(self, n):
+        while len(self.buf) < n:
+            chunk = self._stream.read(n - len(self.buf))
+            if not chunk:
+                break
+            self.buf.extend(chunk)
+        return memoryview(self.buf)[:n]
+
+    def skip(self, n):
+        self.buf = self.buf[n:]
+
+    def readinto(self, b):
+        mv = memoryview(b)
+        nr_from_buf = min(len(self.buf), len(mv))
+        mv[:nr_from_buf] = self.buf[:nr_from_buf]
+        self.buf = self.buf[nr_from_buf:]
+        if nr_from_buf < len(mv):
+            nr_read_into = self._stream.readinto(mv[nr_from_buf:])
+            return nr_from_buf + (nr_read_into or 0)
+        return nr_from_buf
+
+    def read(self, size):
+        from_buffer = self.buf[:size]
+        self.buf = self.buf[size:]
+        remaining = size - len(from_buffer)
+        if remaining > 0:
+            return bytes(from_buffer) + self._stream.read(remaining)
+        else:
+            return bytes(from_buffer)
+
+
+def peek_then_read(decoder, window=4*1024*1024, read_size=64*1024):
+    """
+    Buffer a large window with peek() then consume it in small reads
+    """
+    nr_bytes = 0
+    while len(decoder.peek(window)) > 0:
+        for _ in range(window // read_size):
+            nr_bytes += len(decoder.read(read_size))
+    return nr_bytes
+
+
+def read_chunks(decoder, chunk_size=4*1024*1024):
+    """
+    Read the stream in large chunks, as decode_generic() does
+    """
+    nr_bytes = 0
+    while chunk := decoder.read(chunk_size):
+        nr_bytes += len(chunk)
+    return nr_bytes
+
+
+def readinto_chunks(decoder, chunk_size=4*1024*1024, header_size=1024):
+    """
+    Peek at a header, then read the rest of the stream into a buffer in
+    chunks, as decode_ndarray() does
+    """
+    decoder.peek(header_size)
+    decoder.skip(header_size // 2)
+    buf = memoryview(bytearray(chunk_size))
+    nr_bytes = header_size // 2
+    while n := decoder.readinto(buf):
+        nr_bytes += n
+    return nr_bytes
+
+
+def measure(decoder_class, workload, nr_bytes):
+    """
+    Return the throughput in bytes/second for the specified workload
+    """
+    decoder = decoder_class(SyntheticStream(nr_bytes))
+    t0 = time.perf_counter()
+    assert workload(decoder) == nr_bytes
+    return nr_bytes / (time.perf_counter() - t0)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("workload", [peek_then_read, read_chunks, readinto_chunks])
+def test_decoder_throughput(benchmark_bytes, workload):
+    new_rate = measure(StreamingDecoder, workload, benchmark_bytes)
+    old_rate = measure(CopyingDecoder, workload, benchmark_bytes)
+    print(f"\n{workload.__name__}: {new_rate/1024**2:.1f} MB/s (copying decoder: {old_rate/1024**2:.1f} MB/s)")
+    if workload is peek_then_read:
+        # This pattern copies the buffer on every read in the old version
+        assert new_rate > old_rate
@@ -0,0 +1,117 @@
+#!/bin/env python
+
+import msgpack
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.connection as connection
+from hdfstream.decoding import decode_hook
+
+
+@pytest.mark.parametrize("arr", [np.zeros(0, dtype=int),
+                                 np.arange(10, dtype=np.int32),
+                                 np.arange(1000, dtype=">i8")[::-3],
+                                 np.asarray([-1, 2**40], dtype=np.int64)])
+def test_encode_array(arr):
+    params = {"object" : "name", "slice" : [[arr, arr], [0, 3]]}
+    payload = msgpack.packb(params, default=connection.encode_array)
+    decoded = msgpack.unpackb(payload, object_hook=decode_hook)
+    for result in decoded["slice"][0]:
+        assert result.dtype == np.dtype("<i8")
+        assert np.all(result == arr)
+    assert decoded["slice"][1] == [0, 3]
+
+
+def test_encode_array_other_types():
+    # Anything other than 1D integer arrays is passed through unchanged
+    arr = np.zeros(3, dtype=float)
+    assert connection.encode_array(arr) is arr
+    assert connection.encode_array("abc") == "abc"
+
+
+class DummyServer(connection.Connection):
+    """
+    Connection which decodes slice requests in the same way as a server,
+    which may or may not accept binary arrays
+    """
+    def __init__(self, binary_supported):
+        self.server = "https://dummy"
+        self.binary_slices = None
+        self.binary_supported = binary_supported
+        self.requests = []
+        self.fail = None
+
+    def post_and_unpack(self, url, params=None, desc=None, destination=None, encoder=connection.convert_array):
+        payload = msgpack.packb(params, default=encoder)
+        starts, counts = msgpack.unpackb(payload, object_hook=decode_hook)["slice"][0]
+        binary = isinstance(starts, np.ndarray)
+        starts, counts = np.atleast_1d(starts), np.atleast_1d(counts)
+        self.requests.append(binary)
+        if binary and not self.binary_supported:
+            raise hdfstream.HDFStreamRequestError("Invalid slice", status_code=400)
+        if self.fail is not None:
+            raise hdfstream.HDFStreamRequestError("Request failed", status_code=self.fail)
+        data = np.concatenate([np.arange(s, s+c) for s, c in zip(starts, counts)])
+        if destination is None:
+            return data
+        destination[...] = data
+
+
+def test_binary_slices_supported():
+    conn = DummyServer(binary_supported=True)
+    descriptor = [[np.asarray([0, 10]), np.asarray([2, 3])]]
+    assert np.all(conn.request_slice("/file", "name", descriptor) == [0, 1, 10, 11, 12])
+    assert conn.binary_slices is True
+    dest = np.zeros(5, dtype=int)
+    conn.request_slice_into("/file", "name", descriptor, dest)
+    assert np.all(dest == [0, 1, 10, 11, 12])
+    assert conn.requests == [True, True]
+    # Errors are not retried once we know the server accepts binary arrays
+    conn.fail = 400
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        conn.request_slice("/file", "name", descriptor)
+    assert conn.requests == [True, True, True]
+
+
+def test_binary_slices_fallback():
+    conn = DummyServer(binary_supported=False)
+    descriptor = [[np.asarray([0, 10]), np.asarray([2, 3])]]
+    assert np.all(conn.request_slice("/file", "name", descriptor) == [0, 1, 10, 11, 12])
+    assert conn.binary_slices is False
+    assert np.all(conn.request_slice("/file", "name", descriptor) == [0, 1, 10, 11, 12])
+    # Should only try binary arrays once
+    assert conn.requests == [True, False, False]
+
+
+def test_binary_slices_unknown_after_error():
+    # If both attempts fail, we still don't know if binary arrays are supported
+    conn = DummyServer(binary_supported=True)
+    conn.fail = 400
+    descriptor = [[np.asarray([0, 10]), np.asarray([2, 3])]]
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        conn.request_slice("/file", "name", descriptor)
+    assert conn.binary_slices is None
+    assert conn.requests == [True, False]
+
+
+@pytest.mark.parametrize("status", [404, 500, 503])
+def test_binary_slices_other_errors(status):
+    # Errors which are not about the request encoding don't cause a retry with
+    # lists and don't disable binary arrays
+    conn = DummyServer(binary_supported=True)
+    conn.fail = status
+    descriptor = [[np.asarray([0, 10]), np.asarray([2, 3])]]
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        conn.request_slice("/file", "name", descriptor)
+    assert conn.requests == [True]
+    assert conn.binary_slices is None
+    conn.fail = None
+    assert np.all(conn.request_slice("/file", "name", descriptor) == [0, 1, 10, 11, 12])
+    assert conn.binary_slices is True
+
+
+def test_simple_slices_use_lists():
+    conn = DummyServer(binary_supported=True)
+    assert np.all(conn.request_slice("/file", "name", [[5, 2]]) == [5, 6])
+    assert conn.binary_slices is None
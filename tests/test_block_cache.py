@@ -0,0 +1,196 @@
+#!/bin/env python
+
+import numpy as np
+import pytest
+from itertools import product
+
+import hdfstream
+import hdfstream.block_cache as block_cache
+from hdfstream.request_planner import RequestPlanner
+from dummy_dataset import DummyRemoteDataset
+from utils import assert_arrays_equal
+
+
+@pytest.fixture
+def cache_size():
+    # Disable the cache again after each test
+    yield block_cache.set_block_cache_size
+    block_cache.set_block_cache_size(0, block_size=1024*1024)
+
+
+class CountingConnection:
+    """
+    Wraps a DummyConnection to record the number of elements requested
+    """
+    def __init__(self, connection):
+        self.connection = connection
+        self.server = connection.server
+        self.planner = RequestPlanner()
+        self.nr_requests = 0
+        self.nr_elements = 0
+
+    def request_slice(self, path, name, slice_descriptor):
+        data = self.connection.request_slice(path, name, slice_descriptor)
+        self.nr_requests += 1
+        self.nr_elements += data.size
+        return data
+
+    def request_slice_into(self, path, name, slice_descriptor, destination):
+        destination[...] = self.request_slice(path, name, slice_descriptor).reshape(destination.shape)
+
+
+def make_dataset(shape=(100, 3), last_modified=1000):
+    data = np.arange(np.prod(shape), dtype=np.int64).reshape(shape)
+    dset = DummyRemoteDataset("/filename", "objectname", data, last_modified=last_modified)
+    dset.connection = CountingConnection(dset.connection)
+    return dset
+
+
+# Block sizes in bytes: rows are 24 bytes so these give 1, 2 and 7 rows per block,
+# and a single block containing the whole dataset
+block_sizes = [1, 48, 7*24, 10000]
+cache_sizes = [24*7, 1024*1024]
+@pytest.fixture(params=list(product(block_sizes, cache_sizes)))
+def dset(request, cache_size):
+    block_size, max_bytes = request.param
+    cache_size(max_bytes, block_size=block_size)
+    return make_dataset()
+
+keys = [
+    np.s_[...],
+    np.s_[10:20,:],
+    np.s_[10:90,1],
+    np.s_[50,:],
+    np.s_[50,2],
+    np.s_[0:0,:],
+    np.s_[-20:,1:3],
+    np.s_[[5,6,7,10,40,41,42,90,95,96,97], :],
+    np.s_[[87, 32, 59, 60, 61, 68, 3], 1],
+    np.s_[np.arange(100) % 3 == 0, ...],
+]
+
+@pytest.mark.parametrize("key", keys)
+def test_cached_getitem(dset, key):
+    expected = dset.arr[key]
+    # Read twice so that the second read can use cached blocks
+    assert_arrays_equal(expected, dset[key])
+    assert_arrays_equal(expected, dset[key])
+
+
+@pytest.mark.parametrize("key", [k for k in keys[:7] if k != np.s_[0:0,:]])
+def test_cached_read_direct(dset, key):
+    expected = dset.arr[key]
+    for dtype in (np.int64, np.float64):
+        actual = np.zeros(expected.shape, dtype=dtype)
+        dset.read_direct(actual, key)
+        assert_arrays_equal(expected.astype(dtype), actual)
+
+
+def test_cached_request_slices(dset):
+    slices = [np.s_[0:10,1:3], np.s_[12:15,1:3], np.s_[50:90,1:3]]
+    expected = np.concatenate([dset.arr[s] for s in slices], axis=0)
+    assert_arrays_equal(expected, dset.request_slices(slices))
+    actual = np.zeros_like(expected)
+    dset.request_slices(slices, dest=actual)
+    assert_arrays_equal(expected, actual)
+
+
+def test_cache_hits(cache_size):
+    cache_size(1024*1024, block_size=10*24)
+    dset = make_dataset()
+
+    # First read should request two blocks of ten rows in one request
+    assert_arrays_equal(dset.arr[5:15,:], dset[5:15,:])
+    assert dset.connection.nr_requests == 1
+    assert dset.connection.nr_elements == 60
+    stats = hdfstream.get_block_cache().stats()
+    assert stats["misses"] == 2 and stats["hits"] == 0
+    assert stats["nbytes"] == 20*24
+
+    # Second read is within the cached blocks, so should not make a request
+    assert_arrays_equal(dset.arr[10:20,1], dset[10:20,1])
+    assert dset.connection.nr_requests == 1
+    stats = hdfstream.get_block_cache().stats()
+    assert stats["misses"] == 2 and stats["hits"] == 1
+    assert stats["hit_bytes"] == 10*24
+
+    # Third read needs the cached block at 10-20 and one new block
+    assert_arrays_equal(dset.arr[15:25,:], dset[15:25,:])
+    assert dset.connection.nr_requests == 2
+    assert dset.connection.nr_elements == 90
+
+
+@pytest.mark.parametrize("split_size", [24, 10*24, 25*24, 1000*24])
+def test_cache_miss_split(cache_size, split_size):
+    # Missing blocks are requested in pieces no larger than split_size,
+    # apart from single blocks which can't be split
+    cache_size(1024*1024, block_size=10*24)
+    dset = make_dataset()
+    dset.split_size = split_size
+    sizes = []
+    request_slice = dset.connection.request_slice
+    def record_size(path, name, slice_descriptor):
+        data = request_slice(path, name, slice_descriptor)
+        sizes.append(data.nbytes)
+        return data
+    dset.connection.request_slice = record_size
+    key = np.s_[[5, 6, 7, 10, 40, 41, 42, 90, 95, 96, 97], :]
+    assert_arrays_equal(dset.arr[key], dset[key])
+    assert_arrays_equal(dset.arr[...], dset[...])
+    assert sum(sizes) == dset.arr.nbytes
+    assert max(sizes) <= max(split_size, 10*24)
+
+
+def test_cache_eviction(cache_size):
+    # Cache has space for two blocks of ten rows
+    cache_size(20*24, block_size=10*24)
+    dset = make_dataset()
+    dset[0:10,:]
+    dset[10:20,:]
+    dset[0,:] # makes block 0 the most recently used
+    dset[20:30,:] # should evict block 1
+    assert hdfstream.get_block_cache().stats()["evictions"] == 1
+    nr_requests = dset.connection.nr_requests
+    dset[0:10,:]
+    assert dset.connection.nr_requests == nr_requests
+    dset[10:20,:]
+    assert dset.connection.nr_requests == nr_requests + 1
+    assert hdfstream.get_block_cache().nbytes <= 20*24
+
+
+def test_cache_bypass(cache_size):
+    # Reads which don't fit in the cache go directly to the server
+    cache_size(20*24, block_size=10*24)
+    dset = make_dataset()
+    assert_arrays_equal(dset.arr[0:50,:], dset[0:50,:])
+    assert dset.connection.nr_elements == 150
+    assert hdfstream.get_block_cache().stats()["misses"] == 0
+
+
+def test_cache_key_includes_last_modified(cache_size):
+    cache_size(1024*1024)
+    old_dset = make_dataset(last_modified=1000)
+    old_dset[...]
+    # A modified file with the same name should not use the old blocks
+    new_dset = make_dataset(last_modified=2000)
+    new_dset.connection.connection.data = new_dset.arr + 1
+    assert_arrays_equal(new_dset.arr + 1, new_dset[...])
+    # Datasets with unknown modification time are never cached
+    dset = make_dataset(last_modified=None)
+    dset[...]
+    dset[...]
+    assert dset.connection.nr_requests == 2
+
+
+def test_cache_disabled():
+    dset = make_dataset()
+    dset[...]
+    dset[...]
+    assert dset.connection.nr_requests == 2
+
+
+def test_invalid_cache_size():
+    with pytest.raises(ValueError):
+        hdfstream.set_block_cache_size(-1)
+    with pytest.raises(ValueError):
+        hdfstream.set_block_cache_size(1024, block_size=0)
@@ -0,0 +1,82 @@
+#!/bin/env python
+
+import os
+import pytest
+
+import hdfstream
+import hdfstream.config
+import hdfstream.connection
+from hdfstream.config import get_config as real_get_config
+from hdfstream.connection import Connection
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    """
+    Use a config file in a temporary directory and count how many times it's read
+    """
+    filename = tmp_path / "config.yml"
+    monkeypatch.setattr(hdfstream.config, "_user_config_path", lambda: filename)
+    monkeypatch.setattr(hdfstream.config, "_config", None)
+    monkeypatch.setattr(hdfstream.config, "_config_version", None)
+    monkeypatch.setattr(hdfstream.config, "_config_explicit", False)
+    reads = []
+    read_user_config = hdfstream.config._read_user_config
+    def counting_read():
+        reads.append(1)
+        return read_user_config()
+    monkeypatch.setattr(hdfstream.config, "_read_user_config", counting_read)
+    return filename, reads
+
+
+def test_default_config_written(config_file):
+    filename, reads = config_file
+    config = real_get_config()
+    assert os.path.exists(filename)
+    assert "cosma" in config._alias
+    assert real_get_config() is config
+    assert len(reads) == 1 # only the failed read before writing the default file
+
+
+def test_config_reread_when_modified(config_file):
+    filename, reads = config_file
+    config = hdfstream.Config()
+    config.add_alias("first", "https://first.example.com")
+    config.write(filename)
+    assert "first" in real_get_config()._alias
+    assert "first" in real_get_config()._alias
+    assert len(reads) == 1
+
+    # Rewrite the file with a different size, so the change is detected
+    # even if the modification time resolution is coarse
+    config = hdfstream.Config()
+    config.add_alias("second_alias", "https://second.example.com")
+    config.write(filename, mode="w")
+    assert "second_alias" in real_get_config()._alias
+    assert len(reads) == 2
+
+
+def test_set_config_is_used(config_file):
+    filename, reads = config_file
+    config = hdfstream.Config()
+    hdfstream.config.set_config(config)
+    assert real_get_config() is config
+    assert len(reads) == 0
+
+
+def test_connection_new_skips_config(fake_session, monkeypatch):
+    config = hdfstream.Config()
+    config.add_alias("example", "https://example.com/hdfstream")
+    calls = []
+    def get_config():
+        calls.append(1)
+        return config
+    monkeypatch.setattr(hdfstream.connection, "get_config", get_config)
+    monkeypatch.setattr(Connection, "_cache", {})
+    conn = Connection.new("example", None)
+    for i in range(10):
+        assert Connection.new("example", None) is conn
+    assert len(calls) == 1
+    # Same server via its URL resolves to the same connection
+    assert Connection.new("https://example.com/hdfstream", None) is conn
+    assert len(calls) == 2
@@ -0,0 +1,150 @@
+#!/bin/env python
+
+import threading
+import h5py
+import numpy as np
+import pytest
+from itertools import product
+
+import hdfstream
+from hdfstream.remote_group import RemoteGroup
+from hdfstream.request_planner import RequestPlanner
+from dummy_dataset import DummyRemoteDataset, DummyConnection
+
+#
+# Tests of copying datasets to local HDF5 files in blocks
+#
+shapes = [(0,), (1,), (100,), (100, 3), (37, 2, 5)]
+block_sizes = [1, 24, 1000, 1024*1024]
+prefetch = [False, True]
+@pytest.mark.parametrize("shape,block_size,prefetch", list(product(shapes, block_sizes, prefetch)))
+def test_copy_blocks(tmp_path, shape, block_size, prefetch):
+    data = np.arange(np.prod(shape), dtype=np.int64).reshape(shape)
+    dset = DummyRemoteDataset("/filename", "objectname", data)
+    dset.attrs = {"a" : 1}
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        dset._copy_self(outfile, "copy", block_size=block_size, prefetch=prefetch)
+        assert outfile["copy"].dtype == data.dtype
+        assert outfile["copy"].shape == data.shape
+        assert np.all(outfile["copy"][...] == data)
+        assert outfile["copy"].attrs["a"] == 1
+
+
+def test_copy_blocks_are_bounded(tmp_path):
+    # Check that no request is larger than the block size
+    data = np.arange(3000, dtype=np.float64).reshape((1000, 3))
+    dset = DummyRemoteDataset("/filename", "objectname", data)
+    sizes = []
+    request_slice_into = dset.connection.request_slice_into
+    def record_size(path, name, slice_descriptor, destination):
+        sizes.append(destination.nbytes)
+        request_slice_into(path, name, slice_descriptor, destination)
+    dset.connection.request_slice_into = record_size
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        dset._copy_self(outfile, "copy", block_size=240, prefetch=True)
+        assert np.all(outfile["copy"][...] == data)
+    assert len(sizes) == 100
+    assert max(sizes) == 240
+
+
+def test_copy_blocks_with_options(tmp_path):
+    data = np.arange(3000, dtype=np.int32).reshape((1000, 3))
+    dset = DummyRemoteDataset("/filename", "objectname", data)
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        dset._copy_self(outfile, "copy", block_size=1000, chunks=(100, 3),
+                        compression="gzip", compression_opts=6, shuffle=True)
+        assert outfile["copy"].chunks == (100, 3)
+        assert outfile["copy"].compression == "gzip"
+        assert outfile["copy"].compression_opts == 6
+        assert np.all(outfile["copy"][...] == data)
+
+
+def test_copy_in_memory_dataset(tmp_path):
+    # Datasets which were downloaded with the metadata are copied in one go
+    data = np.arange(10, dtype=np.int64)
+    dset = DummyRemoteDataset("/filename", "objectname", data, cache=True)
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        dset._copy_self(outfile, "copy", compression="gzip")
+        assert outfile["copy"].compression == "gzip"
+        assert np.all(outfile["copy"][...] == data)
+
+
+#
+# Tests of copying groups with several datasets concurrently
+#
+class MultiDatasetConnection:
+    """
+    Fake connection which serves slices of several datasets
+    """
+    def __init__(self, arrays, barrier=None):
+        self.server = "https://dummy"
+        self.planner = RequestPlanner()
+        self.connections = {name : DummyConnection("/filename", name, arr) for name, arr in arrays.items()}
+        self.barrier = barrier
+        self.threads = set()
+
+    def request_slice(self, path, name, slice_descriptor):
+        return self.connections[name].request_slice(path, name, slice_descriptor)
+
+    def request_slice_into(self, path, name, slice_descriptor, destination):
+        self.threads.add(threading.get_ident())
+        if self.barrier is not None:
+            self.barrier.wait()
+        self.connections[name].request_slice_into(path, name, slice_descriptor, destination)
+
+
+def make_group(arrays, barrier=None):
+    connection = MultiDatasetConnection(arrays, barrier)
+    members = {}
+    for name, arr in arrays.items():
+        members[name[1:]] = {
+            "hdf5_object" : "dataset",
+            "attributes" : {"name" : name},
+            "type" : arr.dtype.str,
+            "kind" : "",
+            "shape" : list(arr.shape),
+        }
+    data = {"hdf5_object" : "group", "attributes" : {}, "members" : members}
+    return RemoteGroup(connection, "/filename", "/", data=data)
+
+
+def make_arrays(nr_datasets):
+    return {f"/dataset_{i}" : np.arange(100*i, dtype=np.float32).reshape((i, 100)) for i in range(nr_datasets)}
+
+
+@pytest.mark.parametrize("max_workers,prefetch,block_size", list(product([1, 2, 4], [False, True], [400, 4000, 10**6])))
+def test_copy_group(tmp_path, max_workers, prefetch, block_size):
+    arrays = make_arrays(10)
+    group = make_group(arrays)
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        report = group.copy(group, outfile, name="copy", max_workers=max_workers,
+                            prefetch=prefetch, block_size=block_size)
+        for name, arr in arrays.items():
+            assert np.all(outfile["copy"+name][...] == arr)
+            assert outfile["copy"+name].attrs["name"] == name
+    # Check the report
+    assert isinstance(report, hdfstream.CopyReport)
+    assert set(report.datasets) == set(["/copy"+name for name in arrays])
+    for name, arr in arrays.items():
+        nbytes, seconds = report.datasets["/copy"+name]
+        assert nbytes == arr.nbytes
+        assert seconds >= 0
+    assert report.total_bytes == sum(arr.nbytes for arr in arrays.values())
+
+
+def test_copy_group_concurrent(tmp_path):
+    # Will time out unless four datasets are downloaded at once
+    arrays = {name : arr for name, arr in make_arrays(5).items() if arr.size > 0}
+    group = make_group(arrays, barrier=threading.Barrier(4, timeout=10))
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        group.copy(group, outfile, name="copy", max_workers=4)
+        for name, arr in arrays.items():
+            assert np.all(outfile["copy"+name][...] == arr)
+    assert threading.get_ident() not in group.connection.threads
+
+
+def test_copy_group_invalid_workers(tmp_path):
+    group = make_group(make_arrays(2))
+    with h5py.File(tmp_path / "copy.hdf5", "w") as outfile:
+        with pytest.raises(ValueError):
+            group.copy(group, outfile, name="copy", max_workers=0)
@@ -0,0 +1,134 @@
+#!/bin/env python
+
+import io
+import tracemalloc
+import msgpack
+import numpy as np
+import pytest
+from tqdm import tqdm
+
+import hdfstream.decoding as decoding
+from hdfstream.streaming_decoder import StreamingDecoder
+
+
+def encode_ndarray(arr, max_bin_size=None):
+    """
+    Encode an array in the same way as the server: a map with the data
+    stored last as an array of one or more bin objects.
+    """
+    data = arr.tobytes()
+    if max_bin_size is None:
+        max_bin_size = max(1, len(data))
+    bins = [data[i:i+max_bin_size] for i in range(0, len(data), max_bin_size)]
+    return {
+        "nd" : True,
+        "type" : arr.dtype.str,
+        "kind" : "",
+        "shape" : list(arr.shape),
+        "nbytes" : arr.nbytes,
+        "data" : bins,
+    }
+
+
+def make_metadata(nr_datasets, nr_elements, max_bin_size=None):
+    """
+    Make a group with some datasets which have attributes and inline data
+    """
+    members = {}
+    for i in range(nr_datasets):
+        arr = np.arange(nr_elements, dtype=np.float64) + i
+        members[f"dataset_{i}"] = {
+            "hdf5_object" : "dataset",
+            "attributes" : {
+                "scale" : encode_ndarray(np.asarray(float(i))),
+                "description" : encode_ndarray(np.asarray(b"some text")),
+                "strings" : {"vlen" : True, "shape" : [2], "data" : ["a", "bc"]},
+            },
+            "type" : "<f8",
+            "kind" : "",
+            "shape" : [nr_elements],
+            "data" : encode_ndarray(arr, max_bin_size),
+        }
+    return {"hdf5_object" : "group", "attributes" : {}, "members" : members}
+
+
+def decode(data):
+    stream = StreamingDecoder(io.BytesIO(data))
+    with tqdm(disable=True) as progress:
+        return decoding.decode_generic(stream, "test", progress)
+
+
+def assert_same(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            assert_same(a[key], b[key])
+    elif isinstance(a, list):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            assert_same(x, y)
+    elif isinstance(a, np.ndarray):
+        assert a.dtype == b.dtype
+        assert a.shape == b.shape
+        assert np.all(a == b)
+    else:
+        assert type(a) == type(b)
+        assert a == b
+
+
+@pytest.fixture(params=[16, 1000, 1024*1024])
+def max_span(request, monkeypatch):
+    monkeypatch.setattr(decoding._GenericDecoder, "max_span", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("nr_datasets,nr_elements,max_bin_size", [(0, 0, None),
+                                                                  (1, 0, None),
+                                                                  (3, 1, None),
+                                                                  (10, 100, None),
+                                                                  (2, 1000, 3000),
+                                                                  (2, 1000, 8)])
+def test_decode_generic(max_span, nr_datasets, nr_elements, max_bin_size):
+    # Compare to decoding the whole message with msgpack
+    data = msgpack.packb(make_metadata(nr_datasets, nr_elements, max_bin_size))
+    expected = msgpack.unpackb(data, object_hook=decoding.decode_hook)
+    actual = decode(data)
+    assert_same(expected, actual)
+    # Arrays should be writable
+    for member in actual["members"].values():
+        member["data"][...] = 0
+
+
+@pytest.mark.parametrize("obj", [None, 1, -1, 2**40, 1.5, "a"*1000, b"b"*100000,
+                                 list(range(1000)), {"a" : [{"b" : None}]*100}])
+def test_decode_generic_other_types(max_span, obj):
+    data = msgpack.packb(obj)
+    assert_same(msgpack.unpackb(data), decode(data))
+
+
+def test_decode_generic_truncated(max_span):
+    data = msgpack.packb(make_metadata(2, 1000))
+    with pytest.raises(RuntimeError):
+        decode(data[:-10])
+
+
+def test_decode_generic_extra_data(max_span):
+    data = msgpack.packb(make_metadata(2, 1000))
+    with pytest.raises(RuntimeError):
+        decode(data + b"extra")
+
+
+def test_decode_generic_peak_memory():
+    # Peak memory use decoding a response with a large inline array should
+    # not be much more than the size of the array
+    nr_elements = 4*1024*1024
+    data = msgpack.packb(make_metadata(1, nr_elements))
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        result = decode(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    nbytes = result["members"]["dataset_0"]["data"].nbytes
+    assert peak < 1.5*nbytes
@@ -0,0 +1,128 @@
+#!/bin/env python
+
+import os
+import json
+import threading
+import numpy as np
+import pytest
+
+import hdfstream
+from hdfstream.remote_file import RemoteFile
+
+
+class RangeConnection:
+    """
+    Fake connection which serves byte ranges from a bytes object
+    """
+    def __init__(self, contents, fail_at=None):
+        self.server = "https://dummy"
+        self.contents = contents
+        self.fail_at = fail_at
+        self.ranges = []
+        self.lock = threading.Lock()
+
+    def request_path(self, path):
+        return {"type" : "application/octet-stream", "size" : len(self.contents), "last_modified" : 1234}
+
+    def download_range(self, path, start, stop, fileobj):
+        assert path == "/data/file.bin"
+        with self.lock:
+            self.ranges.append((start, stop))
+            if self.fail_at is not None and len(self.ranges) > self.fail_at:
+                raise hdfstream.HDFStreamRequestError("Connection lost")
+        fileobj.write(self.contents[start:stop])
+        return stop - start
+
+
+def make_contents(size):
+    return np.random.default_rng(0).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+@pytest.mark.parametrize("size", [0, 1, 99, 100, 1001])
+@pytest.mark.parametrize("workers", [1, 4])
+def test_download(tmp_path, size, workers):
+    contents = make_contents(size)
+    connection = RangeConnection(contents)
+    remote_file = RemoteFile(connection, "/data/file.bin")
+    local_path = tmp_path / "file.bin"
+    remote_file.download(local_path, workers=workers, chunk_size=100)
+    assert local_path.read_bytes() == contents
+    assert sorted(connection.ranges) == [(i, min(i+100, size)) for i in range(0, size, 100)]
+    assert not os.path.exists(f"{local_path}.hdfstream-download")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_download_resume(tmp_path, workers):
+    contents = make_contents(1000)
+    local_path = tmp_path / "file.bin"
+
+    # Interrupt the download after three chunks
+    connection = RangeConnection(contents, fail_at=3)
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        RemoteFile(connection, "/data/file.bin").download(local_path, workers=workers, chunk_size=100)
+    with open(f"{local_path}.hdfstream-download") as f:
+        done = json.load(f)["done"]
+    assert 0 < len(done) <= 3
+
+    # Resuming should only fetch the remaining chunks
+    connection = RangeConnection(contents)
+    RemoteFile(connection, "/data/file.bin").download(local_path, workers=workers, chunk_size=100)
+    assert local_path.read_bytes() == contents
+    assert len(connection.ranges) == 10 - len(done)
+    assert not any(start//100 in done for start, stop in connection.ranges)
+
+
+def test_download_no_resume(tmp_path):
+    contents = make_contents(1000)
+    local_path = tmp_path / "file.bin"
+    connection = RangeConnection(contents, fail_at=3)
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        RemoteFile(connection, "/data/file.bin").download(local_path, chunk_size=100)
+
+    # Changing the chunk size or setting resume=False starts again
+    for kwargs in ({"chunk_size" : 200}, {"chunk_size" : 100, "resume" : False}):
+        connection = RangeConnection(contents)
+        RemoteFile(connection, "/data/file.bin").download(local_path, **kwargs)
+        assert local_path.read_bytes() == contents
+        assert len(connection.ranges) == 1000 // kwargs["chunk_size"]
+
+
+def test_download_short_response(tmp_path):
+    # A range response with too few bytes is an error
+    connection = RangeConnection(make_contents(100))
+    connection.download_range = lambda path, start, stop, fileobj: stop - start - 1
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        RemoteFile(connection, "/data/file.bin").download(tmp_path / "file.bin", chunk_size=10)
+
+
+def test_download_invalid_workers(tmp_path):
+    connection = RangeConnection(make_contents(100))
+    with pytest.raises(ValueError):
+        RemoteFile(connection, "/data/file.bin").download(tmp_path / "file.bin", workers=0)
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_download_invalid_chunk_size(tmp_path, chunk_size):
+    connection = RangeConnection(make_contents(100))
+    with pytest.raises(ValueError):
+        RemoteFile(connection, "/data/file.bin").download(tmp_path / "file.bin", chunk_size=chunk_size)
+    assert connection.ranges == []
+
+
+def test_download_synced_before_recorded(tmp_path, monkeypatch):
+    # Each chunk must be flushed to disk before the sidecar lists it as done
+    contents = make_contents(300)
+    local_path = tmp_path / "file.bin"
+    sidecar = f"{local_path}.hdfstream-download"
+    synced = []
+    real_fsync = os.fsync
+    def fsync(fd):
+        with open(sidecar) as f:
+            done = json.load(f)["done"]
+        assert len(done) == len(synced)
+        synced.append(fd)
+        real_fsync(fd)
+    monkeypatch.setattr(os, "fsync", fsync)
+    RemoteFile(RangeConnection(contents), "/data/file.bin").download(local_path, chunk_size=100)
+    assert len(synced) == 3
+    assert local_path.read_bytes() == contents
@@ -0,0 +1,116 @@
+#!/bin/env python
+
+import socket
+import threading
+import http.server
+import pytest
+import requests
+
+import hdfstream
+import hdfstream.connection
+from hdfstream.connection import Connection
+from hdfstream.http_pool import PoolAdapter, make_adapter, socket_options
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"hello"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_connection_reuse(local_server):
+    session = requests.Session()
+    adapter = make_adapter(pool_size=4, keep_alive=30, socket_rcvbuf=1024*1024)
+    session.mount("http://", adapter)
+    for i in range(5):
+        assert session.get(local_server).content == b"hello"
+    assert adapter.pool_stats() == {"requests" : 5, "new_connections" : 1, "reused_connections" : 4}
+
+
+def test_concurrent_pool(local_server):
+    # With a blocking pool, no more than pool_size connections are opened
+    session = requests.Session()
+    adapter = make_adapter(pool_size=2, pool_block=True)
+    session.mount("http://", adapter)
+    def run():
+        for i in range(10):
+            session.get(local_server).content
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = adapter.pool_stats()
+    assert stats["requests"] == 40
+    assert stats["new_connections"] <= 2
+
+
+def test_socket_options():
+    nodelay = (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    assert nodelay in socket_options()
+    assert nodelay not in socket_options(tcp_nodelay=False)
+    options = socket_options(keep_alive=60, socket_rcvbuf=4096, socket_sndbuf=8192)
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in options
+    assert (socket.SOL_SOCKET, socket.SO_RCVBUF, 4096) in options
+    assert (socket.SOL_SOCKET, socket.SO_SNDBUF, 8192) in options
+
+
+def test_invalid_pool_size():
+    with pytest.raises(ValueError):
+        PoolAdapter(pool_size=0)
+
+
+def test_connection_pool_options(fake_session, monkeypatch):
+    config = hdfstream.Config()
+    config.add_alias("pooled", "https://pooled.example.com", pool_size=32, tcp_nodelay=False)
+    monkeypatch.setattr(hdfstream.connection, "get_config", lambda: config)
+    monkeypatch.setattr(Connection, "_cache", {})
+    conn = Connection.new("pooled", None)
+    assert conn.adapter._pool_maxsize == 32
+    assert conn.session.get_adapter("https://pooled.example.com/msgpack/") is conn.adapter
+    # Explicit options override the alias and give a separate connection
+    conn2 = Connection.new("pooled", None, pool_size=4, pool_block=True)
+    assert conn2 is not conn
+    assert conn2.adapter._pool_maxsize == 4
+    assert conn2.adapter._pool_block
+    assert Connection.new("pooled", None) is conn
+    with pytest.raises(KeyError):
+        Connection.new("pooled", None, no_such_option=1)
+
+
+def test_aliases_with_different_options(fake_session, monkeypatch):
+    # Aliases for the same server with different options don't share a connection
+    config = hdfstream.Config()
+    config.add_alias("small", "https://pooled.example.com", pool_size=2)
+    config.add_alias("large", "https://pooled.example.com", pool_size=64)
+    config.add_alias("plain", "https://pooled.example.com")
+    config.add_alias("same", "https://pooled.example.com", pool_size=64)
+    monkeypatch.setattr(hdfstream.connection, "get_config", lambda: config)
+    monkeypatch.setattr(Connection, "_cache", {})
+    small = Connection.new("small", None)
+    large = Connection.new("large", None)
+    plain = Connection.new("https://pooled.example.com", None)
+    assert small.adapter._pool_maxsize == 2
+    assert large.adapter._pool_maxsize == 64
+    assert plain is not small and plain is not large
+    assert Connection.new("plain", None) is plain
+    assert Connection.new("same", None) is large
+    assert Connection.new("small", None, pool_size=64) is large
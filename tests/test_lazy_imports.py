@@ -0,0 +1,29 @@
+#!/bin/env python
+
+import sys
+import subprocess
+import pytest
+
+import hdfstream
+
+# Modules which are slow to import and should only be imported when needed
+slow_modules = ["keyring", "h5py", "tqdm", "yaml", "platformdirs", "asyncio"]
+
+
+def test_slow_modules_not_imported():
+    code = f"import sys, hdfstream; print([m for m in {slow_modules!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_lazy_names():
+    assert isinstance(hdfstream.__version__, str)
+    for name in ("async_open", "AsyncRemoteFile", "set_max_async_requests"):
+        assert name in dir(hdfstream)
+        assert getattr(hdfstream, name) is getattr(hdfstream.aio, name)
+    assert set(hdfstream.__all__) - {"testing", "util"} <= set(dir(hdfstream))
+
+
+def test_missing_attribute():
+    with pytest.raises(AttributeError):
+        hdfstream.no_such_name
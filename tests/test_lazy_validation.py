@@ -0,0 +1,73 @@
+#!/bin/env python
+
+import getpass
+import msgpack
+import keyring
+import pytest
+
+import hdfstream
+import hdfstream.connection
+from hdfstream.connection import Connection
+from fake_http import FakeResponse
+
+
+def respond(session, method, url, **kwargs):
+    # Server which accepts only the password "secret"
+    if session.auth is not None and session.auth.password != "secret":
+        return FakeResponse(401)
+    return FakeResponse(200, msgpack.packb({"type" : "directory", "directories" : {}, "files" : {}}))
+
+
+def request_urls(conn):
+    return [url for method, url in conn.session.requests]
+
+
+@pytest.fixture
+def fake_server(fake_session, monkeypatch):
+    config = hdfstream.Config()
+    config.add_alias("lazy", "https://lazy.example.com", lazy_validation=True)
+    config.add_alias("eager", "https://eager.example.com")
+    monkeypatch.setattr(hdfstream.connection, "get_config", lambda: config)
+    fake_session.handler = respond
+    monkeypatch.setattr(Connection, "_cache", {})
+
+
+def test_eager_validation(fake_server):
+    conn = Connection.new("eager", None)
+    assert request_urls(conn) == ["https://eager.example.com/msgpack/"]
+    assert conn.validated
+
+
+def test_lazy_validation(fake_server):
+    conn = Connection.new("lazy", None)
+    assert request_urls(conn) == []
+    assert not conn.validated
+    conn.request_path("/")
+    assert request_urls(conn) == ["https://lazy.example.com/msgpack/"]
+    assert conn.validated
+
+
+def test_lazy_validation_keyring(fake_server, monkeypatch):
+    # Password should only be stored after a request succeeds
+    stored = {}
+    monkeypatch.setattr(keyring, "get_password", lambda server, user: None)
+    monkeypatch.setattr(keyring, "set_password", lambda server, user, pw: stored.update({user : pw}))
+    monkeypatch.setattr(getpass, "getpass", lambda: "secret")
+    conn = Connection("https://lazy.example.com", user="user", password=None, use_keyring=True,
+                      lazy_validation=True)
+    assert stored == {}
+    conn.request_path("/")
+    assert stored == {"user" : "secret"}
+
+
+def test_lazy_validation_wrong_password(fake_server):
+    # Connection with rejected credentials is not reused
+    conn = Connection.new("lazy", "user", password="wrong")
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        conn.request_path("/")
+    assert not conn.validated
+    conn2 = Connection.new("lazy", "user", password="secret")
+    assert conn2 is not conn
+    conn2.request_path("/")
+    assert conn2.validated
+    assert Connection.new("lazy", "user") is conn2
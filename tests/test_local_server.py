@@ -0,0 +1,73 @@
+#!/bin/env python
+#
+# Check that the stand-in server used by the benchmarks behaves like the
+# real one, by reading small generated files through it.
+#
+
+import h5py
+import numpy as np
+import pytest
+
+import hdfstream
+from local_server import LocalServer, make_snapshot, make_tree
+
+
+@pytest.fixture(scope="module")
+def local_server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("local_server")
+    (root / "sims").mkdir()
+    make_snapshot(root / "sims" / "snapshot.hdf5", 1000)
+    make_tree(root / "sims" / "tree.hdf5", fanout=2, depth=2, nr_datasets=2)
+    with LocalServer(root) as server:
+        yield server, root
+
+
+def open_file(local_server, filename, **kwargs):
+    server, root = local_server
+    return hdfstream.open(server.url, "/sims", **kwargs)[filename]
+
+
+def test_directory_listing(local_server):
+    server, root = local_server
+    directory = hdfstream.open(server.url, "/")
+    assert list(directory.directories) == ["sims"]
+    assert sorted(directory["sims"].files) == ["snapshot.hdf5", "tree.hdf5"]
+
+
+def test_dataset_slices(local_server):
+    server, root = local_server
+    remote = open_file(local_server, "snapshot.hdf5", data_size_limit=0)
+    with h5py.File(root / "sims" / "snapshot.hdf5", "r") as local:
+        pos = local["PartType1/Coordinates"][...]
+        ids = local["PartType1/ParticleIDs"][...]
+        assert remote["Header"].attrs["BoxSize"] == local["Header"].attrs["BoxSize"]
+    assert np.all(remote["PartType1/Coordinates"][100:200, 1:] == pos[100:200, 1:])
+    index = [5, 3, 900, 17, 18, 19]
+    assert np.all(remote["PartType1/ParticleIDs"][index] == ids[index])
+    result = remote["PartType1/Coordinates"].request_slices([np.s_[0:10,:], np.s_[500:510,:]])
+    assert np.all(result == np.concatenate([pos[0:10, :], pos[500:510, :]]))
+
+
+@pytest.mark.parametrize("max_depth", [0, 1, 5])
+def test_tree(local_server, max_depth):
+    server, root = local_server
+    remote = open_file(local_server, "tree.hdf5", max_depth=max_depth)
+    names = []
+    remote["/"].visit(names.append)
+    with h5py.File(root / "sims" / "tree.hdf5", "r") as local:
+        expected = []
+        local.visit(expected.append)
+        assert sorted(names) == sorted(expected)
+        assert np.all(remote["group1/group0/data1"][...] == local["group1/group0/data1"][...])
+
+
+def test_copy_and_download(local_server, tmp_path):
+    server, root = local_server
+    remote = open_file(local_server, "snapshot.hdf5")
+    with h5py.File(tmp_path / "copy.hdf5", "w") as dest:
+        remote["/"].copy("PartType1", dest)
+        with h5py.File(root / "sims" / "snapshot.hdf5", "r") as local:
+            assert np.all(dest["PartType1/Velocity"][...] == local["PartType1/Velocity"][...])
+    remote.download(tmp_path / "snapshot.hdf5", chunk_size=4096, workers=2)
+    with open(tmp_path / "snapshot.hdf5", "rb") as f1, open(root / "sims" / "snapshot.hdf5", "rb") as f2:
+        assert f1.read() == f2.read()
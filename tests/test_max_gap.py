@@ -0,0 +1,63 @@
+#!/bin/env python
+
+import numpy as np
+import pytest
+from itertools import product
+
+import hdfstream.slice_utils as su
+from dummy_dataset import DummyRemoteDataset
+from utils import assert_arrays_equal
+
+#
+# Tests of merging nearby ranges when indexing with an array
+#
+@pytest.mark.parametrize("max_gap,expected_starts,expected_counts", [
+    (0,  [0, 5, 10, 30], [2, 1, 3, 1]),
+    (2,  [0, 5, 10, 30], [2, 1, 3, 1]),
+    (3,  [0, 10, 30],    [6, 3, 1]),
+    (4,  [0, 30],        [13, 1]),
+    (16, [0, 30],        [13, 1]),
+    (17, [0],            [31]),
+])
+def test_merge_slices_max_gap(max_gap, expected_starts, expected_counts):
+    starts = [0, 1, 5, 10, 11, 12, 30]
+    counts = [1, 1, 1, 1, 1, 1, 1]
+    starts, counts = su.merge_slices(starts, counts, max_gap)
+    assert np.all(starts == expected_starts)
+    assert np.all(counts == expected_counts)
+
+
+max_gap = [0, 1, 2, 5, 1000]
+max_nr_slices = [1, 3, 100]
+@pytest.fixture(params=list(product(max_gap, max_nr_slices)))
+def dset_2d(request):
+    max_gap, max_nr_slices = request.param
+    data = np.arange(300, dtype=int).reshape((100, 3))
+    return DummyRemoteDataset("/filename", "objectname", data, max_nr_slices=max_nr_slices,
+                              max_gap=max_gap)
+
+keys = [
+    np.s_[[], :],
+    np.s_[[5], :],
+    np.s_[[5,6,7,10,40,41,42,90,95,96,97], :],
+    np.s_[[97,96,95,90,42,41,40,10,7,6,5], 1],
+    np.s_[[5,6,6,6,7,10,40,41,42,90,90,95,96,97], 0:2],
+    np.s_[[-1, 0, -1, 50, 3], ...],
+    np.s_[np.arange(0, 100, 2), :],
+    np.s_[np.arange(100) % 7 == 0, 2],
+]
+
+@pytest.mark.parametrize("key", keys)
+def test_max_gap_index(dset_2d, key):
+    expected = dset_2d.arr[key]
+    actual = dset_2d[key]
+    assert_arrays_equal(expected, actual)
+
+
+def test_max_gap_reduces_ranges():
+    # Every other element should be read as a single range with max_gap=1
+    index = np.arange(0, 100, 2)
+    assert len(su.ArrayIndexedSlice((100,), (index,)).starts) == 50
+    nd_slice = su.ArrayIndexedSlice((100,), (index,), max_gap=1)
+    assert np.all(nd_slice.starts == [0])
+    assert np.all(nd_slice.counts == [99])
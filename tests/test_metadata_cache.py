@@ -0,0 +1,178 @@
+#!/bin/env python
+
+import copy
+import time
+import msgpack
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.metadata_cache as metadata_cache
+from hdfstream.connection import Connection
+from hdfstream.remote_group import RemoteGroup
+from utils import assert_arrays_equal
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    hdfstream.enable_metadata_cache(cache_dir=tmp_path)
+    yield tmp_path
+    hdfstream.enable_metadata_cache(False)
+
+
+class CountingConnection(Connection):
+    """
+    Connection which returns canned responses instead of making requests
+    """
+    def __init__(self, responses, user=None):
+        self.server = "https://dummy"
+        self.user = user
+        self.responses = responses
+        self.nr_requests = 0
+
+    def post_and_unpack(self, url, params=None, desc=None):
+        self.nr_requests += 1
+        name = params["object"] if params is not None else url
+        return copy.deepcopy(self.responses[name])
+
+
+def make_group_data():
+    dataset = {
+        "hdf5_object" : "dataset",
+        "attributes" : {
+            "scale" : np.asarray(1.5),
+            "units" : np.asarray(b"cm"),
+            "strings" : np.asarray(["a", "bc"], dtype=object),
+            "pair" : np.zeros(2, dtype=[("a", "<i4"), ("b", "<f8")]),
+        },
+        "type" : "<f8",
+        "kind" : "",
+        "shape" : [10],
+        "data" : np.arange(10, dtype=np.float64),
+    }
+    return {
+        "hdf5_object" : "group",
+        "attributes" : {"count" : np.asarray([1, 2, 3], dtype=np.int32)},
+        "members" : {"dataset" : dataset, "subgroup" : None},
+    }
+
+
+def assert_same(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            assert_same(a[key], b[key])
+    elif isinstance(a, np.ndarray):
+        assert_arrays_equal(a, b)
+        assert b.flags.writeable
+    else:
+        assert a == b
+
+
+def test_round_trip(cache_dir):
+    data = make_group_data()
+    metadata_cache.store_object("server", None, "file", "/", 0, 1, 1000, data)
+    assert_same(data, metadata_cache.load_object("server", None, "file", "/", 0, 1, 1000))
+    # Entries with a different modification time or parameters should not be found
+    assert metadata_cache.load_object("server", None, "file", "/", 0, 1, 1001) is None
+    assert metadata_cache.load_object("server", None, "file", "/", 0, 2, 1000) is None
+    # Entries are not cached if the modification time is unknown
+    metadata_cache.store_object("server", None, "file", "/", 0, 1, None, data)
+    assert metadata_cache.load_object("server", None, "file", "/", 0, 1, None) is None
+
+
+def test_cache_disabled(tmp_path):
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    assert metadata_cache.load_path("server", None, "dir") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_corrupt_entry(cache_dir):
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    for filename in cache_dir.glob("*.msgpack"):
+        filename.write_bytes(b"\xc1 not msgpack")
+    assert metadata_cache.load_path("server", None, "dir") is None
+
+
+@pytest.mark.parametrize("entry", [{"data" : {"type" : "directory"}},
+                                   {"time" : "yesterday", "data" : {"type" : "directory"}},
+                                   {"time" : 0.0}])
+def test_malformed_entry(cache_dir, entry):
+    # Entries with missing or invalid fields are treated as misses
+    entry["key"] = repr(("path", "server", None, "dir"))
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    for filename in cache_dir.glob("*.msgpack"):
+        filename.write_bytes(msgpack.packb(entry))
+    assert metadata_cache.load_path("server", None, "dir") is None
+
+
+def test_store_failure(cache_dir, monkeypatch):
+    # Failing to write an entry is not an error and leaves no temporary files
+    def fail(*args):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(metadata_cache.os, "replace", fail)
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    assert list(cache_dir.iterdir()) == []
+    assert metadata_cache.load_path("server", None, "dir") is None
+
+
+def test_cache_dir_removed(cache_dir):
+    # Requests still work if the cache directory is deleted
+    cache_dir.rmdir()
+    connection = CountingConnection({"/" : make_group_data()})
+    root = RemoteGroup(connection, "/file.hdf5", "/", last_modified=1000)
+    assert_arrays_equal(root["dataset"][...], np.arange(10, dtype=np.float64))
+    assert connection.nr_requests == 1
+
+
+def test_cache_per_user(cache_dir):
+    # Metadata fetched by one user must not be returned to another
+    metadata_cache.store_path("server", "alice", "dir", {"type" : "directory"})
+    assert metadata_cache.load_path("server", "alice", "dir") == {"type" : "directory"}
+    assert metadata_cache.load_path("server", "bob", "dir") is None
+    assert metadata_cache.load_path("server", None, "dir") is None
+    responses = {"/" : make_group_data()}
+    for user, nr_requests in (("alice", 1), ("bob", 1), (None, 1), ("alice", 0)):
+        connection = CountingConnection(responses, user=user)
+        root = RemoteGroup(connection, "/file.hdf5", "/", last_modified=1000)
+        assert_arrays_equal(root["dataset"][...], np.arange(10, dtype=np.float64))
+        assert connection.nr_requests == nr_requests
+
+
+def test_path_max_age(cache_dir):
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    assert metadata_cache.load_path("server", None, "dir") == {"type" : "directory"}
+    hdfstream.enable_metadata_cache(cache_dir=cache_dir, max_age=0.0)
+    time.sleep(0.01)
+    assert metadata_cache.load_path("server", None, "dir") is None
+
+
+def test_clear(cache_dir):
+    metadata_cache.store_path("server", None, "dir", {"type" : "directory"})
+    hdfstream.clear_metadata_cache()
+    assert metadata_cache.load_path("server", None, "dir") is None
+
+
+def test_cached_requests(cache_dir):
+    subgroup = {"hdf5_object" : "group", "attributes" : {}, "members" : {}}
+    responses = {"/" : make_group_data(), "/subgroup" : subgroup}
+
+    # First process: requests should go to the server
+    connection = CountingConnection(responses)
+    root = RemoteGroup(connection, "/file.hdf5", "/", last_modified=1000)
+    assert_arrays_equal(root["dataset"][...], np.arange(10, dtype=np.float64))
+    assert root["subgroup"].name == "/subgroup"
+    assert connection.nr_requests == 2
+
+    # Later process: results should come from the cache
+    connection = CountingConnection(responses)
+    root = RemoteGroup(connection, "/file.hdf5", "/", last_modified=1000)
+    assert_arrays_equal(root["dataset"][...], np.arange(10, dtype=np.float64))
+    assert root["dataset"].attrs["scale"] == 1.5
+    assert root["subgroup"].name == "/subgroup"
+    assert connection.nr_requests == 0
+
+    # Modified file should be requested again
+    root = RemoteGroup(connection, "/file.hdf5", "/", last_modified=2000)
+    root["subgroup"]
+    assert connection.nr_requests == 2
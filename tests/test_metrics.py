@@ -0,0 +1,103 @@
+#!/bin/env python
+
+import time
+import msgpack
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.connection
+import hdfstream.metrics as metrics
+from hdfstream.connection import Connection, encode_array
+from hdfstream.retry import RetryPolicy
+from fake_http import FakeResponse
+
+
+@pytest.fixture
+def connection(fake_session, monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda t: None)
+    records = []
+    hdfstream.add_request_hook(records.append)
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01), lazy_validation=True)
+    yield conn, records
+    hdfstream.remove_request_hook(records.append)
+
+
+def packed(data):
+    return msgpack.packb(data, default=encode_array)
+
+
+def test_request_records(connection):
+    conn, records = connection
+    arr = np.arange(100, dtype=np.int64)
+    conn.session.responses += [
+        FakeResponse(200, packed({"type" : "directory"})),
+        FakeResponse(200, packed({"hdf5_object" : "group"})),
+        FakeResponse(200, packed(arr)),
+    ]
+    conn.request_path("/dir")
+    conn.request_object("/dir/file.hdf5", "/group", 0, 1)
+    destination = np.zeros_like(arr)
+    conn.request_slice_into("/dir/file.hdf5", "/group/data", [[[0, 50], [10, 90]]], destination)
+    assert [r.kind for r in records] == ["path", "object", "slice"]
+    assert [r.name for r in records] == [None, "/group", "/group/data"]
+    assert records[2].nr_slices == 2
+    assert records[2].url == "https://dummy/msgpack/dir/file.hdf5"
+    for record, response_size in zip(records, (len(packed({"type" : "directory"})),
+                                               len(packed({"hdf5_object" : "group"})),
+                                               len(packed(arr)))):
+        assert record.method == "POST"
+        assert record.status == 200
+        assert record.error is None
+        assert record.request_bytes > 0
+        assert record.response_bytes == response_size
+        assert 0 <= record.ttfb <= record.elapsed
+        assert 0 <= record.decode_time <= record.elapsed
+
+
+def test_failed_requests_recorded(connection):
+    conn, records = connection
+    conn.session.responses += [FakeResponse(503), FakeResponse(200, packed({"type" : "file"}))]
+    conn.request_path("/file")
+    assert [r.status for r in records] == [503, 200]
+    assert records[0].error == "HTTPError"
+    assert records[1].error is None
+
+
+def test_request_metrics(connection):
+    conn, records = connection
+    request_metrics = hdfstream.RequestMetrics()
+    hdfstream.add_request_hook(request_metrics)
+    try:
+        conn.session.responses += [FakeResponse(503)] + [FakeResponse(200, packed({"type" : "file"})) for i in range(3)]
+        for i in range(3):
+            conn.request_path(f"/file{i}")
+    finally:
+        hdfstream.remove_request_hook(request_metrics)
+    totals = request_metrics.totals["path"]
+    assert totals["requests"] == 4
+    assert totals["errors"] == 1
+    assert totals["request_bytes"] == sum(r.request_bytes for r in records)
+    summary = request_metrics.summary()
+    assert "path" in summary and "Mean TTFB" in summary
+    request_metrics.clear()
+    assert len(request_metrics.totals) == 0
+
+
+def test_enable_request_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", None)
+    monkeypatch.setattr(metrics, "_hooks", [])
+    request_metrics = hdfstream.enable_request_metrics()
+    assert hdfstream.enable_request_metrics() is request_metrics
+    assert metrics._hooks == [request_metrics]
+
+
+def test_no_hooks_no_record():
+    with metrics.record_request("GET", "path", "https://dummy") as record:
+        assert record is metrics._null_record
+
+
+@pytest.mark.parametrize("descriptor,count", [(None, 0), ([], 0), ([[5, 2]], 1), ([[[1, 2, 3], [1, 1, 1]]], 3),
+                                              ([[np.arange(4), np.ones(4)], [0, 3]], 4)])
+def test_slice_count(descriptor, count):
+    assert metrics.slice_count(descriptor) == count
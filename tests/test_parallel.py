@@ -0,0 +1,108 @@
+#!/bin/env python
+
+import threading
+import numpy as np
+import pytest
+from itertools import product
+
+import hdfstream
+import hdfstream.parallel as parallel
+from dummy_dataset import DummyRemoteDataset
+from utils import assert_arrays_equal
+
+@pytest.fixture
+def max_workers():
+    # Restore the default number of workers after each test
+    yield parallel.set_max_workers
+    parallel.set_max_workers(1)
+
+# Read 2D datasets with array indexes split over several concurrent requests
+max_nr_slices = [1, 3, 100]
+nr_workers    = [1, 2, 8]
+@pytest.fixture(params=list(product(max_nr_slices, nr_workers)))
+def dset_2d(request, max_workers):
+    max_nr_slices, nr_workers = request.param
+    max_workers(nr_workers)
+    data = np.arange(300, dtype=int).reshape((100, 3))
+    return DummyRemoteDataset("/filename", "objectname", data, max_nr_slices=max_nr_slices)
+
+keys = [
+    np.s_[[5,6,7,10,40,41,42,90,95,96,97], :],
+    np.s_[[87, 32, 59, 60, 61, 68, 3], 1],
+    np.s_[np.arange(100)[::-1], 0:2],
+    np.s_[np.arange(100) % 3 == 0, ...],
+]
+
+@pytest.mark.parametrize("key", keys)
+def test_concurrent_array_index(dset_2d, key):
+    expected = dset_2d.arr[key]
+    actual = dset_2d[key]
+    assert_arrays_equal(expected, actual)
+
+def test_run_requests_uses_threads(max_workers):
+    max_workers(4)
+    barrier = threading.Barrier(4, timeout=10)
+    def func(i):
+        # Will time out unless four calls are running at once
+        barrier.wait()
+        return 2*i
+    assert parallel.run_requests(func, [(i,) for i in range(4)]) == [0, 2, 4, 6]
+
+def test_run_requests_error(max_workers):
+    max_workers(4)
+    def func(i):
+        if i == 5:
+            raise hdfstream.HDFStreamRequestError("Failed")
+        return i
+    with pytest.raises(hdfstream.HDFStreamRequestError):
+        parallel.run_requests(func, [(i,) for i in range(10)])
+
+def test_invalid_max_workers():
+    with pytest.raises(ValueError):
+        hdfstream.set_max_workers(0)
+
+# Read large simple slices split into several requests
+split_size = [None, 1, 8, 24, 100, 10000]
+@pytest.fixture(params=list(product(split_size, nr_workers)))
+def dset_split(request, max_workers):
+    split_size, nr_workers = request.param
+    max_workers(nr_workers)
+    data = np.arange(300, dtype=np.int64).reshape((100, 3))
+    return DummyRemoteDataset("/filename", "objectname", data, split_size=split_size)
+
+split_keys = [
+    np.s_[...],
+    np.s_[10:90,:],
+    np.s_[10:90,1],
+    np.s_[50,:],
+    np.s_[0:0,:],
+    np.s_[-20:,1:3],
+]
+
+@pytest.mark.parametrize("key", split_keys)
+def test_split_slice(dset_split, key):
+    expected = dset_split.arr[key]
+    actual = dset_split[key]
+    assert_arrays_equal(expected, actual)
+
+@pytest.mark.parametrize("key", [k for k in split_keys if k != np.s_[0:0,:]])
+def test_split_read_direct(dset_split, key):
+    expected = dset_split.arr[key]
+    actual = np.zeros_like(expected)
+    dset_split.read_direct(actual, key)
+    assert_arrays_equal(expected, actual)
+
+def test_split_requests_are_bounded(dset_split):
+    # Check that no request returns more than split_size bytes, unless
+    # a single row is larger than that
+    sizes = []
+    request_slice_into = dset_split.connection.request_slice_into
+    def record_size(path, name, slice_descriptor, destination):
+        sizes.append(destination.nbytes)
+        request_slice_into(path, name, slice_descriptor, destination)
+    dset_split.connection.request_slice_into = record_size
+    dset_split.read_direct(np.zeros((100, 3), dtype=np.int64))
+    row_size = 3*8
+    if dset_split.split_size is not None:
+        assert max(sizes) <= max(row_size, dset_split.split_size)
+    assert sum(sizes) == 300*8
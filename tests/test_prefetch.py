@@ -0,0 +1,88 @@
+#!/bin/env python
+
+import asyncio
+import h5py
+import pytest
+
+import hdfstream
+from local_server import LocalServer, make_tree
+
+
+@pytest.fixture(scope="module")
+def local_server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("prefetch")
+    make_tree(root / "tree.hdf5", fanout=3, depth=3, nr_datasets=2)
+    with h5py.File(root / "tree.hdf5", "a") as f:
+        f["group1"]["link"] = h5py.SoftLink("/group2/group0")
+    with LocalServer(root) as server:
+        yield server
+
+
+@pytest.fixture
+def request_count():
+    metrics = hdfstream.RequestMetrics()
+    hdfstream.add_request_hook(metrics)
+    yield lambda: sum(t["requests"] for t in metrics.totals.values())
+    hdfstream.remove_request_hook(metrics)
+
+
+def open_tree(server, max_depth=0):
+    return hdfstream.open(server.url, "/tree.hdf5", max_depth=max_depth, lazy_validation=True)
+
+
+paths = ["group0/group1/data0", "/group0/group2", "group2/group1/group0/data1", "group1/data0",
+         "group1/link/data1"]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_prefetch(local_server, request_count, max_workers):
+    remote = open_tree(local_server)
+    nr_requests = request_count()
+    remote.prefetch(paths, max_workers=max_workers)
+    # One request for each object on the paths, one level at a time: the
+    # root group, then three groups, then five objects including the soft
+    # link, then three objects including the link target, then two datasets
+    assert request_count() == nr_requests + 1 + 3 + 5 + 3 + 2
+    nr_requests = request_count()
+    for path in paths:
+        remote[path]
+    assert remote["group1/link"].name == "/group2/group0"
+    assert request_count() == nr_requests
+
+
+def test_prefetch_loaded_objects(local_server, request_count):
+    # With max_depth=2 the first two levels arrive with the root group
+    remote = open_tree(local_server, max_depth=2)
+    nr_requests = request_count()
+    remote.prefetch(paths)
+    assert request_count() == nr_requests + 1 + 3
+    remote.prefetch(paths)
+    assert request_count() == nr_requests + 4
+
+
+def test_prefetch_group(local_server, request_count):
+    group = open_tree(local_server)["group2"]
+    nr_requests = request_count()
+    group.prefetch(["group1/data0", "../group0/data1"])
+    assert request_count() == nr_requests + 4
+    assert group["../group0/data1"].name == "/group0/data1"
+    assert group["group1/data0"].name == "/group2/group1/data0"
+    assert request_count() == nr_requests + 4
+
+
+@pytest.mark.parametrize("path", ["group0/missing", "group0/data0/data1"])
+def test_prefetch_missing(local_server, path):
+    remote = open_tree(local_server)
+    with pytest.raises(KeyError):
+        remote.prefetch([path])
+
+
+def test_async_prefetch(local_server, request_count):
+    async def prefetch():
+        remote = await hdfstream.async_open(local_server.url, "/tree.hdf5", max_depth=0)
+        await remote.prefetch(paths)
+        return remote
+    remote = asyncio.run(prefetch())
+    nr_requests = request_count()
+    remote.obj["group2/group1/group0/data1"]
+    assert request_count() == nr_requests
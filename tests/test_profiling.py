@@ -0,0 +1,86 @@
+#!/bin/env python
+
+import random
+import msgpack
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.connection
+import hdfstream.profiling as profiling
+from hdfstream.connection import Connection, encode_array
+from hdfstream.decoding import decode_hook
+from hdfstream.remote_dataset import RemoteDataset
+from fake_http import FakeResponse
+
+
+def respond(session, method, url, data=None, **kwargs):
+    # Return slices of np.arange(100)
+    starts, counts = msgpack.unpackb(data, object_hook=decode_hook)["slice"][0]
+    starts, counts = np.atleast_1d(starts), np.atleast_1d(counts)
+    result = np.concatenate([np.arange(s, s+c, dtype=np.int64) for s, c in zip(starts, counts)])
+    body = msgpack.packb(result, default=encode_array)
+    session.response_bytes.append(len(body))
+    return FakeResponse(200, body)
+
+
+@pytest.fixture
+def dataset(fake_session):
+    fake_session.handler = respond
+    fake_session.response_bytes = []
+    conn = Connection("https://dummy", lazy_validation=True)
+    data = {"attributes" : {}, "type" : "int64", "kind" : "dataset", "shape" : [100]}
+    return RemoteDataset(conn, "/file.hdf5", "/data", data, None)
+
+
+def test_profile_stages(dataset):
+    with hdfstream.profile() as prof:
+        data = dataset[[50, 7, 3]]
+    assert np.all(data == [50, 7, 3])
+    result = prof.as_dict()
+    for stage in profiling.stages:
+        assert result[stage]["calls"] == 1
+        assert result[stage]["time"] >= 0
+    assert result["encode"]["bytes"] > 0
+    assert result["decode"]["bytes"] == dataset.connection.session.response_bytes[0]
+    assert result["reorder"]["bytes"] == data.nbytes
+    assert result["wall_time"] >= sum(result[stage]["time"] for stage in profiling.stages)
+    summary = prof.summary()
+    for stage in profiling.stages:
+        assert stage in summary
+
+
+def test_profile_stops(dataset):
+    with hdfstream.profile() as prof:
+        dataset[0:10]
+    dataset[0:10]
+    assert prof.as_dict()["parse"]["calls"] == 1
+    assert profiling.stage("parse") is profiling._null_stage
+
+
+def test_nested_profiles(dataset):
+    with hdfstream.profile() as outer:
+        dataset[0:10]
+        with hdfstream.profile() as inner:
+            dataset[0:10]
+    assert outer.as_dict()["decode"]["calls"] == 2
+    assert inner.as_dict()["decode"]["calls"] == 1
+
+
+def test_sampling(dataset, monkeypatch):
+    samples = iter([0.1, 0.9]*10)
+    monkeypatch.setattr(random, "random", lambda: next(samples))
+    with hdfstream.profile(sample_rate=0.5) as prof:
+        for i in range(4):
+            with profiling.stage("parse") as stage:
+                stage.add_bytes(10)
+    result = prof.as_dict()
+    assert result["parse"]["calls"] == 4
+    assert result["parse"]["bytes"] == 40
+    assert "Estimated" in prof.summary()
+
+
+@pytest.mark.parametrize("sample_rate", [0.0, -1.0, 1.5])
+def test_invalid_sample_rate(sample_rate):
+    with pytest.raises(ValueError):
+        hdfstream.Profile(sample_rate)
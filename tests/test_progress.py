@@ -0,0 +1,82 @@
+#!/bin/env python
+
+import msgpack
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.decoding as decoding
+from hdfstream.connection import encode_array
+from fake_http import FakeResponse
+from hdfstream.progress import NullProgress, DeferredProgress
+
+
+class RecordingProgress(NullProgress):
+    """
+    Progress reporter which records the updates it receives
+    """
+    instances = []
+
+    def __init__(self, desc=None):
+        super().__init__(desc)
+        self.desc = desc
+        self.updates = []
+        RecordingProgress.instances.append(self)
+
+    def update(self, n):
+        self.updates.append(n)
+
+
+@pytest.fixture
+def recording_progress():
+    RecordingProgress.instances = []
+    hdfstream.set_progress_reporter(RecordingProgress)
+    yield RecordingProgress.instances
+    hdfstream.set_progress_reporter(None)
+
+
+@pytest.mark.parametrize("data", [np.arange(10, dtype=np.int64), {"a" : 1, "b" : [1, 2, 3]}])
+def test_custom_reporter(recording_progress, data):
+    body = msgpack.packb(data, default=encode_array)
+    decoding.decode_response(FakeResponse(200, body), "Test request")
+    assert len(recording_progress) == 1
+    progress = recording_progress[0]
+    assert progress.desc == "Test request"
+    assert sum(progress.updates) <= len(body)
+    if isinstance(data, np.ndarray):
+        assert progress.total == data.nbytes
+        assert sum(progress.updates) == data.nbytes
+
+
+def test_default_reporter():
+    assert isinstance(decoding.make_progress("desc"), DeferredProgress)
+    hdfstream.disable_progress(True)
+    try:
+        assert isinstance(decoding.make_progress("desc"), NullProgress)
+    finally:
+        hdfstream.disable_progress(None)
+
+
+def test_no_bar_for_small_requests():
+    with DeferredProgress("small", delay=60.0, disable=True) as progress:
+        progress.total = 100
+        progress.update(100)
+        assert progress.bar is None
+
+
+def test_bar_for_large_responses():
+    with DeferredProgress("large", delay=60.0, disable=False, min_bytes=1000) as progress:
+        progress.total = 1000
+        assert progress.bar is not None
+        progress.update(500)
+        assert progress.bar.n == 500
+        assert progress.bar.total == 1000
+
+
+def test_bar_for_slow_requests():
+    # Bar is created once the delay has passed, including bytes already received
+    with DeferredProgress("slow", delay=0.0, disable=False) as progress:
+        progress.update(10)
+        assert progress.bar is not None
+        progress.update(20)
+        assert progress.bar.n == 30
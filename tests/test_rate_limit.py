@@ -0,0 +1,158 @@
+#!/bin/env python
+
+import time
+import threading
+import pytest
+
+import hdfstream
+import hdfstream.connection
+from hdfstream.connection import Connection
+from hdfstream.rate_limit import RateLimiter, make_rate_limiter
+
+
+def make_requests(limiter, nr_requests, nr_threads=1):
+    """
+    Make requests from several threads and return the elapsed time
+    """
+    def run():
+        for i in range(nr_requests):
+            with limiter.request():
+                pass
+    threads = [threading.Thread(target=run) for _ in range(nr_threads)]
+    t0 = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - t0
+
+
+def test_rate_limit():
+    # With burst=1 and rate=100/s, 21 requests take at least 0.2s
+    limiter = RateLimiter(rate=100.0, burst=1)
+    assert make_requests(limiter, 7, nr_threads=3) >= 0.19
+    assert limiter.nr_waits > 0
+
+
+def test_rate_limit_burst():
+    # A burst of requests up to the bucket size doesn't wait
+    limiter = RateLimiter(rate=1.0, burst=10)
+    assert make_requests(limiter, 10) < 0.5
+    assert limiter.nr_waits == 0
+
+
+def test_shared_rate_limit(tmp_path):
+    # Two limiters sharing a file have a combined limit
+    shared_file = tmp_path / "bucket"
+    limiters = [RateLimiter(rate=100.0, burst=1, shared_file=shared_file) for _ in range(2)]
+    threads = [threading.Thread(target=make_requests, args=(limiter, 10)) for limiter in limiters]
+    t0 = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - t0 >= 0.18
+
+
+def test_max_in_flight():
+    limiter = RateLimiter(max_in_flight=2)
+    lock = threading.Lock()
+    in_flight = []
+    max_seen = [0]
+    def run():
+        for i in range(20):
+            with limiter.request():
+                with lock:
+                    in_flight.append(1)
+                    max_seen[0] = max(max_seen[0], len(in_flight))
+                time.sleep(0.001)
+                with lock:
+                    in_flight.pop()
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max_seen[0] == 2
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        RateLimiter(max_in_flight=0)
+    # A bucket which can't hold one token would never allow a request
+    with pytest.raises(ValueError):
+        RateLimiter(rate=100.0, burst=0.5)
+
+
+@pytest.mark.parametrize("options", [{"rate_limit" : -1}, {"rate_limit" : 0}, {"burst" : 0.5},
+                                     {"max_in_flight" : 0}, {"pool_size" : 0}, {"keep_alive" : -5}])
+def test_invalid_alias_options(options):
+    config = hdfstream.Config()
+    with pytest.raises(ValueError):
+        config.add_alias("bad", "https://example.com", **options)
+
+
+def test_make_rate_limiter():
+    assert make_rate_limiter("https://example.com") is None
+    limiter = make_rate_limiter("https://example.com", rate_limit=5, shared_rate_limit=True)
+    assert limiter.rate == 5.0
+    assert limiter.burst == 5.0
+    assert limiter.shared_file is not None
+
+
+def test_alias_options(tmp_path):
+    config = hdfstream.Config()
+    config.add_alias("limited", "https://example.com", rate_limit=10, max_in_flight=4)
+    config.add_alias("unlimited", "https://example.org")
+    filename = tmp_path / "test.yml"
+    config.write(filename)
+    config = hdfstream.Config()
+    config.read(filename)
+    assert config.alias_options("limited") == {"rate_limit" : 10, "max_in_flight" : 4}
+    assert config.alias_options("unlimited") == {}
+    assert config.alias_options("https://example.com") == {}
+    with pytest.raises(TypeError):
+        config.add_alias("bad", "https://example.com", max_in_flight="four")
+
+
+def test_connection_uses_alias_limits(fake_session, monkeypatch):
+    config = hdfstream.Config()
+    config.add_alias("limited", "https://limited.example.com", rate_limit=1000, max_in_flight=3)
+    monkeypatch.setattr(hdfstream.connection, "get_config", lambda: config)
+    monkeypatch.setattr(Connection, "_cache", {})
+    conn = Connection.new("limited", None)
+    assert conn.server == "https://limited.example.com"
+    assert conn.rate_limiter.rate == 1000.0
+    assert conn.rate_limiter.max_in_flight == 3
+    assert len(conn.session.requests) == 1
+
+
+def test_shared_file_is_private(tmp_path):
+    shared_file = tmp_path / "limits" / "bucket"
+    limiter = RateLimiter(rate=100.0, shared_file=shared_file)
+    with limiter.request():
+        pass
+    assert (shared_file.stat().st_mode & 0o777) == 0o600
+
+
+def test_shared_file_symlink_not_followed(tmp_path):
+    # A symlink planted at the shared file path must not be written through
+    target = tmp_path / "target"
+    target.write_bytes(b"important")
+    shared_file = tmp_path / "bucket"
+    shared_file.symlink_to(target)
+    limiter = RateLimiter(rate=100.0, shared_file=shared_file)
+    with limiter.request():
+        pass
+    assert target.read_bytes() == b"important"
+
+
+def test_shared_file_fallback(tmp_path):
+    # If the shared file can't be opened the limit applies to this process
+    shared_file = tmp_path / "not_a_directory" / "bucket"
+    (tmp_path / "not_a_directory").write_bytes(b"")
+    limiter = RateLimiter(rate=100.0, burst=1, shared_file=shared_file)
+    assert make_requests(limiter, 5) >= 0.03
+    assert limiter.nr_waits > 0
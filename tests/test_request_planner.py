@@ -0,0 +1,193 @@
+#!/bin/env python
+
+import numpy as np
+import pytest
+
+import hdfstream
+import hdfstream.parallel as parallel
+import hdfstream.slice_utils as su
+from hdfstream.exceptions import HDFStreamRequestError
+from hdfstream.metrics import RequestRecord
+from hdfstream.request_planner import RequestPlanner
+from dummy_dataset import DummyRemoteDataset
+
+
+@pytest.mark.parametrize("max_nr_slices", [1, 3, 100])
+@pytest.mark.parametrize("max_count", [None, 1, 5, 20])
+def test_to_generator_max_count(max_nr_slices, max_count):
+    rng = np.random.default_rng(0)
+    index = np.unique(rng.integers(0, 1000, 200))
+    nd_slice = su.ArrayIndexedSlice((1000, 3), (index,), max_gap=3)
+    pieces = list(nd_slice.to_generator(max_nr_slices, max_count))
+    starts = np.concatenate([params[0][0] for n, params in pieces])
+    counts = np.concatenate([params[0][1] for n, params in pieces])
+    assert np.all(starts == nd_slice.starts)
+    assert np.all(counts == nd_slice.counts)
+    for n, params in pieces:
+        assert n == np.sum(params[0][1])
+        assert len(params[0][0]) <= max_nr_slices
+        if max_count is not None:
+            assert n <= max_count or len(params[0][0]) == 1
+        assert params[1:] == [[0, 3]]
+
+
+def test_split_descriptor():
+    descriptor = [[np.asarray([0, 10, 20]), np.asarray([5, 5, 5])], [0, 3]]
+    pieces = su.split_descriptor(descriptor)
+    assert [n for n, d in pieces] == [10, 5]
+    assert list(pieces[0][1][0][0]) == [0, 10]
+    assert list(pieces[1][1][0][0]) == [20]
+    assert pieces[1][1][1:] == [[0, 3]]
+    assert su.split_descriptor([[7, 5], [0, 3]]) == [(3, [[7, 3], [0, 3]]), (2, [[10, 2], [0, 3]])]
+    assert su.split_descriptor([[7, 1], [0, 3]]) is None
+    assert su.split_descriptor([]) is None
+
+
+class LimitedDataset(DummyRemoteDataset):
+    """
+    Dataset on a server which rejects requests with more than max_nr_slices
+    slices or more than max_bytes bytes, and counts the requests made
+    """
+    def __init__(self, data, max_nr_slices=None, max_bytes=None, status=413,
+                 message="Request too large"):
+        super().__init__("/filename", "objectname", data)
+        self.requests = []
+        self.rejected = 0
+        connection = self.connection
+        request_slice = connection.request_slice
+        def limited_request_slice(path, name, slice_descriptor):
+            nr_slices, nr_rows = su.descriptor_count(slice_descriptor)
+            nbytes = nr_rows*np.prod(data.shape[1:])*data.dtype.itemsize
+            if ((max_nr_slices is not None and nr_slices > max_nr_slices) or
+                (max_bytes is not None and nbytes > max_bytes)):
+                self.rejected += 1
+                raise HDFStreamRequestError(f"{message} ({nr_slices} slices)", status_code=status)
+            self.requests.append((nr_slices, nbytes))
+            return request_slice(path, name, slice_descriptor)
+        connection.request_slice = limited_request_slice
+
+
+def test_learn_max_nr_slices():
+    data = np.arange(3000, dtype=np.int64).reshape((1000, 3))
+    dset = LimitedDataset(data, max_nr_slices=10)
+    index = np.arange(0, 1000, 7)
+    assert np.all(dset[index, :] == data[index, :])
+    assert dset.rejected > 0
+    assert dset.connection.planner.max_nr_slices <= 10
+    # Later reads are split in advance
+    rejected = dset.rejected
+    assert np.all(dset[index[::-1], 1] == data[index[::-1], 1])
+    assert dset.rejected == rejected
+    assert max(n for n, nbytes in dset.requests) <= 10
+
+
+@pytest.mark.parametrize("read", ["getitem", "read_direct", "request_slices"])
+def test_learn_max_response_bytes(read):
+    data = np.arange(3000, dtype=np.int64).reshape((1000, 3))
+    dset = LimitedDataset(data, max_bytes=2400)
+    if read == "getitem":
+        result = dset[100:900, :]
+    elif read == "read_direct":
+        result = np.zeros((800, 3), dtype=np.int64)
+        dset.read_direct(result, np.s_[100:900, :])
+    else:
+        result = dset.request_slices([np.s_[100:500, :], np.s_[500:900, :]])
+    assert np.all(result == data[100:900, :])
+    assert dset.rejected > 0
+    assert dset.connection.planner.max_response_bytes <= 2400
+    rejected = dset.rejected
+    assert np.all(dset[0:1000, :] == data)
+    assert dset.rejected == rejected
+    assert max(nbytes for n, nbytes in dset.requests) <= 2400
+
+
+def test_other_errors_not_split():
+    data = np.arange(100, dtype=np.int64)
+    dset = LimitedDataset(data, max_nr_slices=0, status=404)
+    with pytest.raises(HDFStreamRequestError):
+        dset[[1, 5, 9]]
+    assert dset.rejected == 1
+    assert dset.connection.planner.max_nr_slices is None
+
+
+@pytest.mark.parametrize("status,message,split", [(413, "Payload too large", True),
+                                                    (400, "Request too large", True),
+                                                    (400, "Invalid selection", False)])
+def test_limit_errors(status, message, split):
+    # Only errors about the size of the request cause it to be split
+    data = np.arange(3000, dtype=np.int64).reshape((1000, 3))
+    dset = LimitedDataset(data, max_nr_slices=10, status=status, message=message)
+    index = np.arange(0, 1000, 7)
+    if split:
+        assert np.all(dset[index, :] == data[index, :])
+        assert dset.rejected > 1
+    else:
+        with pytest.raises(HDFStreamRequestError):
+            dset[index, :]
+        assert dset.rejected == 1
+        assert len(dset.requests) == 0
+        assert dset.connection.planner.max_nr_slices is None
+
+
+def test_split_failure_raises_original_error():
+    # If the smaller requests fail too, we get the error for the whole request
+    data = np.arange(100, dtype=np.int64)
+    dset = LimitedDataset(data, max_nr_slices=0)
+    with pytest.raises(HDFStreamRequestError, match=r"\(3 slices\)"):
+        dset[[1, 5, 9]]
+    assert dset.rejected > 1
+    assert dset.connection.planner.max_nr_slices is None
+
+
+def test_unsplittable_request():
+    data = np.arange(100, dtype=np.int64)
+    dset = LimitedDataset(data, max_bytes=4)
+    with pytest.raises(HDFStreamRequestError):
+        dset[10]
+
+
+def make_record(ttfb, elapsed, nbytes):
+    record = RequestRecord("POST", "slice", "https://dummy")
+    record.ttfb = ttfb
+    record.elapsed = elapsed
+    record.response_bytes = nbytes
+    return record
+
+
+def test_adaptive_target():
+    planner = RequestPlanner()
+    assert planner.target_bytes(4) is None
+    planner.observe(make_record(0.01, 1.01, 100*2**20))
+    assert planner.latency == pytest.approx(0.01)
+    assert planner.throughput == pytest.approx(100*2**20)
+    # Small responses only update the latency
+    planner.observe(make_record(0.03, 0.031, 100))
+    assert planner.latency == pytest.approx(0.014)
+    assert planner.throughput == pytest.approx(100*2**20)
+    # Requests which failed are ignored
+    failed = make_record(1.0, 1.0, 0)
+    failed.error = "HTTPError"
+    planner.observe(failed)
+    assert planner.latency == pytest.approx(0.014)
+    assert planner.target_bytes(1) is None
+    assert planner.target_bytes(4) == int(100*2**20*0.014*9)
+    hdfstream.set_adaptive_requests(False)
+    try:
+        assert planner.target_bytes(4) is None
+    finally:
+        hdfstream.set_adaptive_requests(True)
+
+
+def test_adaptive_split(monkeypatch):
+    data = np.arange(30000, dtype=np.int64).reshape((10000, 3))
+    dset = LimitedDataset(data)
+    planner = dset.connection.planner
+    planner.min_request_bytes = 1000
+    planner.latency = 0.001
+    planner.throughput = 1000000.0 # gives a target of 9000 bytes
+    assert np.all(dset[...] == data)
+    assert len(dset.requests) == 1
+    monkeypatch.setattr(parallel, "_max_workers", 4)
+    assert np.all(dset[...] == data)
+    assert len(dset.requests) == 1 + 240000 // 9000 + 1
+    assert max(nbytes for n, nbytes in dset.requests[1:]) <= 9000
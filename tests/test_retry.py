@@ -0,0 +1,124 @@
+#!/bin/env python
+
+import io
+import time
+import msgpack
+import numpy as np
+import pytest
+import requests
+
+import hdfstream
+import hdfstream.connection
+from hdfstream.connection import Connection, encode_array
+from hdfstream.retry import RetryPolicy, parse_retry_after
+from fake_http import FakeResponse
+
+
+@pytest.fixture
+def fake_session(fake_session, monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda t: None)
+    fake_session.responses.append(FakeResponse(200)) # for the request made on connecting
+    return fake_session
+
+
+def array_response(arr, **kwargs):
+    return FakeResponse(200, msgpack.packb(arr, default=encode_array), **kwargs)
+
+
+def test_retry_status(fake_session):
+    arr = np.arange(100, dtype=np.int64)
+    fake_session.responses += [FakeResponse(429), FakeResponse(503), array_response(arr)]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    assert np.all(conn.post_and_unpack("https://dummy/msgpack/file") == arr)
+    stats = conn.retry_stats()
+    assert stats["retries"] == 2
+    assert stats["by_reason"] == {429 : 1, 503 : 1}
+    assert stats["wait"] > 0
+
+
+def test_retry_connect(fake_session):
+    fake_session.responses.insert(0, FakeResponse(502))
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    assert conn.retry_stats()["by_reason"] == {502 : 1}
+
+
+def test_retry_gives_up(fake_session):
+    fake_session.responses += [FakeResponse(429) for _ in range(3)]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(max_attempts=3, backoff=0.01))
+    with pytest.raises(hdfstream.HDFStreamRequestError) as excinfo:
+        conn.get_and_unpack("https://dummy/msgpack/file")
+    assert excinfo.value.status_code == 429
+    assert conn.retry_stats()["retries"] == 2
+    assert len(fake_session.responses) == 0
+
+
+def test_no_retry_client_error(fake_session):
+    fake_session.responses += [FakeResponse(404), FakeResponse(200)]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    with pytest.raises(requests.HTTPError):
+        conn.get_and_unpack("https://dummy/msgpack/file")
+    assert conn.retry_stats()["retries"] == 0
+    assert len(fake_session.responses) == 1
+
+
+def test_retry_into_destination(fake_session):
+    # Connection fails while decoding: the retry decodes into the same buffer
+    arr = np.arange(1000, dtype=np.int64)
+    fake_session.responses += [array_response(arr, truncate=4000), array_response(arr)]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    destination = np.zeros_like(arr)
+    conn.request_slice_into("/file", "name", [[0, 1000]], destination)
+    assert np.all(destination == arr)
+    assert conn.retry_stats()["by_reason"] == {"ProtocolError" : 1}
+
+
+def test_retry_download_range(fake_session):
+    contents = bytes(range(200))
+    fake_session.responses += [FakeResponse(206, contents[10:110], truncate=50),
+                              FakeResponse(206, contents[10:110])]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    fileobj = io.BytesIO(bytes(200))
+    fileobj.seek(10)
+    assert conn.download_range("/file", 10, 110, fileobj) == 100
+    assert fileobj.getvalue()[10:110] == contents[10:110]
+
+
+def test_retry_open_file(fake_session):
+    # Failed responses are closed before the request is retried
+    failed = [FakeResponse(429), FakeResponse(503)]
+    fake_session.responses += failed + [FakeResponse(200, b"contents")]
+    conn = Connection("https://dummy", retry_policy=RetryPolicy(backoff=0.01))
+    assert conn.open_file("/file", mode="rb").read() == b"contents"
+    assert all(response.closed for response in failed)
+
+
+def test_retry_disabled(fake_session):
+    fake_session.responses += [FakeResponse(429)]
+    hdfstream.set_retry_policy(None)
+    try:
+        conn = Connection("https://dummy")
+        with pytest.raises(hdfstream.HDFStreamRequestError):
+            conn.get_and_unpack("https://dummy/msgpack/file")
+    finally:
+        hdfstream.set_retry_policy(RetryPolicy())
+
+
+def test_retry_delay():
+    policy = RetryPolicy(backoff=1.0, max_backoff=10.0, jitter=0.0)
+    error = hdfstream.HDFStreamRequestError("busy", 503)
+    assert [policy.delay(i, error) for i in range(5)] == [1.0, 2.0, 4.0, 8.0, None]
+    policy = RetryPolicy(max_attempts=10, backoff=1.0, max_backoff=10.0, jitter=0.5)
+    for i in range(9):
+        delay = policy.delay(i, error)
+        assert 0.5*min(10.0, 2**i) <= delay <= 1.5*min(10.0, 2**i)
+    assert policy.delay(0, ValueError()) is None
+
+
+def test_retry_after():
+    policy = RetryPolicy(backoff=1.0, max_backoff=60.0, jitter=0.0)
+    assert policy.delay(0, hdfstream.HDFStreamRequestError("limit", 429, "30")) == 30.0
+    assert policy.delay(3, hdfstream.HDFStreamRequestError("limit", 429, "1")) == 8.0
+    assert policy.delay(0, hdfstream.HDFStreamRequestError("limit", 429, "3600")) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("not a date") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,68 @@
+#!/bin/env python
+
+import numpy as np
+import pytest
+
+import hdfstream.slice_utils as su
+
+
+@pytest.mark.parametrize("index", [
+    [],
+    [3],
+    [1, 2, 3, 10],
+    [1, 1, 2, 3, 3, 3, 10],
+    [10, 3, 2, 1],
+    [5, 1, 5, 1, 0, 7, 7],
+])
+def test_sort_unique(index):
+    index = np.asarray(index, dtype=int)
+    unique, inverse = su.sort_unique(index)
+    expected_unique, expected_inverse = np.unique(index, return_inverse=True)
+    assert np.all(unique == expected_unique)
+    if inverse is None:
+        assert np.all(index == unique)
+    else:
+        assert np.all(inverse == expected_inverse)
+        assert np.all(unique[inverse] == index)
+
+
+def test_sort_unique_random():
+    rng = np.random.default_rng(0)
+    for size in (10, 1000, 100000):
+        index = rng.integers(0, size, size)
+        unique, inverse = su.sort_unique(index)
+        assert np.all(unique == np.unique(index))
+        assert np.all(unique[inverse] == index)
+
+
+@pytest.mark.parametrize("index,dtype", [
+    ([1, 2, 3], int),
+    ([np.int32(1), 2, np.uint8(3)], int),
+    ([True, False], bool),
+    ([1, True, False], int), # booleans after an integer are treated as integers
+])
+def test_convert_list_to_array(index, dtype):
+    arr = su.convert_list_to_array(index, 10)
+    assert arr.dtype == dtype
+    assert np.all(arr == np.asarray(index))
+
+
+@pytest.mark.parametrize("index", [
+    [True, 1],
+    [1.0, 2.0],
+    [1, 2.0],
+    ["a"],
+    [np.bool_(True)],
+])
+def test_convert_list_to_array_bad(index):
+    with pytest.raises(IndexError):
+        su.convert_list_to_array(index, 10)
+
+
+def test_index_array_not_modified():
+    # Negative indexes should not be converted in the caller's array
+    index = np.asarray([-1, 0, -2])
+    nd_slice = su.ArrayIndexedSlice((10,), (index,))
+    assert np.all(index == [-1, 0, -2])
+    assert np.all(nd_slice.starts == [0, 8])
+    assert np.all(nd_slice.counts == [1, 2])
@@ -2,6 +2,7 @@
 
 import io
 import pytest
+import msgpack
 
 from hdfstream.streaming_decoder import StreamingDecoder
 
@@ -221,3 +222,45 @@ def test_readinto_chunks_with_peek_and_skip():
     for peek_size in (0, 1, 3, 10, 50, 300):
         for (nr_bytes, mod_val) in test_cases:
             do_readinto_chunks_with_peek_and_skip(nr_bytes, mod_val, peek_size)
+
+
+def test_peek_view_remains_valid():
+    """
+    Views returned by peek() should not change when the stream advances
+    """
+    stream = make_test_stream(1000, 256)
+    first = stream.peek(10)
+    stream.skip(5)
+    second = stream.peek(100)
+    stream.read(50)
+    for i in range(len(first)):
+        assert first[i] == i
+    for i in range(len(second)):
+        assert second[i] == 5+i
+
+
+@pytest.mark.parametrize("nr_bytes", [0, 1, 255, 256, 65535, 65536, 100000])
+def test_read_bin_header(nr_bytes):
+    """
+    Decode msgpack bin headers of each size followed by their payloads
+    """
+    payload = bytes(i % 251 for i in range(nr_bytes))
+    stream = StreamingDecoder(io.BytesIO(msgpack.packb(payload) + msgpack.packb(payload)))
+    for _ in range(2):
+        assert stream.read_bin_header() == nr_bytes
+        data = bytearray(nr_bytes)
+        assert stream.readinto(data) == nr_bytes
+        assert data == payload
+    assert len(stream.read()) == 0
+
+
+def test_read_bin_header_errors():
+    """
+    Should get an error if the next object is not a bin or is truncated
+    """
+    with pytest.raises(RuntimeError):
+        StreamingDecoder(io.BytesIO(msgpack.packb("abc"))).read_bin_header()
+    with pytest.raises(RuntimeError):
+        StreamingDecoder(io.BytesIO(bytes((0xc6, 0, 0)))).read_bin_header()
+    with pytest.raises(RuntimeError):
+        StreamingDecoder(io.BytesIO(b"")).read_bin_header()